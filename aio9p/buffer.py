@@ -0,0 +1,80 @@
+'''
+A growable receive buffer for incoming 9P frames.
+'''
+
+_EMPTY = memoryview(bytearray())
+
+class Py9PBuffer():
+    '''
+    A bytearray that incoming data is appended to. Complete frames are
+    handed out as memoryview slices and are never overwritten: when the
+    buffer runs out of space, a fresh bytearray is allocated and only the
+    incomplete remainder is copied over. Frames that are still referenced
+    keep the old bytearray alive until they are released.
+    '''
+    __slots__ = ('size', 'data', 'view', 'start', 'end', 'expected')
+    def __init__(self, size: int = 0x2000):
+        '''
+        Start empty. A bytearray of `size` bytes is allocated once data
+        arrives.
+        '''
+        self.size = size
+        self.data = _EMPTY.obj
+        self.view = _EMPTY
+        self.start = 0
+        self.end = 0
+        self.expected = 0
+        return None
+    def pending(self) -> int:
+        '''
+        The number of bytes received but not yet consumed.
+        '''
+        return self.end - self.start
+    def writable(self, sizehint: int = 0) -> memoryview:
+        '''
+        Return the free tail of the buffer, with room for at least
+        `sizehint` bytes and for the rest of the expected frame.
+        '''
+        need = max(sizehint, self.expected - self.end + self.start, 1)
+        if len(self.data) - self.end < need:
+            self._reallocate(need)
+        return self.view[self.end:]
+    def commit(self, nbytes: int) -> None:
+        '''
+        Mark `nbytes` bytes of the free tail as received.
+        '''
+        self.end = self.end + nbytes
+        return None
+    def feed(self, data) -> None:
+        '''
+        Copy data into the buffer.
+        '''
+        datalen = len(data)
+        self.writable(datalen)[:datalen] = data
+        self.end = self.end + datalen
+        return None
+    def _reallocate(self, need: int) -> None:
+        '''
+        Move the unconsumed remainder into a new bytearray that has room
+        for at least `need` more bytes.
+        '''
+        pending = self.end - self.start
+        data = bytearray(max(self.size, pending + need))
+        if pending:
+            data[:pending] = self.view[self.start:self.end]
+        self.data = data
+        self.view = memoryview(data)
+        self.start = 0
+        self.end = pending
+        return None
+    def release(self) -> None:
+        '''
+        Drop all buffered data. Frames that are still referenced elsewhere
+        stay valid.
+        '''
+        self.data = _EMPTY.obj
+        self.view = _EMPTY
+        self.start = 0
+        self.end = 0
+        self.expected = 0
+        return None
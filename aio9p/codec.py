@@ -0,0 +1,35 @@
+'''
+Precompiled struct formats for the message header and the stat struct. All
+integers are little-endian; tags are kept as raw bytes. Message bodies are
+handled by the codecs generated in `aio9p.schema`.
+'''
+
+from struct import Struct
+
+U8 = Struct('<B')
+U16 = Struct('<H')
+U32 = Struct('<I')
+U64 = Struct('<Q')
+
+# size[4] type[1] tag[2]
+HEADER = Struct('<IB2s')
+
+# fid[4] newfid[4]
+FIDPAIR = Struct('<II')
+
+# msize[4] version[s]
+VERSION = Struct('<IH')
+
+# type[1] version[4] path[8]
+QID = Struct('<BIQ')
+
+# size[2] type[2] dev[4] qid[13] mode[4] atime[4] mtime[4] length[8]
+STAT = Struct('<HHI13sIIIQ')
+# n_uid[4] n_gid[4] n_muid[4]
+STAT_U_TAIL = Struct('<III')
+# size[2] qid.path[8] mode[4] mtime[4] length[8] namelen[2], skipping type, dev,
+# qid.type, qid.version and atime
+STAT_COLUMNS = Struct('<H11xQI4xIQH')
+
+# size[4] type[1] tag[2], with the tag as an integer
+HEADER_INT = Struct('<IBH')
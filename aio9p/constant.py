@@ -6,7 +6,12 @@ A central reference for the constants used by 9P.
 ENCODING = 'utf-8'
 
 NOTAG = b'\xff\xff'
-NOFID = b'\xff\xff'
+NOTAG_INT = 0xFFFF
+# Room for the header of TREAD, RREAD, TWRITE and RWRITE in a message
+IOHDRSZ = 24
+NOFID = 0xFFFFFFFF
+# 9P2000.u: no numeric user id given
+NONUNAME = 0xFFFFFFFF
 
 # Open modes
 OREAD = 0
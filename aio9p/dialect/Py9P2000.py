@@ -5,21 +5,22 @@ parser-formatters are provided as functions instead of methods
 to enable reuse by other versions of the protocol.
 '''
 
-from typing import Any, Tuple, Callable, Coroutine
+from typing import Any, Dict, Tuple, Callable, Coroutine
 
 import aio9p.constant as c
 from aio9p.helper import (
-    extract
-    , extract_bytefields
-    , mkfield
-    , mkbytefields
-    , FieldsT
+    FieldsT
     , MsgT
     , NULL_LOGGER
+    , Qid
+    , Releasable
     )
 from aio9p.protocol import Py9P
+from aio9p.schema import DECODE, ENCODE
 from aio9p.stat import Py9P2000Stat
 
+DispatchT = Tuple[Callable[[Any, memoryview], Coroutine[Any, Any, MsgT]], Any]
+
 class Py9P2000(Py9P):
     '''
     The main abstract class. Implementations should subclass this.
@@ -33,39 +34,49 @@ class Py9P2000(Py9P):
         if logger is not None:
             self._logger = logger
         self.maxsize = maxsize
+        self._dispatch = self.dispatch_entries()
         return None
-    async def process_msg(self, msgtype: int, msgbody: bytes) -> MsgT: # pylint: disable=too-many-branches
+    async def process_msg(self, msgtype: int, msgbody: memoryview) -> MsgT:
         '''
         The central dispatch method.
         '''
-        if msgtype == c.TVERSION:
-            res = await p9_version(self.version, msgbody)
-        elif msgtype == c.TAUTH:
-            res = await p9_auth(self.auth, msgbody)
-        elif msgtype == c.TATTACH:
-            res = await p9_attach(self.attach, msgbody)
-        elif msgtype == c.TSTAT:
-            res = await p9_stat(self.stat, msgbody)
-        elif msgtype == c.TCLUNK:
-            res = await p9_clunk(self.clunk, msgbody)
-        elif msgtype == c.TWALK:
-            res = await p9_walk(self.walk, msgbody)
-        elif msgtype == c.TOPEN:
-            res = await p9_open(self.open, msgbody)
-        elif msgtype == c.TREAD:
-            res = await p9_read(self.read, msgbody)
-        elif msgtype == c.TWRITE:
-            res = await p9_write(self.write, msgbody)
-        elif msgtype == c.TCREATE:
-            res = await p9_create(self.create, msgbody)
-        elif msgtype == c.TWSTAT:
-            res = await p9_wstat(self.wstat, msgbody)
-        elif msgtype == c.TREMOVE:
-            res = await p9_remove(self.remove, msgbody)
-        else:
+        entry = self._dispatch.get(msgtype)
+        if entry is None:
             raise NotImplementedError(msgtype, c.TRNAME.get(msgtype))
-        self._logger.debug('Replying with message: %s %s', c.TRNAME.get(res[0]), res)
-        return res
+        parser, handler = entry
+        return await parser(handler, msgbody)
+    def dispatch_entries(self) -> Dict[int, DispatchT]:
+        '''
+        The message types handled by this class, mapped to their
+        parser-formatter and the bound method it calls. Subclasses and
+        other dialects add or replace message types by extending the
+        result.
+        '''
+        return {
+            c.TVERSION: (p9_version, self.version)
+            , c.TAUTH: (p9_auth, self.auth)
+            , c.TATTACH: (p9_attach, self.attach)
+            , c.TSTAT: (p9_stat, self.stat)
+            , c.TCLUNK: (p9_clunk, self.clunk)
+            , c.TWALK: (p9_walk, self.walk)
+            , c.TOPEN: (p9_open, self.open)
+            , c.TREAD: (p9_read, self.read)
+            , c.TWRITE: (p9_write, self.write)
+            , c.TCREATE: (p9_create, self.create)
+            , c.TWSTAT: (p9_wstat, self.wstat)
+            , c.TREMOVE: (p9_remove, self.remove)
+            }
+    def register(
+        self
+        , msgtype: int
+        , parser: Callable[[Any, memoryview], Coroutine[Any, Any, MsgT]]
+        , handler: Any
+        ) -> None:
+        '''
+        Handle messages of type `msgtype` by calling `parser(handler, msgbody)`.
+        '''
+        self._dispatch[msgtype] = (parser, handler)
+        return None
     def errhandler(self, exception):
         '''
         The base protocol does not support errnos.
@@ -80,63 +91,67 @@ class Py9P2000(Py9P):
         self.maxsize = min(clientmax, self.maxsize)
         srvver = clientver if clientver == self._versionstring else None
         return self.maxsize, srvver
-    async def auth(self, afid: bytes, uname: bytes, aname: bytes) -> bytes:
+    async def auth(self, afid: int, uname: bytes, aname: bytes) -> Qid:
         '''
         Abstract auth method.
         '''
         raise NotImplementedError
-    async def attach(self, fid: bytes, afid: bytes, uname: bytes, aname: bytes) -> bytes:
+    async def attach(self, fid: int, afid: int, uname: bytes, aname: bytes) -> Qid:
         '''
         Abstract attach method.
         '''
         raise NotImplementedError
-    async def stat(self, fid: bytes) -> Py9P2000Stat:
+    async def stat(self, fid: int) -> Py9P2000Stat:
         '''
         Abstract stat method.
         '''
         raise NotImplementedError
-    async def clunk(self, fid: bytes) -> None:
+    async def clunk(self, fid: int) -> None:
         '''
         Abstract clunk method.
         '''
         raise NotImplementedError
-    async def walk(self, fid: bytes, newfid: bytes, wnames: FieldsT) -> FieldsT:
+    async def walk(self, fid: int, newfid: int, wnames: FieldsT) -> Tuple[Qid, ...]:
         '''
         Abstract walk method.
         '''
         raise NotImplementedError
-    async def open(self, fid: bytes, mode: int) -> Tuple[bytes, int]:
+    async def open(self, fid: int, mode: int) -> Tuple[Qid, int]:
         '''
         Abstract open method.
         '''
         raise NotImplementedError
-    async def read(self, fid: bytes, offset: int, count: int) -> bytes:
+    async def read(self, fid: int, offset: int, count: int) -> Any:
         '''
-        Abstract read method.
+        Abstract read method. May return bytes, any other contiguous
+        buffer, or a `Releasable` to be notified once the data has been
+        written. Buffers are written out without copying.
         '''
         raise NotImplementedError
-    async def write(self, fid: bytes, offset: int, data: bytes) -> int:
+    async def write(self, fid: int, offset: int, data: memoryview) -> int:
         '''
-        Abstract write method.
+        Abstract write method. `data` is a view into the receive buffer,
+        valid only until the handler returns; copy it with bytes() to
+        keep it.
         '''
         raise NotImplementedError
     async def create(
         self
-        , fid: bytes
+        , fid: int
         , name: bytes
         , perm: int
         , mode: int
-        ) -> Tuple[bytes, int]:
+        ) -> Tuple[Qid, int]:
         '''
         Abstract create method.
         '''
         raise NotImplementedError
-    async def wstat(self, fid: bytes, stat: Py9P2000Stat) -> None:
+    async def wstat(self, fid: int, stat: Py9P2000Stat) -> None:
         '''
         Abstract wstat method.
         '''
         raise NotImplementedError
-    async def remove(self, fid: bytes) -> None:
+    async def remove(self, fid: int) -> None:
         '''
         Abstract remove method.
         '''
@@ -148,179 +163,139 @@ def p9_error(data: bytes) -> MsgT:
     the 9P2000.u format which includes an additional errno field after the
     message.
     '''
-    return c.RERROR, *mkbytefields(data)
+    return ENCODE[c.RERROR](data)
 
 async def p9_version(
     func: Callable[[int, bytes], Coroutine[Any, Any, Tuple[int, bytes]]]
-    , msgbody: bytes
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     VERSION parser and formatter. Checks that the server version is a prefix
     of the client version, otherwise returns version 'unknown' as demanded by
     the spec.
     '''
-    maxsize = extract(msgbody, 0, 4)
-    versionlength = extract(msgbody, 4, 2)
-    version = msgbody[6:6+versionlength]
+    maxsize, version = DECODE[c.TVERSION](msgbody)
     srvmax, srvver = await func(maxsize, version)
     if srvver is None or not version.startswith(srvver):
         srvver = b'unknown'
-    srvverlen, srvverfields = mkbytefields(srvver)
-    return c.RVERSION, 4 + srvverlen, (mkfield(srvmax, 4),) + srvverfields
+    return ENCODE[c.RVERSION](srvmax, srvver)
 
 async def p9_attach(
-    func: Callable[[bytes, bytes, bytes, bytes], Coroutine[Any, Any, bytes]]
-    , msgbody: bytes
+    func: Callable[[int, int, bytes, bytes], Coroutine[Any, Any, Qid]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     ATTACH parser and formatter.
     '''
-    fid = msgbody[0:4]
-    afid = msgbody[4:8]
-    unamelen = extract(msgbody, 8, 2)
-    uname = msgbody[10:10+unamelen]
-
-    anamelen = extract(msgbody, 10+unamelen, 2)
-    aname = msgbody[12+unamelen:12+unamelen+anamelen]
-    qid = await func(fid, afid, uname, aname)
-    return c.RATTACH, 13, (qid,)
+    qid = await func(*DECODE[c.TATTACH](msgbody))
+    return ENCODE[c.RATTACH](qid)
 
 async def p9_auth(
-    func: Callable[[bytes, bytes, bytes], Coroutine[Any, Any, bytes]]
-    , msgbody: bytes
+    func: Callable[[int, bytes, bytes], Coroutine[Any, Any, Qid]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     AUTH parser and formatter.
     '''
-    afid = msgbody[0:4]
-    unamelen = extract(msgbody, 4, 2)
-    uname = msgbody[6:6+unamelen]
-    anamelen = extract(msgbody, 6+unamelen, 2)
-    aname = msgbody[8+unamelen:8+unamelen+anamelen]
-    aqid = await func(afid, uname, aname)
-    return c.RAUTH, 13, (aqid,)
+    aqid = await func(*DECODE[c.TAUTH](msgbody))
+    return ENCODE[c.RAUTH](aqid)
 
 async def p9_stat(
-    func: Callable[[bytes], Coroutine[Any, Any, Py9P2000Stat]]
-    , msgbody: bytes
+    func: Callable[[int], Coroutine[Any, Any, Py9P2000Stat]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     STAT parser and formatter.
     '''
-    fid = msgbody[0:4]
+    (fid,) = DECODE[c.TSTAT](msgbody)
     stat = await func(fid)
-    statbytes = stat.to_bytes(with_envelope=True)
-    return c.RSTAT, len(statbytes), (statbytes,)
+    return ENCODE[c.RSTAT](stat.to_bytes())
 
 async def p9_clunk(
-    func: Callable[[bytes], Coroutine[Any, Any, None]]
-    , msgbody: bytes
+    func: Callable[[int], Coroutine[Any, Any, None]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     CLUNK parser and formatter.
     '''
-    fid = msgbody[0:4]
+    (fid,) = DECODE[c.TCLUNK](msgbody)
     await func(fid)
-    return c.RCLUNK, 0, ()
+    return ENCODE[c.RCLUNK]()
 
 async def p9_walk(
-    func: Callable[[bytes, bytes, FieldsT], Coroutine[Any, Any, FieldsT]]
-    , msgbody: bytes
+    func: Callable[[int, int, FieldsT], Coroutine[Any, Any, Tuple[Qid, ...]]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     WALK parser and formatter.
     '''
-    fid = msgbody[0:4]
-    newfid = msgbody[4:8]
-    count = extract(msgbody, 8, 2)
-    try:
-        wnames = extract_bytefields(msgbody, 10, count)
-    except ValueError as e:
-        raise ValueError('Could not build walknames', count, msgbody[10:].hex()) from e
+    fid, newfid, wnames = DECODE[c.TWALK](msgbody)
     qids = await func(fid, newfid, wnames)
-    if count and not qids:
-        errmsg = b'No such file!'
-        errenvelope = mkfield(13, 2)
-        return c.RERROR, 15, (errenvelope, errmsg)
-    qidcount = len(qids)
-    return c.RWALK, 2 + 13*qidcount, (mkfield(qidcount, 2),) + qids
+    if wnames and not qids:
+        return ENCODE[c.RERROR](b'No such file!')
+    return ENCODE[c.RWALK](qids)
 
 async def p9_open(
-    func: Callable[[bytes, int], Coroutine[Any, Any, Tuple[bytes, int]]]
-    , msgbody: bytes
+    func: Callable[[int, int], Coroutine[Any, Any, Tuple[Qid, int]]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     OPEN parser and formatter.
     '''
-    fid = msgbody[0:4]
-    mode = extract(msgbody, 4, 1)
-    qid, iounit = await func(fid, mode)
-    return c.ROPEN, 17, (qid, mkfield(iounit, 4))
+    qid, iounit = await func(*DECODE[c.TOPEN](msgbody))
+    return ENCODE[c.ROPEN](qid, iounit)
 
 async def p9_read(
-    func: Callable[[bytes, int, int], Coroutine[Any, Any, bytes]]
-    , msgbody: bytes
+    func: Callable[[int, int, int], Coroutine[Any, Any, Any]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
-    READ parser and formatter.
+    READ parser and formatter. Buffers other than bytes are passed on
+    as byte-format memoryviews.
     '''
-    fid = msgbody[0:4]
-    offset = extract(msgbody, 4, 8)
-    count = extract(msgbody, 12, 4)
-    resdata = await func(fid, offset, count)
-    resdatalen = len(resdata)
-    return c.RREAD, 4 + resdatalen, (mkfield(resdatalen, 4), resdata)
-
+    resdata = await func(*DECODE[c.TREAD](msgbody))
+    if not isinstance(resdata, (bytes, Releasable)):
+        resdata = memoryview(resdata).cast('B')
+    return ENCODE[c.RREAD](resdata)
 
 async def p9_write(
-    func: Callable[[bytes, int, bytes], Coroutine[Any, Any, int]]
-    , msgbody: bytes
+    func: Callable[[int, int, memoryview], Coroutine[Any, Any, int]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     WRITE parser and formatter.
     '''
-    fid = msgbody[0:4]
-    offset = extract(msgbody, 4, 8)
-    count = extract(msgbody, 12, 4)
-    data = msgbody[16:16+count]
-    rescount = await func(fid, offset, data)
-    return c.RWRITE, 4, (mkfield(rescount, 4),)
+    rescount = await func(*DECODE[c.TWRITE](msgbody))
+    return ENCODE[c.RWRITE](rescount)
 
 async def p9_create(
-    func: Callable[[bytes, bytes, int, int], Coroutine[Any, Any, Tuple[bytes, int]]]
-    , msgbody: bytes
+    func: Callable[[int, bytes, int, int], Coroutine[Any, Any, Tuple[Qid, int]]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     CREATE parser and formatter.
     '''
-    fid = msgbody[0:4]
-    namelen = extract(msgbody, 4, 2)
-    name = msgbody[6:6+namelen]
-
-    perm = extract(msgbody, 6+namelen, 4)
-    mode = extract(msgbody, 10+namelen, 1)
-    qid, iounit = await func(fid, name, perm, mode)
-    return c.RCREATE, 17, (qid, mkfield(iounit, 4))
+    qid, iounit = await func(*DECODE[c.TCREATE](msgbody))
+    return ENCODE[c.RCREATE](qid, iounit)
 
 async def p9_wstat(
-    func: Callable[[bytes, Py9P2000Stat], Coroutine[Any, Any, None]]
-    , msgbody: bytes
+    func: Callable[[int, Py9P2000Stat], Coroutine[Any, Any, None]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     WSTAT parser and formatter.
     '''
-    fid = msgbody[0:4]
-    stat = Py9P2000Stat.from_bytes(msgbody, 6)
-    await func(fid, stat)
-    return c.RWSTAT, 0, ()
+    fid, statbytes = DECODE[c.TWSTAT](msgbody)
+    await func(fid, Py9P2000Stat.from_bytes(statbytes, 0))
+    return ENCODE[c.RWSTAT]()
 
 async def p9_remove(
-    func: Callable[[bytes], Coroutine[Any, Any, None]]
-    , msgbody: bytes
+    func: Callable[[int], Coroutine[Any, Any, None]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     REMOVE parser and formatter.
     '''
-    fid = msgbody[0:4]
+    (fid,) = DECODE[c.TREMOVE](msgbody)
     await func(fid)
-    return c.RREMOVE, 0, ()
+    return ENCODE[c.RREMOVE]()
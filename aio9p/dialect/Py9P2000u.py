@@ -3,21 +3,17 @@
 An abstract class for the base 9P2000 protocol.
 '''
 
-from typing import Any, Tuple, Callable, Coroutine
+from typing import Any, Dict, Tuple, Callable, Coroutine
 
 import aio9p.constant as c
-from aio9p.helper import (
-    extract
-    , extract_bytefields
-    , mkfield
-    , mkbytefields
-    , MsgT
-    )
+from aio9p.helper import MsgT, Qid
 from aio9p.dialect.Py9P2000 import (
-    Py9P2000
+    DispatchT
+    , Py9P2000
     , p9_version
     )
 from aio9p.protocol import Py9PException
+from aio9p.schema import DECODE_U, ENCODE_U
 from aio9p.stat import Py9P2000uStat
 
 MODIFIED_MESSAGE_TYPES = {c.TVERSION, c.TAUTH, c.TATTACH, c.TSTAT, c.TCREATE, c.TWSTAT}
@@ -58,32 +54,23 @@ class Py9P2000u(Py9P2000):
         '''
         super().__init__(*args, **kwargs)
         return None
-    async def process_msg(self, msgtype: int, msgbody: bytes) -> MsgT: # pylint: disable=too-many-branches
-        '''
-        The central dispatch method.
-        '''
-        if self.fallback_to_9P2000 or msgtype not in MODIFIED_MESSAGE_TYPES:
-            return await super().process_msg(msgtype, msgbody)
-        self._logger.debug(
-            'Processing: %s %s %s'
-            , msgtype, c.TRNAME.get(msgtype), msgbody.hex()
-            )
-        if msgtype == c.TVERSION:
-            res = await p9_version(self.version_u, msgbody)
-        elif msgtype == c.TAUTH:
-            res = await p9u_auth(self.auth_u, msgbody)
-        elif msgtype == c.TATTACH:
-            res = await p9u_attach(self.attach_u, msgbody)
-        elif msgtype == c.TSTAT:
-            res = await p9u_stat(self.stat_u, msgbody)
-        elif msgtype == c.TCREATE:
-            res = await p9u_create(self.create_u, msgbody)
-        elif msgtype == c.TWSTAT:
-            res = await p9u_wstat(self.wstat_u, msgbody)
-        else:
-            raise NotImplementedError(msgtype, c.TRNAME.get(msgtype))
-        self._logger.debug('Replying with message: %s %s', c.TRNAME.get(res[0]), res)
-        return res
+    def dispatch_entries(self) -> Dict[int, DispatchT]:
+        '''
+        Replaces the message types that differ from 9P2000, unless
+        falling back to 9P2000.
+        '''
+        entries = super().dispatch_entries()
+        if self.fallback_to_9P2000:
+            return entries
+        entries.update({
+            c.TVERSION: (p9_version, self.version_u)
+            , c.TAUTH: (p9u_auth, self.auth_u)
+            , c.TATTACH: (p9u_attach, self.attach_u)
+            , c.TSTAT: (p9u_stat, self.stat_u)
+            , c.TCREATE: (p9u_create, self.create_u)
+            , c.TWSTAT: (p9u_wstat, self.wstat_u)
+            })
+        return entries
     def errhandler(self, exception):
         '''
         Attempts to provide sensible errnos.
@@ -108,45 +95,52 @@ class Py9P2000u(Py9P2000):
             self._logger.debug('Client and server version agree: %s', clientver)
             srvver = clientver
         elif self.offer_fallback_to_9P2000 and clientver == b'9P2000':
-            self._logger.debug('Falling back to %s from %s', clientver, srvver)
+            self._logger.debug('Falling back to %s from %s', clientver, self._versionstring)
             srvver = clientver
             self.fallback_to_9P2000 = True
+            fallback = Py9P2000.dispatch_entries(self)
+            self._dispatch.update(
+                (msgtype, fallback[msgtype])
+                for msgtype in MODIFIED_MESSAGE_TYPES
+                )
+        else:
+            srvver = None
         return self.maxsize, srvver
-    async def auth_u(self, afid: bytes, uname: bytes, aname: bytes, n_uname: int) -> bytes:
+    async def auth_u(self, afid: int, uname: bytes, aname: bytes, n_uname: int) -> Qid:
         '''
         Abstract auth method.
         '''
         raise NotImplementedError
     async def attach_u( # pylint: disable=too-many-arguments
         self
-        , fid: bytes
-        , afid: bytes
+        , fid: int
+        , afid: int
         , uname: bytes
         , aname: bytes
         , n_uname: int
-        ) -> bytes:
+        ) -> Qid:
         '''
         Abstract attach method.
         '''
         raise NotImplementedError
-    async def stat_u(self, fid: bytes) -> Py9P2000uStat:
+    async def stat_u(self, fid: int) -> Py9P2000uStat:
         '''
         Abstract stat method.
         '''
         raise NotImplementedError
     async def create_u( # pylint: disable=too-many-arguments
         self
-        , fid: bytes
+        , fid: int
         , name: bytes
         , perm: int
         , mode: int
         , extension: bytes
-        ) -> Tuple[bytes, int]:
+        ) -> Tuple[Qid, int]:
         '''
         Abstract create method.
         '''
         raise NotImplementedError
-    async def wstat_u(self, fid: bytes, stat: Py9P2000uStat) -> None:
+    async def wstat_u(self, fid: int, stat: Py9P2000uStat) -> None:
         '''
         Abstract wstat method.
         '''
@@ -156,80 +150,58 @@ def p9u_error(data: bytes, errno: int) -> MsgT:
     '''
     Format data as an error reply.
     '''
-    msglen, msgfields = mkbytefields(data)
-    return c.RERROR, msglen + 4, msgfields + (mkfield(errno, 4),)
+    return ENCODE_U[c.RERROR](data, errno)
 
 async def p9u_attach(
-    func: Callable[[bytes, bytes, bytes, bytes, int], Coroutine[Any, Any, bytes]]
-    , msgbody: bytes
+    func: Callable[[int, int, bytes, bytes, int], Coroutine[Any, Any, Qid]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
-    ATTACH parser and formatter.
+    ATTACH parser and formatter. A missing n_uname is passed on as
+    `NONUNAME`.
     '''
-    fid = msgbody[0:4]
-    afid = msgbody[4:8]
-    unamelen = extract(msgbody, 8, 2)
-    uname = msgbody[10:10+unamelen]
-
-    anamelen = extract(msgbody, 10+unamelen, 2)
-    aname = msgbody[12+unamelen:12+unamelen+anamelen]
-    n_uname = extract(msgbody, 12+unamelen+anamelen, 4)
-    qid = await func(fid, afid, uname, aname, n_uname)
-    return c.RATTACH, 13, (qid,)
+    qid = await func(*DECODE_U[c.TATTACH](msgbody))
+    return ENCODE_U[c.RATTACH](qid)
 
 async def p9u_auth(
-    func: Callable[[bytes, bytes, bytes, int], Coroutine[Any, Any, bytes]]
-    , msgbody: bytes
+    func: Callable[[int, bytes, bytes, int], Coroutine[Any, Any, Qid]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
-    AUTH parser and formatter.
+    AUTH parser and formatter. A missing n_uname is passed on as
+    `NONUNAME`.
     '''
-    afid = msgbody[0:4]
-    unamelen = extract(msgbody, 4, 2)
-    uname = msgbody[6:6+unamelen]
-    anamelen = extract(msgbody, 6+unamelen, 2)
-    aname = msgbody[8+unamelen:8+unamelen+anamelen]
-    n_uname = extract(msgbody, 8+unamelen+anamelen, 4)
-    aqid = await func(afid, uname, aname, n_uname)
-    return c.RAUTH, 13, (aqid,)
+    aqid = await func(*DECODE_U[c.TAUTH](msgbody))
+    return ENCODE_U[c.RAUTH](aqid)
 
 async def p9u_stat(
-    func: Callable[[bytes], Coroutine[Any, Any, Py9P2000uStat]]
-    , msgbody: bytes
+    func: Callable[[int], Coroutine[Any, Any, Py9P2000uStat]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     STAT parser and formatter.
     '''
-    fid = msgbody[0:4]
+    (fid,) = DECODE_U[c.TSTAT](msgbody)
     stat = await func(fid)
-    statbytes = stat.to_bytes(with_envelope=True)
-    return c.RSTAT, len(statbytes), (statbytes,)
+    return ENCODE_U[c.RSTAT](stat.to_bytes())
 
 async def p9u_create(
-    func: Callable[[bytes, bytes, int, int, bytes], Coroutine[Any, Any, Tuple[bytes, int]]]
-    , msgbody: bytes
+    func: Callable[[int, bytes, int, int, bytes], Coroutine[Any, Any, Tuple[Qid, int]]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     CREATE parser and formatter.
     '''
-    fid = msgbody[0:4]
-    namelen = extract(msgbody, 4, 2)
-    name = msgbody[6:6+namelen]
-
-    perm = extract(msgbody, 6+namelen, 4)
-    mode = extract(msgbody, 10+namelen, 1)
-    (extension,) = extract_bytefields(msgbody, 11+namelen, 1)
-    qid, iounit = await func(fid, name, perm, mode, extension)
-    return c.RCREATE, 17, (qid, mkfield(iounit, 4))
+    qid, iounit = await func(*DECODE_U[c.TCREATE](msgbody))
+    return ENCODE_U[c.RCREATE](qid, iounit)
 
 async def p9u_wstat(
-    func: Callable[[bytes, Py9P2000uStat], Coroutine[Any, Any, None]]
-    , msgbody: bytes
+    func: Callable[[int, Py9P2000uStat], Coroutine[Any, Any, None]]
+    , msgbody: memoryview
     ) -> MsgT:
     '''
     WSTAT parser and formatter.
     '''
-    fid = msgbody[0:4]
-    stat = Py9P2000uStat.from_bytes(msgbody, 6)
-    await func(fid, stat)
-    return c.RWSTAT, 0, ()
+    fid, statbytes = DECODE_U[c.TWSTAT](msgbody)
+    await func(fid, Py9P2000uStat.from_bytes(statbytes, 0))
+    return ENCODE_U[c.RWSTAT]()
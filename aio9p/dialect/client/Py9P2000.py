@@ -8,13 +8,11 @@ other versions of the protocol.
 from typing import Tuple
 
 import aio9p.constant as c
-from aio9p.helper import (
-    extract
-    , mkbytefields
-    , mkfield
-    )
+from aio9p.file import Py9PReader, Py9PWriter
+from aio9p.helper import FidT, Qid
 from aio9p.protocol import Py9PClient
-from aio9p.stat import Py9P2000Stat
+from aio9p.schema import DECODE, ENCODE
+from aio9p.stat import Py9P2000Stat, StatColumns, StatView
 
 async def p9_version(
     implementation
@@ -24,186 +22,166 @@ async def p9_version(
     '''
     TVERSION, RVERSION.
     '''
-    cverlen, cverfields = mkbytefields(clientver)
     _, msgbody = await implementation.message(
-        (c.TVERSION, 4 + cverlen, (mkfield(clientmax, 4),) + cverfields)
+        ENCODE[c.TVERSION](clientmax, clientver)
         )
-    srvverlen = extract(msgbody, 4, 2)
-    return extract(msgbody, 0, 4), msgbody[6:6+srvverlen]
+    return DECODE[c.RVERSION](msgbody)
 
 async def p9_attach(
     implementation
-    , fid: bytes
-    , afid: bytes
+    , fid: FidT
+    , afid: FidT
     , uname: bytes
     , aname: bytes
-    ) -> bytes:
+    ) -> Qid:
     '''
     Create a TATTACH message body.
     Parse an RATTACH message body.
     '''
-    bflen, bflds = mkbytefields(uname, aname)
     _, msgbody = await implementation.message(
-        (c.TATTACH, 8 + bflen, (fid, afid) + bflds)
+        ENCODE[c.TATTACH](fid, afid, uname, aname)
         )
-    return msgbody[:13]
+    return DECODE[c.RATTACH](msgbody)[0]
+
 async def p9_auth(
     implementation
-    , fid: bytes, uname: bytes, aname: bytes
-    ) -> bytes:
+    , fid: FidT, uname: bytes, aname: bytes
+    ) -> Qid:
     '''
     Create a TAUTH message body.
     Parse an RAUTH message body.
     '''
-    bflen, bflds = mkbytefields(uname, aname)
     _, msgbody = await implementation.message(
-        (c.TAUTH, 8 + bflen, (fid,) + bflds)
+        ENCODE[c.TAUTH](fid, uname, aname)
         )
-    return msgbody[:13]
+    return DECODE[c.RAUTH](msgbody)[0]
 
 async def p9_stat(
     implementation
-    , fid: bytes
-    ) -> Py9P2000Stat:
+    , fid: FidT
+    ) -> StatView:
     '''
     Create a TSTAT message body.
-    Parse an RSTAT message body.
+    Parse an RSTAT message body into a view decoding fields on access.
     '''
-    _, msgbody = await implementation.message(
-        (c.TSTAT, 4, (fid,))
-        )
-#    statlen = extract(msgbody, 0, 2)
-    return Py9P2000Stat.from_bytes(msgbody, 2)
+    _, msgbody = await implementation.message(ENCODE[c.TSTAT](fid))
+    return StatView(DECODE[c.RSTAT](msgbody)[0])
 
 async def p9_clunk(
     implementation
-    , fid: bytes
+    , fid: FidT
     ) -> None:
     '''
     Create a TCLUNK message body.
-    Parse an RVERSION message body.
+    Parse an RCLUNK message body.
     '''
-    await implementation.message(
-        (c.TCLUNK, 4, (fid,))
-        )
+    await implementation.message(ENCODE[c.TCLUNK](fid))
     return None
 
 async def p9_walk(
     implementation
-    , fid: bytes, newfid: bytes, wnames: Tuple[bytes]
-    ) -> Tuple[bytes, ...]:
+    , fid: FidT, newfid: FidT, wnames: Tuple[bytes, ...]
+    ) -> Tuple[Qid, ...]:
     '''
     Create a TWALK message body.
     Parse an RWALK message body.
     '''
-    wnamelen, wnamefields = mkbytefields(*wnames)
-    fields = (
-        fid
-        , newfid
-        , mkfield(len(wnames), 2)
-        )  + wnamefields
     _, msgbody = await implementation.message(
-        (c.TWALK, 10 + wnamelen, fields)
-        )
-    qidcount = extract(msgbody, 0, 2)
-    return tuple(
-        msgbody[2+offset:15+offset]
-        for offset in range(0, 13*qidcount, 13)
+        ENCODE[c.TWALK](fid, newfid, wnames)
         )
+    return DECODE[c.RWALK](msgbody)[0]
 
 async def p9_open(
     implementation
-    , fid: bytes, mode: int
-    ) -> Tuple[bytes, int]:
+    , fid: FidT, mode: int
+    ) -> Tuple[Qid, int]:
     '''
     Create a TOPEN message body.
     Parse an ROPEN message body.
     '''
-    _, msgbody = await implementation.message(
-        (c.TWALK, 5, (fid, mkfield(mode, 1)))
-        )
-    return msgbody[:13], extract(msgbody, 13, 4)
+    _, msgbody = await implementation.message(ENCODE[c.TOPEN](fid, mode))
+    return DECODE[c.ROPEN](msgbody)
 
 async def p9_read(
     implementation
-    , fid: bytes, offset: int, count: int
-    ) -> Tuple[bytes, int]:
+    , fid: FidT, offset: int, count: int
+    ) -> bytes:
     '''
     Create a TREAD message body.
     Parse an RREAD message body.
     '''
     _, msgbody = await implementation.message(
-        (c.TREAD, 16, (fid, mkfield(offset, 8), mkfield(count, 4)))
+        ENCODE[c.TREAD](fid, offset, count)
         )
-    return msgbody[:13], extract(msgbody, 13, 4)
+    return bytes(DECODE[c.RREAD](msgbody)[0])
+
+async def p9_readdir(
+    implementation
+    , fid: FidT, offset: int, count: int
+    ) -> StatColumns:
+    '''
+    Create a TREAD message body for a directory.
+    Parse the RREAD message body into columns.
+    '''
+    _, msgbody = await implementation.message(
+        ENCODE[c.TREAD](fid, offset, count)
+        )
+    return StatColumns.from_bytes(DECODE[c.RREAD](msgbody)[0])
 
 async def p9_write(
     implementation
-    , fid: bytes, offset: int, data: bytes
+    , fid: FidT, offset: int, data: bytes
     ) -> int:
     '''
     Create a TWRITE message body.
     Parse an RWRITE message body.
     '''
-    datalen = len(data)
-    fields = (
-        fid
-        , mkfield(offset, 8)
-        , mkfield(datalen, 4)
-        , data
-        )
     _, msgbody = await implementation.message(
-        (c.TWRITE, 16 + datalen, fields)
+        ENCODE[c.TWRITE](fid, offset, data)
         )
-    return extract(msgbody, 0, 4)
+    return DECODE[c.RWRITE](msgbody)[0]
 
 async def p9_create(
     implementation
-    , fid: bytes, name: bytes, perm: int, mode: int
-    ) -> Tuple[bytes, int]:
+    , fid: FidT, name: bytes, perm: int, mode: int
+    ) -> Tuple[Qid, int]:
     '''
-    Create a TWRITE message body.
-    Parse an RWRITE message body.
+    Create a TCREATE message body.
+    Parse an RCREATE message body.
     '''
-    namelen, namefields = mkbytefields(name)
-    fields = (fid, *namefields, mkfield(perm, 4), mkfield(mode, 1))
     _, msgbody = await implementation.message(
-        (c.TWRITE, 10 + namelen, fields)
+        ENCODE[c.TCREATE](fid, name, perm, mode)
         )
-    return msgbody[:13], extract(msgbody, 13, 4)
+    return DECODE[c.RCREATE](msgbody)
 
 async def p9_wstat(
     implementation
-    , fid: bytes
+    , fid: FidT
     , stat: Py9P2000Stat
     ) -> None:
     '''
     Create a TWSTAT message.
     Parse an RWSTAT message.
     '''
-    binstat = stat.to_bytes(with_envelope=True)
-    await implementation.message(
-        (c.TWSTAT, 4 + len(binstat), (fid, binstat))
-        )
+    await implementation.message(ENCODE[c.TWSTAT](fid, stat.to_bytes()))
     return None
 
 async def p9_remove(
     implementation
-    , fid: bytes
+    , fid: FidT
     ) -> None:
     '''
     Create a TREMOVE message.
     Parse an RREMOVE message.
     '''
-    await implementation.message(
-        (c.TREMOVE, 4, (fid,))
-        )
+    await implementation.message(ENCODE[c.TREMOVE](fid))
     return None
 
 class Py9P2000Client(Py9PClient): # pylint: disable=too-many-instance-attributes,too-few-public-methods
     '''
     A client for the 9P2000 dialect.
     '''
+    __slots__ = ()
     versionstring = b'9P2000'
     version = p9_version
     attach = p9_attach
@@ -213,7 +191,18 @@ class Py9P2000Client(Py9PClient): # pylint: disable=too-many-instance-attributes
     walk = p9_walk
     open = p9_open
     read = p9_read
+    readdir = p9_readdir
     write = p9_write
     create = p9_create
     wstat = p9_wstat
     remove = p9_remove
+    def reader(self, fid: FidT, iounit: int = 0, **kwargs) -> Py9PReader:
+        '''
+        A reader with read-ahead for the open `fid`, see Py9PReader.
+        '''
+        return Py9PReader(self, fid, iounit, **kwargs)
+    def writer(self, fid: FidT, iounit: int = 0, **kwargs) -> Py9PWriter:
+        '''
+        A writer with write-behind for the open `fid`, see Py9PWriter.
+        '''
+        return Py9PWriter(self, fid, iounit, **kwargs)
@@ -9,95 +9,74 @@ from typing import Tuple
 
 import aio9p.constant as c
 from aio9p.dialect.client.Py9P2000 import Py9P2000Client, p9_wstat
-from aio9p.helper import (
-    extract
-    , mkbytefields
-    , mkfield
-    )
-from aio9p.stat import Py9P2000uStat
+from aio9p.helper import FidT, Qid
+from aio9p.schema import DECODE_U, ENCODE_U
+from aio9p.stat import Py9P2000uStat, StatUView
 
 async def p9u_attach( # pylint: disable=too-many-arguments
     implementation
-    , fid: bytes
-    , afid: bytes
+    , fid: FidT
+    , afid: FidT
     , uname: bytes
     , aname: bytes
     , n_uname: int
-    ) -> bytes:
+    ) -> Qid:
     '''
     Create a TATTACH message.
     Parse an RATTACH message.
     '''
-    varfieldslen, varfields = mkbytefields(uname, aname)
-    fields = (
-        fid
-        , afid
-        , *varfields
-        , mkfield(n_uname, 4)
-        )
     _, msgbody = await implementation.message(
-        (c.TATTACH, 12+varfieldslen, fields)
+        ENCODE_U[c.TATTACH](fid, afid, uname, aname, n_uname)
         )
-    return msgbody[:13]
+    return DECODE_U[c.RATTACH](msgbody)[0]
 
 async def p9u_auth(
     implementation
-    , afid: bytes
+    , afid: FidT
     , uname: bytes
     , aname: bytes
     , n_uname: int
-    ) -> bytes:
+    ) -> Qid:
     '''
     Create a TAUTH message body.
     Parse an RAUTH message body.
     '''
-    varfieldslen, varfields = mkbytefields(uname, aname)
-    fields = (
-        afid
-        , *varfields
-        , mkfield(n_uname, 4)
-        )
     _, msgbody = await implementation.message(
-        (c.TATTACH, 8+varfieldslen, fields)
+        ENCODE_U[c.TAUTH](afid, uname, aname, n_uname)
         )
-    return msgbody[:13]
+    return DECODE_U[c.RAUTH](msgbody)[0]
 
 async def p9u_stat(
     implementation
-    , fid: bytes
-    ) -> Py9P2000uStat:
+    , fid: FidT
+    ) -> StatUView:
     '''
     Create a TSTAT message body.
-    Parse an RSTAT message body.
+    Parse an RSTAT message body into a view decoding fields on access.
     '''
-    _, msgbody = await implementation.message(
-        (c.TSTAT, 4, (fid,))
-        )
-    return Py9P2000uStat.from_bytes(msgbody, 2)
+    _, msgbody = await implementation.message(ENCODE_U[c.TSTAT](fid))
+    return StatUView(DECODE_U[c.RSTAT](msgbody)[0])
 
 async def p9u_create( # pylint: disable=too-many-arguments
     implementation
-    , fid: bytes
+    , fid: FidT
     , name: bytes
     , perm: int
     , mode: int
     , extension: bytes
-    ) -> Tuple[bytes, int]:
+    ) -> Tuple[Qid, int]:
     '''
     Create a TCREATE message body.
     Parse an RCREATE message body.
     '''
-    namelen, namefields = mkbytefields(name)
-    extlen, extfields = mkbytefields(extension)
-    fields = (fid, *namefields, mkfield(perm, 4), mkfield(mode, 1), *extfields)
     _, msgbody = await implementation.message(
-        (c.TWRITE, 10 + namelen + extlen, fields)
+        ENCODE_U[c.TCREATE](fid, name, perm, mode, extension)
         )
-    return msgbody[:13], extract(msgbody, 13, 4)
+    return DECODE_U[c.RCREATE](msgbody)
 
 async def p9u_wstat(
     implementation
-    , fid: bytes
+    , fid: FidT
     , stat: Py9P2000uStat
     ) -> None:
     '''
@@ -113,6 +92,7 @@ class Py9P2000uClient(Py9P2000Client): # pylint: disable=too-few-public-methods
     '''
     A client for the 9P2000 dialect.
     '''
+    __slots__ = ()
     versionstring = b'9P2000.u'
     attach_u = p9u_attach
     auth_u = p9u_auth
@@ -7,9 +7,9 @@ from asyncio import run, get_running_loop, sleep as asleep
 from logging import getLogger, StreamHandler, Formatter
 from os import remove
 
-from aio9p.protocol import Py9PServer, Py9PClient
+from aio9p.protocol import Py9PServer, Py9PBufferedServer, Py9PClient
 
-async def example_server(logger, implementation, sockpath='./py9p.sock'):
+async def example_server(logger, implementation, sockpath='./py9p.sock', buffered=False):
     '''
     Wrapper for the example servers.
     '''
@@ -17,10 +17,13 @@ async def example_server(logger, implementation, sockpath='./py9p.sock'):
         remove(sockpath)
     except FileNotFoundError:
         pass
+    server_class = Py9PBufferedServer if buffered else Py9PServer
+    implementation_logger = logger.getChild('implementation')
+    server_logger = logger.getChild('server')
     server = await get_running_loop().create_unix_server(
-        lambda: Py9PServer(
-            implementation(65535, logger=logger.getChild('implementation'))
-            , logger=logger.getChild('server')
+        lambda: server_class(
+            implementation(65535, logger=implementation_logger)
+            , logger=server_logger
             )
         , path=sockpath
         )
@@ -30,13 +33,14 @@ async def example_server(logger, implementation, sockpath='./py9p.sock'):
         while True:
             await asleep(3600)
 
-async def example_client(logger, client, sockpath='./py9p.sock'):
+async def example_client(logger, client, sockpath='./py9p.sock', buffered=False):
     '''
     Wrapper for the example clients.
     '''
     async with Py9PClient(
         logger=logger.getChild('client')
         , remote={'path': sockpath}
+        , buffered=buffered
         ) as conn:
         await client(conn)
     return None
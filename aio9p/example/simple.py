@@ -7,7 +7,7 @@ any changes to file modes.
 from errno import ENOENT
 from os import strerror
 
-from aio9p.constant import QTByteDIR, DMDIR, DMFILE, RERROR, ENCODING
+from aio9p.constant import DMDIR, DMFILE, RERROR, ENCODING
 from aio9p.dialect import Py9P2000
 from aio9p.helper import mkbytefields, mkstrfields, mkqid, mkfield
 from aio9p.protocol import Py9PException, Py9PBadFID
@@ -15,7 +15,7 @@ from aio9p.stat import Py9P2000Stat
 
 from aio9p.example import example_main
 
-BASEQID = QTByteDIR + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00\x00\x00\x00\x00'
+BASEQID = mkqid(DMDIR, 0)
 
 class Simple9P2000(Py9P2000):
     '''
@@ -105,6 +105,13 @@ class Simple9P2000(Py9P2000):
         '''
         self._fid.pop(fid, None)
         return None
+    async def clunkall(self):
+        '''
+        Drops all fids of the session.
+        '''
+        for fid in tuple(self._fid):
+            await self.clunk(fid)
+        return None
     async def walk(self, fid, newfid, wnames):
         '''
         Implementation.
@@ -152,18 +159,17 @@ class Simple9P2000(Py9P2000):
             raise Py9PBadFID
         filecontent = self._content.get(qid)
         if filecontent is not None:
-            return filecontent[offset:offset+count]
+            return memoryview(filecontent)[offset:offset+count]
         dircontent = self._direntry.get(qid)
         diroffset = 0
         res = []
         reslen = 0
         self._logger.debug('Reading directory: %s %s %s', offset, count, dircontent)
-        for entryname, entryqid in sorted(dircontent.items()): #TODO: Check for bad offsets
+        for _, entryqid in sorted(dircontent.items()): #TODO: Check for bad offsets
             entrystat = self._stat.get(entryqid)
             if entrystat is None:
                 raise Py9PBadFID
             entrysize = entrystat.size()
-            self._logger.debug('Reading entry: %s %s %s', entryname, entrysize, entrystat)
             if offset <= diroffset and reslen + entrysize <= count:
                 res.append(entrystat)
                 reslen = reslen + entrysize
@@ -181,7 +187,7 @@ class Simple9P2000(Py9P2000):
         if content is None or stat is None:
             self._logger.error('Bad Write FID: %s %s', fid, self._fid, self._stat)
             raise Py9PBadFID
-        self._logger.debug('Writing to %s at %i for length %i : %s ', qid, offset, len(data), data)
+        self._logger.debug('Writing to %s at %i for length %i', qid, offset, len(data))
         if len(content) < offset:
             return 0
         newcontent = content[:offset] + data + content[offset+len(data):]
@@ -204,7 +210,7 @@ class Simple9P2000(Py9P2000):
             raise Py9PException(f'File name exists: {name}')
         newqid = mkqid(
             mode
-            , int.from_bytes(max(k[5:] for k in self._stat), 'little') + 1
+            , max(k.path for k in self._stat) + 1
             )
         dircontent[name] = newqid
         parentmode = dirstat.p9mode
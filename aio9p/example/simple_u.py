@@ -116,7 +116,7 @@ class Simple9P2000u(Simple9P2000, Py9P2000u):
             raise Py9PException(f'File name exists: {name}')
         newqid = mkqid(
             mode
-            , int.from_bytes(max(k[5:] for k in self._stat), 'little') + 1
+            , max(k.path for k in self._stat) + 1
             )
         dircontent[name] = newqid
         parentmode = dirstat.p9mode
@@ -0,0 +1,127 @@
+'''
+Fid allocation for the client side. Fids are handed out from a free list
+and clunked in the background once they are no longer needed, so that
+short-lived fids do not cost their callers a round trip each.
+'''
+
+from asyncio import Handle, Task, create_task, get_running_loop, wait
+from typing import List, Optional, Set
+
+import aio9p.constant as c
+from aio9p.schema import ENCODE
+
+FID_START = 0x80000000
+
+class Py9PFids():
+    '''
+    Hands out fids from `start` up to, but excluding, `stop`. Fids given
+    back with `clunk` are clunked in the background: all clunks queued
+    during one event loop iteration are sent as one batch, and a fid is
+    reused once the server has replied to its TCLUNK, whether the reply is
+    an error or not. Clunks that fail because the connection is gone are
+    not retried, as the server has let go of all fids anyway.
+
+    By default, the upper half of the fid space is used, which leaves the
+    lower half to fids picked by hand.
+    '''
+    __slots__ = (
+        '_client', '_free', '_next', '_stop', '_queued', '_handle', '_flushing'
+        )
+    def __init__(self, client, start: int = FID_START, stop: int = c.NOFID):
+        '''
+        Allocate fids for `client`.
+        '''
+        self._client = client
+        self._free: List[int] = []
+        self._next = start
+        self._stop = stop
+        self._queued: List[int] = []
+        self._handle: Optional[Handle] = None
+        self._flushing: Set[Task] = set()
+        return None
+    def take(self) -> int:
+        '''
+        A fid that is not in use.
+        '''
+        if self._free:
+            return self._free.pop()
+        fid = self._next
+        if fid >= self._stop:
+            raise RuntimeError('Out of fids')
+        self._next = fid + 1
+        return fid
+    def discard(self, fid: int) -> None:
+        '''
+        Give back a fid the server does not know, such as the new fid of a
+        failed TWALK, without clunking it.
+        '''
+        self._free.append(fid)
+        return None
+    def clunk(self, fid: int) -> None:
+        '''
+        Queue a fid to be clunked and return at once.
+        '''
+        self._queued.append(fid)
+        if self._handle is None:
+            self._handle = get_running_loop().call_soon(self._flush)
+        return None
+    def _flush(self) -> None:
+        '''
+        Send all queued clunks as one batch.
+        '''
+        self._handle = None
+        fids = self._queued
+        if not fids:
+            return None
+        self._queued = []
+        task = create_task(self._clunkall(fids))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+        return None
+    async def _clunkall(self, fids: List[int]) -> None:
+        '''
+        Clunk `fids` and put them back on the free list.
+        '''
+        encode = ENCODE[c.TCLUNK]
+        try:
+            await self._client.batch(
+                [encode(fid) for fid in fids]
+                , return_exceptions=True
+                )
+        except (ConnectionError, RuntimeError):
+            pass
+        self._free.extend(fids)
+        return None
+    async def flush(self) -> None:
+        '''
+        Send all queued clunks and wait for the replies.
+        '''
+        if self._handle is not None:
+            self._handle.cancel()
+        self._flush()
+        while self._flushing:
+            await wait(tuple(self._flushing))
+        return None
+    def __call__(self) -> 'Py9PFid':
+        '''
+        A fid as an asynchronous context manager, see Py9PFid.
+        '''
+        return Py9PFid(self)
+
+class Py9PFid():
+    '''
+    Takes a fid from a Py9PFids on entry and queues it to be clunked on
+    exit, without waiting for the reply.
+    '''
+    __slots__ = ('_fids', 'fid')
+    def __init__(self, fids: Py9PFids):
+        self._fids = fids
+        self.fid: Optional[int] = None
+        return None
+    async def __aenter__(self) -> int:
+        self.fid = self._fids.take()
+        return self.fid
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._fids.clunk(self.fid)
+        self.fid = None
+        return None
@@ -0,0 +1,338 @@
+'''
+Asynchronous file objects for the client side, keeping several requests in
+flight to make bulk transfers bound by bandwidth rather than round trips.
+'''
+
+from asyncio import Task, create_task
+from collections import deque
+from typing import AsyncIterable, Deque, List, Optional, Tuple
+
+import aio9p.constant as c
+from aio9p.helper import BufferT, FidT
+from aio9p.protocol import Py9PException
+from aio9p.schema import DECODE, ENCODE
+
+def chunksize(msize: int, iounit: int = 0) -> int:
+    '''
+    The largest amount of data a single TREAD or TWRITE may carry, given
+    the negotiated message size and the iounit returned by TOPEN or
+    TCREATE, where 0 means no limit.
+    '''
+    res = msize - c.IOHDRSZ
+    if 0 < iounit < res:
+        res = iounit
+    if res <= 0:
+        raise ValueError('Message size too small', msize)
+    return res
+
+class Py9PReader():
+    '''
+    Reads an open fid at consecutive offsets with several TREADs in flight.
+    The number of reads kept in flight ahead of the position starts at
+    `window` and doubles with every full chunk read in sequence, up to
+    `max_inflight` bytes. Seeking drops the read-ahead and starts over. Replies are
+    reassembled in order; a short read ends the read-ahead and is followed
+    up at the offset it stopped at, and an empty one marks the end of the
+    file.
+
+    The fid is not clunked by the reader.
+    '''
+    __slots__ = (
+        '_client', '_fid', '_chunk', '_window', '_initial', '_max_window'
+        , '_position', '_next', '_pending', '_current', '_eof'
+        )
+    def __init__( # pylint: disable=too-many-arguments
+        self
+        , client
+        , fid: FidT
+        , iounit: int = 0
+        , offset: int = 0
+        , window: int = 2
+        , max_inflight: int = 0x400000
+        ):
+        '''
+        Read from `fid` of `client`, starting at `offset`. The client must
+        have negotiated its message size.
+        '''
+        if client.maxsize is None:
+            raise RuntimeError('Message size not negotiated')
+        self._client = client
+        self._fid = fid
+        self._chunk = chunksize(client.maxsize, iounit)
+        self._max_window = max(1, max_inflight // self._chunk)
+        self._initial = min(max(1, window), self._max_window)
+        self._window = self._initial
+        self._position = offset
+        self._next = offset
+        self._pending: Deque[Tuple[int, int, Task]] = deque()
+        self._current = memoryview(b'')
+        self._eof = False
+        return None
+    def tell(self) -> int:
+        '''
+        The offset of the next byte read.
+        '''
+        return self._position
+    def seek(self, offset: int) -> int:
+        '''
+        Continue reading at `offset`.
+        '''
+        if offset != self._position:
+            self._reset(offset)
+            self._window = self._initial
+        return offset
+    def _drop(self) -> None:
+        '''
+        Cancel all reads in flight.
+        '''
+        for _, _, task in self._pending:
+            task.cancel()
+        self._pending.clear()
+        return None
+    def _reset(self, offset: int) -> None:
+        '''
+        Drop all read-ahead and continue at `offset`.
+        '''
+        self._drop()
+        self._current = memoryview(b'')
+        self._position = offset
+        self._next = offset
+        self._eof = False
+        return None
+    def _issue(self, until: int) -> None:
+        '''
+        Keep the read-ahead window in flight, and as far as `max_inflight`
+        permits enough reads to cover everything up to offset `until`.
+        '''
+        pending = self._pending
+        chunk = self._chunk
+        message = self._client.message
+        encode = ENCODE[c.TREAD]
+        while len(pending) < self._window or (
+            self._next < until and len(pending) < self._max_window
+            ):
+            offset = self._next
+            pending.append((offset, chunk, create_task(
+                message(encode(self._fid, offset, chunk))
+                )))
+            self._next = offset + chunk
+        return None
+    async def _advance(self) -> None:
+        '''
+        Wait for the next chunk in order.
+        '''
+        offset, count, task = self._pending.popleft()
+        try:
+            _, msgbody = await task
+        except BaseException:
+            self._reset(self._position)
+            raise
+        data = DECODE[c.RREAD](msgbody)[0]
+        if len(data) < count:
+            self._drop()
+            self._next = offset + len(data)
+            self._eof = not data
+        elif self._window < self._max_window:
+            self._window = min(2 * self._window, self._max_window)
+        self._current = data
+        return None
+    async def read(self, size: int = -1) -> bytes:
+        '''
+        Read up to `size` bytes, or up to the end of the file if `size` is
+        negative. Returns less only at the end of the file.
+        '''
+        parts: List[memoryview] = []
+        until = -1 if size < 0 else self._position + size
+        while until < 0 or self._position < until:
+            if not self._current:
+                if self._eof:
+                    break
+                self._issue(until)
+                await self._advance()
+                continue
+            take = len(self._current) if until < 0 else until - self._position
+            part = self._current[:take]
+            self._current = self._current[len(part):]
+            self._position = self._position + len(part)
+            parts.append(part)
+        return b''.join(parts)
+    async def close(self) -> None:
+        '''
+        Drop all read-ahead.
+        '''
+        self._reset(self._position)
+        return None
+    async def __aenter__(self) -> 'Py9PReader':
+        return self
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+        return None
+
+class Py9PWriter():
+    '''
+    Writes to an open fid at consecutive offsets with several TWRITEs in
+    flight. Data is sent in chunks of the largest size a TWRITE may carry;
+    smaller writes are collected until a chunk is full or the writer is
+    flushed. At most `max_inflight` bytes are in flight, beyond that
+    writing waits for the server to catch up.
+
+    Writes complete before the server has acknowledged them. Errors and
+    short writes are raised by the next call to `write`, `flush` or
+    `close`, after which the writer is unusable. The fid is not clunked by
+    the writer.
+    '''
+    __slots__ = (
+        '_client', '_fid', '_chunk', '_max_inflight', '_offset', '_staged'
+        , '_pending', '_inflight', '_error', '_closed'
+        )
+    def __init__( # pylint: disable=too-many-arguments
+        self
+        , client
+        , fid: FidT
+        , iounit: int = 0
+        , offset: int = 0
+        , max_inflight: int = 0x400000
+        ):
+        '''
+        Write to `fid` of `client`, starting at `offset`. The client must
+        have negotiated its message size.
+        '''
+        if client.maxsize is None:
+            raise RuntimeError('Message size not negotiated')
+        self._client = client
+        self._fid = fid
+        self._chunk = chunksize(client.maxsize, iounit)
+        self._max_inflight = max(max_inflight, self._chunk)
+        self._offset = offset
+        self._staged = bytearray()
+        self._pending: Deque[Tuple[int, int, Task]] = deque()
+        self._inflight = 0
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        return None
+    def tell(self) -> int:
+        '''
+        The offset the next byte written goes to.
+        '''
+        return self._offset + len(self._staged)
+    def _check(self) -> None:
+        '''
+        Raise the first error that occurred, or if the writer is closed.
+        '''
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError('Writer closed')
+        return None
+    def _drop(self) -> None:
+        '''
+        Cancel all writes in flight and discard collected data.
+        '''
+        for _, _, task in self._pending:
+            task.cancel()
+        self._pending.clear()
+        self._inflight = 0
+        self._staged = bytearray()
+        return None
+    async def _settle(self) -> None:
+        '''
+        Wait for the oldest write in flight and check its result.
+        '''
+        offset, count, task = self._pending.popleft()
+        self._inflight = self._inflight - count
+        try:
+            _, msgbody = await task
+            written = DECODE[c.RWRITE](msgbody)[0]
+            if written != count:
+                raise Py9PException('Short write', offset, written, count)
+        except Exception as exception: # pylint: disable=broad-except
+            self._error = exception
+            self._drop()
+        return None
+    async def _send(self, data: BufferT) -> None:
+        '''
+        Send a chunk, waiting for earlier writes to free up room first.
+        '''
+        pending = self._pending
+        while pending and (
+            pending[0][2].done()
+            or self._inflight + len(data) > self._max_inflight
+            ):
+            await self._settle()
+        self._check()
+        offset = self._offset
+        pending.append((offset, len(data), create_task(self._client.message(
+            ENCODE[c.TWRITE](self._fid, offset, data)
+            ))))
+        self._offset = offset + len(data)
+        self._inflight = self._inflight + len(data)
+        return None
+    async def write(self, data: BufferT) -> int:
+        '''
+        Write all of `data`, returning its length. Only bytes are sent
+        without being copied, other buffers may be modified once this
+        returns.
+        '''
+        self._check()
+        view = memoryview(data).cast('B')
+        owned = data.__class__ is bytes
+        total = len(view)
+        chunk = self._chunk
+        if self._staged:
+            take = chunk - len(self._staged)
+            self._staged += view[:take]
+            view = view[take:]
+            if len(self._staged) < chunk:
+                return total
+            staged = self._staged
+            self._staged = bytearray()
+            await self._send(staged)
+        while len(view) >= chunk:
+            part = view[:chunk]
+            view = view[chunk:]
+            await self._send(part if owned else bytes(part))
+        if view:
+            self._staged += view
+        return total
+    async def write_from(self, chunks: AsyncIterable[BufferT]) -> int:
+        '''
+        Write everything `chunks` yields, returning the number of bytes.
+        '''
+        total = 0
+        async for data in chunks:
+            total = total + await self.write(data)
+        return total
+    async def flush(self) -> None:
+        '''
+        Send collected data and wait until all writes are acknowledged.
+        '''
+        self._check()
+        if self._staged:
+            staged = self._staged
+            self._staged = bytearray()
+            await self._send(staged)
+        while self._pending:
+            await self._settle()
+        self._check()
+        return None
+    async def close(self) -> None:
+        '''
+        Flush and close the writer. Closing again does nothing.
+        '''
+        if self._closed:
+            return None
+        try:
+            await self.flush()
+        finally:
+            self._closed = True
+            self._drop()
+        return None
+    async def __aenter__(self) -> 'Py9PWriter':
+        return self
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            await self.close()
+        else:
+            self._closed = True
+            self._drop()
+        return None
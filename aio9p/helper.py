@@ -6,60 +6,129 @@ Various utility functions and values:
     - The default NULL logger
 '''
 
-from itertools import chain
 from logging import getLogger, NullHandler
-from typing import Union, Tuple, Generator
+from typing import Any, Callable, Union, Tuple
 
+from aio9p.codec import U8, U16, U32, U64, QID
 from aio9p.constant import ENCODING
 
+BufferT = Union[bytes, bytearray, memoryview]
+FidT = Union[int, bytes]
 FieldsT = Union[Tuple[()], Tuple[bytes, ...]]
 MsgT = Tuple[int, int, FieldsT]
 RspT = Tuple[int, bytes]
 
+class Releasable(): # pylint: disable=too-few-public-methods
+    '''
+    A buffer that is passed to the transport without copying, together with
+    a callback that is called once the transport no longer needs it. Until
+    then, the buffer must not be modified.
+
+    Handlers may return a Releasable wherever they return message data, in
+    particular from `read`.
+    '''
+    __slots__ = ('data', 'release')
+    def __init__(self, data: Any, release: Callable[[], Any]):
+        '''
+        `data` may be any contiguous object supporting the buffer protocol.
+        '''
+        self.data = data if isinstance(data, bytes) else memoryview(data).cast('B')
+        self.release = release
+        return None
+    def __len__(self) -> int:
+        '''
+        The length of the data in bytes.
+        '''
+        return len(self.data)
+
 NULL_LOGGER = getLogger('')
 NULL_LOGGER.setLevel('CRITICAL')
 NULL_LOGGER.addHandler(NullHandler())
 
-def mkqid(mode: int, base: Union[int, bytes], version: int = 0) -> bytes:
+class Qid(bytes):
+    '''
+    A qid in its 13-byte wire format, with accessors for its parts. Being
+    bytes, a qid is written out and compared as it is.
+    '''
+    __slots__ = ()
+    @property
+    def qtype(self) -> int:
+        '''
+        The type of the file, the high byte of its mode.
+        '''
+        return self[0]
+    @property
+    def version(self) -> int:
+        '''
+        The version of the file.
+        '''
+        return QID.unpack(self)[1]
+    @property
+    def path(self) -> int:
+        '''
+        The number uniquely identifying the file on the server.
+        '''
+        return QID.unpack(self)[2]
+    def __repr__(self) -> str:
+        return f'Qid(qtype={self.qtype:#x}, version={self.version}, path={self.path})'
+
+def mkqid(mode: int, base: Union[int, bytes], version: int = 0) -> Qid:
     '''
     Create a qid from a base reference, a mode, and an optional version.
     '''
     if isinstance(base, int):
-        base = base.to_bytes(8, 'little')
-    return b''.join((
-        (mode >> 24).to_bytes(1, 'little')
-        , version.to_bytes(4, 'little')
-        , base
-        ))
+        return Qid(QID.pack(mode >> 24, version, base))
+    return Qid(QID.pack(mode >> 24, version, 0)[:5] + base)
+
+_INTS = {
+    1: U8
+    , 2: U16
+    , 4: U32
+    , 8: U64
+    }
 
 def extract(msg: bytes, offset: int, size: int) -> int:
     '''
     Extract the field of size size at offset offset as a little-endian integer.
+    Does not copy for the usual field sizes of 1, 2, 4 and 8 bytes.
     '''
-    return int.from_bytes(msg[offset:offset+size], byteorder='little')
-
-def extract_bytefields(msg: bytes, offset: int, count: int) -> Tuple[bytes, ...]:
-    '''
-    Extract count bytefields starting at offset offset.
-    '''
-    return tuple(_gen_bytefields(msg, offset, count))
+    codec = _INTS.get(size)
+    if codec is None:
+        return int.from_bytes(msg[offset:offset+size], byteorder='little')
+    return codec.unpack_from(msg, offset)[0]
 
-def _gen_bytefields(msg: bytes, offset: int, count: int) -> Generator[bytes, None, None]:
+def extract_bytefield_views(
+    msg: BufferT
+    , offset: int
+    , count: int
+    ) -> Tuple[Tuple[memoryview, ...], int]:
     '''
-    The generator version of extract_bytefields.
+    Extract count bytefields starting at offset offset as memoryviews into
+    msg, without copying. Returns the views and the offset following the
+    last field.
     '''
-    msglen = len(msg)
+    view = memoryview(msg)
+    msglen = len(view)
+    res = []
     while count > 0:
         if msglen < offset + 2:
-            raise ValueError('Incomplete length field', msg, offset)
-        fieldlen = extract(msg, offset, 2)
+            raise ValueError('Incomplete length field', offset, msglen)
+        (fieldlen,) = U16.unpack_from(view, offset)
         nextoffset = offset + 2 + fieldlen
         if msglen < nextoffset:
-            raise ValueError('Incomplete content field', msg, offset)
-        yield msg[offset+2:nextoffset]
+            raise ValueError('Incomplete content field', offset, msglen)
+        res.append(view[offset+2:nextoffset])
         offset = nextoffset
         count = count - 1
+    return tuple(res), offset
 
+def extract_bytefields(msg: BufferT, offset: int, count: int) -> Tuple[bytes, ...]:
+    '''
+    Extract count bytefields starting at offset offset. The fields are
+    always returned as bytes, even if msg is a memoryview.
+    '''
+    views, _ = extract_bytefield_views(msg, offset, count)
+    return tuple(bytes(view) for view in views)
 
 def mkfield(value: int, size: int) -> bytes:
     '''
@@ -70,19 +139,22 @@ def mkfield(value: int, size: int) -> bytes:
     except (AttributeError, OverflowError, ValueError) as e:
         raise ValueError('Failed to convert field', value, size) from e
 
-def mkbytefields(*payloads: bytes) -> Tuple[int, FieldsT]:
+def mkbytefields(*payloads: BufferT) -> Tuple[int, FieldsT]:
     '''
     Equip the arguments with the two-byte length envelopes mandated by 9P.
     Returns the total length and a tuple of the resulting fields. Does not join
     envelopes with their contents - the length of the result tuple is twice the
-    argument count.
+    argument count. Payloads are passed on as they are, so memoryviews are
+    not copied.
     '''
-    total = sum((2 + len(payload) for payload in payloads))
-    resfields = tuple(chain.from_iterable(
-        (len(payload).to_bytes(2, byteorder='little'), payload)
-        for payload in payloads
-        ))
-    return total, resfields
+    total = 0
+    resfields = []
+    for payload in payloads:
+        payloadlen = len(payload)
+        total = total + 2 + payloadlen
+        resfields.append(U16.pack(payloadlen))
+        resfields.append(payload)
+    return total, tuple(resfields)
 
 def mkstrfields(*args: str) -> Tuple[int, FieldsT]:
     '''
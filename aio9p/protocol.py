@@ -3,20 +3,45 @@
 The interface between aio9p and asyncio.
 '''
 
-from asyncio import create_task, Task, get_running_loop, Protocol, Semaphore, Event
-from typing import Optional, Tuple
+from asyncio import (
+    create_task
+    , CancelledError
+    , Task
+    , get_running_loop
+    , BufferedProtocol
+    , Future
+    , Protocol
+    , wait
+    )
+from collections import Counter, deque
+from contextvars import copy_context
+from functools import partial
+from sys import version_info
+from typing import (
+    Any
+    , AsyncIterator
+    , Callable
+    , Deque
+    , Iterable
+    , List
+    , Optional
+    , Tuple
+    )
 
 import aio9p.constant as c
+from aio9p.buffer import Py9PBuffer
+from aio9p.codec import FIDPAIR, HEADER, HEADER_INT, U32, VERSION
+from aio9p.fid import Py9PFids
+from aio9p.scheduler import Py9PScheduler
 from aio9p.helper import (
-    extract
-    , extract_bytefields
-    , mkfield
-    , mkbytefields
+    extract_bytefield_views
     , NULL_LOGGER
+    , Releasable
     , FieldsT
     , MsgT
     , RspT
     )
+from aio9p.trace import debug_tracer, DISPATCH, RECV, SEND, TracerT
 
 class Py9PException(Exception):
     '''
@@ -32,7 +57,7 @@ class Py9PError(Py9PException):
         '''
         Populating the fields.
         '''
-        super().__init__(body, *args, **kwargs)
+        super().__init__(body, *args)
         for k, kwarg in kwargs.items():
             setattr(self, k, kwarg)
         self.body = body
@@ -41,13 +66,80 @@ class Py9PError(Py9PException):
 
 Py9PBadFID = Py9PException('Bad fid!')
 
+EAGER_START = version_info >= (3, 12)
+
+FID_MESSAGE_TYPES = frozenset((
+    c.TAUTH
+    , c.TATTACH
+    , c.TSTAT
+    , c.TCLUNK
+    , c.TWALK
+    , c.TOPEN
+    , c.TREAD
+    , c.TWRITE
+    , c.TCREATE
+    , c.TWSTAT
+    , c.TREMOVE
+    ))
+
 class Py9PCommon(Protocol):
     '''
     Common ground between client and server implementations.
     '''
-    _logger = NULL_LOGGER
-    _buffer = b''
-    _transport = None
+    __slots__ = (
+        'violations', '_logger', '_transport', '_msize', '_budget', '_buffer'
+        , '_output', '_outputsize', '_output_handle', '_cork_bytes'
+        , '_cork_delay', '_writing_paused', '_outputtotal', '_releases'
+        , '_release_handle', '_release_delay', '_tracer'
+        )
+    release_interval = 0.01
+    release_interval_max = 1.0
+    def __init__(
+        self
+        , cork_bytes: int = 0x10000
+        , cork_delay: float = 0.0
+        , maxsize: int = 0xFFFFFFFF
+        , memory_budget: Optional[int] = None
+        , tracer: Optional[TracerT] = None
+        ):
+        '''
+        Setting up the receive buffer and the output queue. Outgoing messages
+        are collected and written together at the end of the current event
+        loop iteration, or after `cork_delay` seconds if it is positive.
+        Once `cork_bytes` bytes are queued, they are written immediately.
+
+        Incoming frames larger than `maxsize`, or than the message size
+        negotiated later on, drop the connection. So do frames larger than
+        `memory_budget`. Such violations are counted in `violations`.
+
+        The release callbacks of `Releasable` fields are called once the
+        transport has written their data, which is checked after every
+        write, when writing resumes and when data arrives. While callbacks
+        are left, a timer checks as well, after `release_interval` seconds
+        and backing off to `release_interval_max` while nothing is written.
+
+        A `tracer` is called for every frame received and sent, see
+        aio9p.trace. Without one, subclasses trace to their logger if it is
+        enabled for debug messages.
+        '''
+        self.violations = Counter()
+        self._logger = NULL_LOGGER
+        self._transport = None
+        self._msize = maxsize
+        self._budget = memory_budget
+        self._buffer = Py9PBuffer()
+        self._output = []
+        self._outputsize = 0
+        self._output_handle = None
+        self._cork_bytes = cork_bytes
+        self._cork_delay = cork_delay
+        self._writing_paused = False
+        self._outputtotal = 0
+        self._releases = None
+        self._release_handle = None
+        self._release_delay = self.release_interval
+        self._tracer = tracer
+        return None
     def connection_made(self, transport):
         '''
         Storing the transport.
@@ -57,12 +149,20 @@ class Py9PCommon(Protocol):
         return None
     def connection_lost(self, exc):
         '''
-        Notify, nothing else.
+        Drop the transport, queued output and the receive buffer.
         '''
         if exc is None:
             self._logger.info('Connection terminated')
         else:
             self._logger.info('Lost connection: %s', exc)
+        self._transport = None
+        if self._output_handle is not None:
+            self._output_handle.cancel()
+            self._output_handle = None
+        self._output = []
+        self._outputsize = 0
+        self._buffer.release()
+        self._check_releases()
         return None
     def eof_received(self):
         '''
@@ -70,68 +170,460 @@ class Py9PCommon(Protocol):
         '''
         self._logger.info('End of file received')
         return None
+    def pause_writing(self):
+        '''
+        The peer is not draining the transport. Keep outgoing messages
+        queued until it does.
+        '''
+        self._logger.debug('Writing paused')
+        self._writing_paused = True
+        return None
+    def resume_writing(self):
+        '''
+        Write whatever has been queued in the meantime.
+        '''
+        self._logger.debug('Writing resumed')
+        self._writing_paused = False
+        self._flush_output()
+        self._check_releases()
+        return None
     def data_received(self, data):
         '''
-        Splitting incoming data into messages and processing these.
+        Splitting incoming data into messages and processing these. If
+        nothing is pending, frames are processed straight out of `data` and
+        only an incomplete remainder is copied into the receive buffer,
+        which is dropped again once it has been consumed.
+        '''
+        buffer = self._buffer
+        if buffer.start == buffer.end:
+            view = memoryview(data)
+            consumed = self._process_frames(view, 0, len(view))
+            if consumed < len(view):
+                buffer.feed(view[consumed:])
+            return None
+        buffer.feed(data)
+        buffer.start = self._process_frames(buffer.view, buffer.start, buffer.end)
+        if buffer.start == buffer.end:
+            buffer.release()
+        return None
+    def _process_frames(self, view: memoryview, start: int, end: int) -> int:
         '''
-        self._logger.debug('Data received: %s', data)
-        buffer = self._buffer + data
-        buflen = len(buffer)
-        msgstart = 0
-        while msgstart < buflen - 7:
-            msgsize = extract(buffer, msgstart, 4)
-            msgend = msgstart + msgsize
-            if buflen < msgend:
+        Process all complete frames in view[start:end]. Message bodies are
+        passed on as memoryview slices. Returns the offset of the first
+        unprocessed byte.
+        '''
+        if self._releases:
+            self._check_releases()
+        buffer = self._buffer
+        buffer.expected = 0
+        while end - start >= 7:
+            msgsize, msgtype, msgtag = HEADER.unpack_from(view, start)
+            if msgsize < 7 or msgsize > self._msize:
+                self._violation('msize', msgsize, self._msize)
+                return end
+            if self._budget is not None and msgsize > self._budget:
+                self._violation('budget', msgsize, self._budget)
+                return end
+            msgend = start + msgsize
+            if end < msgend:
+                buffer.expected = msgsize
                 break
-            msgtype = extract(buffer, msgstart+4, 1)
-            msgtag = buffer[msgstart+5:msgstart+7]
-            msgbody = buffer[msgstart+7:msgend]
-            self._logger.debug(
-                'Processing: Msgtype %s, tag %s , body %s'
-                , msgtype, msgtag, msgbody
-                )
+            msgbody = view[start+7:msgend]
+            if self._tracer is not None:
+                self._tracer(RECV, msgtype, msgtag, msgbody)
+            start = msgend
             self._process_incoming(msgtype, msgtag, msgbody)
-            msgstart = msgend
-        self._buffer = buffer[msgstart:]
+        return start
+    def _violation(self, kind: str, *args) -> None:
+        '''
+        Count a protocol violation by the peer and drop the connection.
+        '''
+        self._logger.error('Dropping connection, %s violation: %s', kind, args)
+        self.violations[kind] += 1
+        if self._transport is not None:
+            self._transport.abort()
+        return None
+    def _usage(self) -> int:
+        '''
+        The number of bytes of output that the peer has yet to receive.
+        '''
+        usage = self._outputsize
+        if self._transport is not None:
+            usage = usage + self._transport.get_write_buffer_size()
+        return usage
+    def _write(
+        self
+        , fields: FieldsT
+        , nbytes: int
+        , releases: Tuple[Callable[[], Any], ...] = ()
+        ) -> None:
+        '''
+        Queue the fields of an outgoing message for writing. The `releases`
+        callbacks are called once the message has been written. Without a
+        transport, the message is dropped.
+        '''
+        if self._transport is None:
+            self._logger.debug('Dropping output without transport: %s bytes', nbytes)
+            _run_releases(releases, self._logger)
+            return None
+        self._output.extend(fields)
+        self._outputsize = self._outputsize + nbytes
+        self._outputtotal = self._outputtotal + nbytes
+        if releases:
+            if self._releases is None:
+                self._releases = deque()
+            self._releases.append((self._outputtotal, releases))
+        if self._writing_paused:
+            pass
+        elif self._outputsize >= self._cork_bytes:
+            self._flush_output()
+        elif self._output_handle is None:
+            loop = get_running_loop()
+            if self._cork_delay > 0:
+                self._output_handle = loop.call_later(self._cork_delay, self._flush_output)
+            else:
+                self._output_handle = loop.call_soon(self._flush_output)
+        return None
+    def _flush_output(self) -> None:
+        '''
+        Write all queued messages in one go.
+        '''
+        if self._output_handle is not None:
+            self._output_handle.cancel()
+            self._output_handle = None
+        if not self._output or self._writing_paused:
+            return None
+        output = self._output
+        self._output = []
+        self._outputsize = 0
+        self._transport.writelines(output)
+        if self._releases:
+            self._check_releases()
+        return None
+    def _check_releases(self) -> None:
+        '''
+        Call the release callbacks of all messages the transport has
+        written, and make sure the timer checks again if some are left.
+        Output is written in order, so a message has been written once the
+        number of bytes queued after it exceeds what is still pending.
+        '''
+        releases = self._releases
+        if not releases:
+            return None
+        if self._transport is None:
+            written = self._outputtotal
+        else:
+            written = (
+                self._outputtotal
+                - self._outputsize
+                - self._transport.get_write_buffer_size()
+                )
+        if releases[0][0] <= written:
+            self._release_delay = self.release_interval
+            while releases and releases[0][0] <= written:
+                _, callbacks = releases.popleft()
+                _run_releases(callbacks, self._logger)
+        if not releases:
+            if self._release_handle is not None:
+                self._release_handle.cancel()
+                self._release_handle = None
+        elif self._release_handle is None:
+            self._release_handle = get_running_loop().call_later(
+                self._release_delay, self._release_timeout
+                )
+        return None
+    def _release_timeout(self) -> None:
+        '''
+        Check for written messages, backing off while nothing is.
+        '''
+        self._release_handle = None
+        self._release_delay = min(2 * self._release_delay, self.release_interval_max)
+        self._check_releases()
+        return None
+    def _set_maxsize(self, maxsize: int) -> None:
+        '''
+        Enforce the negotiated maximum message size and size future receive
+        buffers for it.
+        '''
+        self._msize = maxsize
+        self._buffer.size = max(maxsize, self._buffer.size)
         return None
-    def _process_incoming(self, msgtype: int, msgtag: bytes, msgbody: bytes):
+    def _process_incoming(self, msgtype: int, msgtag: bytes, msgbody: memoryview):
         '''
         Abstract method used to process incoming data.
         '''
         raise NotImplementedError
 
+class Py9PBuffered(BufferedProtocol):
+    '''
+    A mixin that makes the event loop read directly into the receive buffer
+    instead of allocating a fresh bytes object for every read. Must precede
+    a Py9PCommon subclass in the bases.
+    '''
+    __slots__ = ()
+    def get_buffer(self, sizehint):
+        '''
+        Hand out the free tail of the receive buffer. At least a quarter of
+        the buffer size is requested to keep reads reasonably large.
+        '''
+        buffer = self._buffer
+        return buffer.writable(max(sizehint, buffer.size >> 2))
+    def buffer_updated(self, nbytes):
+        '''
+        Process the frames completed by the latest read.
+        '''
+        buffer = self._buffer
+        buffer.commit(nbytes)
+        buffer.start = self._process_frames(buffer.view, buffer.start, buffer.end)
+        return None
+
 class Py9PServer(Py9PCommon):
     '''
     An asyncio protocol subclass for the 9P protocol.
     '''
-    def __init__(self, implementation, logger=None):
+    __slots__ = (
+        'implementation', 'scheduler', '_tasks', '_tasks_high', '_tasks_low'
+        , '_output_high', '_output_low', '_reading_paused', '_eager'
+        , '_fid_ordering', '_fidtails', '_inflight', '_closing'
+        )
+    fid_message_types = FID_MESSAGE_TYPES
+    def __init__( # pylint: disable=too-many-arguments
+        self
+        , implementation
+        , logger=None
+        , tasks_high: int = 256
+        , tasks_low: int = 128
+        , output_high: Optional[int] = None
+        , output_low: Optional[int] = None
+        , eager: Optional[bool] = None
+        , fid_ordering: bool = False
+        , scheduler: Optional[Py9PScheduler] = None
+        , **kwargs
+        ):
         '''
         Replacing the default null logger and setting a tiny default
-        message size.
+        message size. Keyword arguments configure the output queue, see
+        Py9PCommon.
+
+        With `eager`, handlers are run synchronously up to their first
+        suspension. Handlers that finish without suspending are replied
+        to immediately, without scheduling a task. This is the default on
+        Python 3.12 and later, where the first step runs inside an
+        eagerly started task. On earlier versions, the first step runs
+        outside of any task, in a copy of the current context, and
+        handlers that need `asyncio.current_task` there, as
+        `asyncio.timeout` does, must not be run eagerly.
+
+        With `fid_ordering`, messages of the types in `fid_message_types`
+        are run strictly in order of arrival per fid, while messages on
+        different fids still run concurrently. TWALK is ordered with
+        respect to both its fid and its newfid.
+
+        A `scheduler` limits the number of concurrently running handlers
+        per message type class, see Py9PScheduler. Ordering by fid happens
+        before admission by the scheduler.
+
+        Reading from the transport is paused once `tasks_high` messages are
+        in flight or the peer stops draining the transport, and resumed
+        when no more than `tasks_low` are left and writing has resumed.
+        `output_high` and `output_low` set the write buffer limits of the
+        transport.
+
+        With a `memory_budget`, messages whose body would push the bodies
+        in flight and the pending output over the budget are rejected with
+        an error reply. Replies larger than the negotiated
+        message size are replaced by an error reply as well.
         '''
-        super().__init__()
+        maxsize = getattr(implementation, 'maxsize', None)
+        if maxsize is not None:
+            kwargs.setdefault('maxsize', maxsize)
+        super().__init__(**kwargs)
         if logger is not None:
             self._logger = logger
+        if self._tracer is None:
+            self._tracer = debug_tracer(self._logger)
         self.implementation = implementation
 
-        self._transport = None
-
         self._tasks = {}
+        self._tasks_high = tasks_high
+        self._tasks_low = tasks_low
+        self._output_high = output_high
+        self._output_low = output_low
+        self._reading_paused = False
+        self._eager = EAGER_START if eager is None else eager
+        self._fid_ordering = fid_ordering
+        self._fidtails = {}
+        self.scheduler = scheduler
+        self._inflight = 0
+        self._closing = None
 
         return None
+    def connection_made(self, transport):
+        '''
+        Storing the transport and applying the write buffer limits.
+        '''
+        super().connection_made(transport)
+        if self._output_high is not None:
+            transport.set_write_buffer_limits(self._output_high, self._output_low)
+        return None
+    def connection_lost(self, exc):
+        '''
+        Cancel all outstanding work, then let the implementation release
+        the state of the session.
+        '''
+        super().connection_lost(exc)
+        tasks = tuple(self._tasks.values())
+        self._tasks = {}
+        self._fidtails = {}
+        for task in tasks:
+            task.cancel()
+        self._closing = create_task(self._close(tasks))
+        return None
+    async def _close(self, tasks) -> None:
+        '''
+        Wait for the cancelled tasks to wind down and call the
+        implementation's clunkall hook.
+        '''
+        if tasks:
+            await wait(tasks)
+        try:
+            await self.implementation.clunkall()
+        except Exception as exception: # pylint: disable=broad-except
+            self._logger.error('Failed to release session: %s', exception)
+        return None
+    def pause_writing(self):
+        '''
+        Stop accepting new work while the peer is not draining.
+        '''
+        super().pause_writing()
+        self._check_reading()
+        return None
+    def resume_writing(self):
+        '''
+        Accept new work again, if the task count permits.
+        '''
+        super().resume_writing()
+        self._check_reading()
+        return None
+    def _check_reading(self) -> None:
+        '''
+        Pause or resume reading according to the task watermarks and the
+        state of the transport.
+        '''
+        if self._transport is None:
+            return None
+        taskcount = len(self._tasks)
+        if self._reading_paused:
+            if taskcount <= self._tasks_low and not self._writing_paused:
+                self._reading_paused = False
+                self._transport.resume_reading()
+        elif taskcount >= self._tasks_high or self._writing_paused:
+            self._reading_paused = True
+            self._transport.pause_reading()
+        return None
     def _process_incoming(self, msgtype, msgtag, msgbody):
         '''
         Parses message headers and sets up tasks to process
         the bodies. FLUSH is handled immediately.
         '''
         if msgtype == c.TFLUSH:
-            self.flush(msgtag, msgbody)
+            self.flush(msgtag, bytes(msgbody[0:2]))
             return None
-        task = create_task(
-            self.implementation.process_msg(msgtype, msgbody)
-            )
+        if self._budget is not None:
+            bodysize = len(msgbody)
+            if self._inflight + bodysize + self._usage() > self._budget:
+                self.violations['budget'] += 1
+                self._logger.info('Rejecting message: memory budget exceeded %s', msgtag)
+                self.reply(msgtag, *self.implementation.errhandler(
+                    Py9PException('Memory budget exceeded')
+                    ))
+                return None
+        if self._tracer is not None:
+            self._tracer(DISPATCH, msgtype, msgtag, msgbody)
+        coro = self.implementation.process_msg(msgtype, msgbody)
+        if self.scheduler is not None:
+            coro = self.scheduler.run(msgtype, coro)
+        fids = ()
+        if self._fid_ordering and msgtype in self.fid_message_types:
+            fids = self._fids(msgtype, msgbody)
+            waits = [
+                tail for tail in map(self._fidtails.get, fids)
+                if tail is not None and not tail.done()
+                ]
+            if waits:
+                coro = _after(waits, coro)
+        if self._eager:
+            task = self._start(msgtag, coro)
+            if task is None:
+                return None
+        else:
+            task = create_task(coro)
         self._tasks[msgtag] = task
         task.add_done_callback(lambda x: self.sendmsg(msgtag, x))
+        if fids:
+            for fid in fids:
+                self._fidtails[fid] = task
+            task.add_done_callback(lambda x: self._release_fids(fids, x))
+        if self._budget is not None:
+            self._inflight = self._inflight + bodysize
+            task.add_done_callback(lambda _: self._release_inflight(bodysize))
+        if len(self._tasks) >= self._tasks_high:
+            self._check_reading()
+        return None
+    def _start(self, msgtag: bytes, coro) -> Optional[Task]:
+        '''
+        Run a handler up to its first suspension. Handlers that finish
+        are replied to right away; for the others, the task continuing
+        them is returned.
+        '''
+        if EAGER_START:
+            task = Task(coro, loop=get_running_loop(), eager_start=True) # pylint: disable=unexpected-keyword-arg
+            if not task.done():
+                return task
+            self._reply_task(msgtag, task)
+            return None
+        context = copy_context()
+        try:
+            yielded = context.run(coro.send, None)
+        except StopIteration as result:
+            self.reply(msgtag, *result.value)
+            return None
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except CancelledError:
+            self._logger.debug('Sending message: cancelled task %s', msgtag)
+            return None
+        except BaseException as exception: # pylint: disable=broad-except
+            self._logger.info('Sending message: Got exception %s %s', msgtag, exception)
+            self.reply(msgtag, *self.implementation.errhandler(exception))
+            return None
+        return context.run(create_task, _resume(coro, yielded))
+    @staticmethod
+    def _fids(msgtype: int, msgbody: memoryview) -> Tuple[int, ...]:
+        '''
+        The fids a message has to be ordered by.
+        '''
+        if msgtype == c.TWALK:
+            fid, newfid = FIDPAIR.unpack_from(msgbody)
+            if newfid != fid:
+                return fid, newfid
+            return (fid,)
+        return U32.unpack_from(msgbody)
+    def _release_inflight(self, bodysize: int) -> None:
+        '''
+        A message body is no longer in flight.
+        '''
+        self._inflight = self._inflight - bodysize
+        return None
+    def _release_fids(self, fids: Tuple[int, ...], task: Task) -> None:
+        '''
+        Forget about a finished task unless later messages have queued
+        up behind it.
+        '''
+        fidtails = self._fidtails
+        for fid in fids:
+            if fidtails.get(fid) is task:
+                del fidtails[fid]
         return None
     def flush(self, tag: bytes, oldtag: bytes) -> None:
         '''
@@ -142,13 +634,10 @@ class Py9PServer(Py9PCommon):
             pass
         else:
             task.cancel()
-        if self._transport is None:
-            raise RuntimeError
-        self._transport.writelines((
-            mkfield(7, 4)
-            , mkfield(c.RFLUSH, 1)
-            , tag
-            ))
+            self._check_reading()
+        if self._tracer is not None:
+            self._tracer(SEND, c.RFLUSH, tag, ())
+        self._write((HEADER.pack(7, c.RFLUSH, tag),), 7)
         return None
     def sendmsg(self, msgtag: bytes, task: Task):
         '''
@@ -158,55 +647,204 @@ class Py9PServer(Py9PCommon):
         if task.cancelled():
             self._logger.debug('Sending message: cancelled task %s', msgtag)
             return None
+        if self._transport is None:
+            self._logger.debug('Sending message: connection gone %s', msgtag)
+            if task.exception() is None:
+                _run_releases(_unwrap(task.result()[2])[1], self._logger)
+            return None
         task_stored = self._tasks.pop(msgtag, None)
         if not task_stored == task:
             self._logger.debug('Sending message: Mismatched task %s', msgtag)
             raise ValueError(msgtag, task, task_stored)
+        if self._reading_paused:
+            self._check_reading()
+        self._reply_task(msgtag, task)
+        return None
+    def _reply_task(self, msgtag: bytes, task: Task) -> None:
+        '''
+        Reply with the result of a finished task, or with an error if it
+        raised. Cancelled tasks get no reply.
+        '''
+        if task.cancelled():
+            self._logger.debug('Sending message: cancelled task %s', msgtag)
+            return None
         exception = task.exception()
         if exception is None:
             restype, reslen, fields = task.result()
         else:
             self._logger.info('Sending message: Got exception %s %s %s', msgtag, exception, task)
             restype, reslen, fields = self.implementation.errhandler(exception)
-        res = (
-            mkfield(reslen + 7, 4)
-            , mkfield(restype, 1)
-            , msgtag
-            ) + fields
-        self._logger.debug('Sending message: %s', b''.join(res).hex())
-        if self._transport is None:
-            raise RuntimeError
-        self._transport.writelines(res)
+        self.reply(msgtag, restype, reslen, fields)
+        return None
+    def reply(self, msgtag: bytes, restype: int, reslen: int, fields: FieldsT) -> None:
+        '''
+        Queue a reply for sending. `Releasable` fields are written
+        without copying and released once the transport is done with them.
+        '''
+        releases = ()
+        for field in fields:
+            if field.__class__ is Releasable:
+                fields, releases = _unwrap(fields)
+                break
+        if reslen + 7 > self._msize:
+            self.violations['reply_msize'] += 1
+            self._logger.error('Reply exceeds message size: %s %s', msgtag, reslen + 7)
+            _run_releases(releases, self._logger)
+            releases = ()
+            restype, reslen, fields = self.implementation.errhandler(
+                Py9PException('Reply exceeds message size')
+                )
+        if self._tracer is not None:
+            self._tracer(SEND, restype, msgtag, fields)
+        self._write(
+            (HEADER.pack(reslen + 7, restype, msgtag),) + fields
+            , reslen + 7
+            , releases
+            )
+        if restype == c.RVERSION:
+            maxsize = getattr(self.implementation, 'maxsize', None)
+            if maxsize is not None:
+                self._set_maxsize(maxsize)
         return None
 
+def _unwrap(fields: FieldsT) -> Tuple[FieldsT, Tuple[Callable[[], Any], ...]]:
+    '''
+    Replace `Releasable` fields by their data and collect their release
+    callbacks.
+    '''
+    releases = tuple(
+        field.release for field in fields if field.__class__ is Releasable
+        )
+    if not releases:
+        return fields, ()
+    return tuple(
+        field.data if field.__class__ is Releasable else field
+        for field in fields
+        ), releases
+
+def _run_releases(releases: Tuple[Callable[[], Any], ...], logger) -> None:
+    '''
+    Call release callbacks, logging rather than raising their errors.
+    '''
+    for release in releases:
+        try:
+            release()
+        except Exception as exception: # pylint: disable=broad-except
+            logger.error('Release callback failed: %s', exception)
+    return None
+
+class _Resumed(): # pylint: disable=too-few-public-methods
+    '''
+    An awaitable that continues a coroutine which has already been
+    stepped once, passing through everything it yields.
+    '''
+    def __init__(self, coro, yielded):
+        '''
+        `yielded` is what the first step of `coro` yielded.
+        '''
+        self._coro = coro
+        self._yielded = yielded
+        return None
+    def __await__(self):
+        '''
+        Drive the coroutine on behalf of the awaiting task.
+        '''
+        coro = self._coro
+        yielded = self._yielded
+        while True:
+            try:
+                sent = yield yielded
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as exception: # pylint: disable=broad-except
+                try:
+                    yielded = coro.throw(exception)
+                except StopIteration as result:
+                    return result.value
+            else:
+                try:
+                    yielded = coro.send(sent)
+                except StopIteration as result:
+                    return result.value
+
+async def _after(waits, coro):
+    '''
+    Run `coro` once all tasks in `waits` are done, regardless of
+    their outcome.
+    '''
+    try:
+        await wait(waits)
+    except BaseException:
+        coro.close()
+        raise
+    return await coro
+
+async def _resume(coro, yielded):
+    '''
+    Wrap a partially run coroutine so that it can become a task.
+    '''
+    return await _Resumed(coro, yielded)
+
+class Py9PBufferedServer(Py9PBuffered, Py9PServer):
+    '''
+    A Py9PServer that uses the asyncio.BufferedProtocol interface.
+    '''
+    __slots__ = ()
+
 
 class Py9PClient(): # pylint: disable=too-many-instance-attributes
     '''
     A class for the client side of the 9P protocol.
     '''
+    __slots__ = (
+        '_maxsize_preset', '_logger', '_remote', '_connection'
+        , 'connect', 'disconnect', 'message', 'batch', 'fids'
+        )
     versionstring = b'9P'
-    _logger = NULL_LOGGER
     def __init__( # pylint: disable=too-many-arguments
         self
         , remote
         , logger=None
         , maxsize=0xFFFF
-        , poolsize=0xFF
+        , poolsize=0xFFFF
+        , buffered=False
+        , memory_budget=None
+        , tracer=None
         ):
+        '''
+        Setting up the connection. With `buffered`, the connection uses
+        the asyncio.BufferedProtocol interface. Incoming frames larger than
+        `memory_budget` drop the connection. A `tracer` is called for every
+        frame, see aio9p.trace. Fids can be taken from `fids`, see
+        aio9p.fid.Py9PFids.
+        '''
         self._maxsize_preset = maxsize
-        if logger is not None:
-            self._logger = logger
+        self._logger = NULL_LOGGER if logger is None else logger
         self._remote = remote
-        connection = Py9PClientConnection(
+        connection_class = (
+            Py9PBufferedClientConnection if buffered else Py9PClientConnection
+            )
+        connection = connection_class(
             logger
             , self.errparser
             , maxsize
             , poolsize
+            , memory_budget
+            , tracer
             )
         self._connection = connection
         self.connect = connection.p9connect
         self.disconnect = connection.p9disconnect
         self.message = connection.message
+        self.batch = connection.batch
+        self.fids = Py9PFids(self)
+    @property
+    def maxsize(self) -> Optional[int]:
+        '''
+        The negotiated message size, None before negotiation.
+        '''
+        return self._connection.maxsize
     async def __aenter__(self):
         '''
         Sets up the underlying connection.
@@ -215,8 +853,9 @@ class Py9PClient(): # pylint: disable=too-many-instance-attributes
         return self
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         '''
-        Tears down the underlying connection.
+        Sends outstanding clunks and tears down the underlying connection.
         '''
+        await self.fids.flush()
         await self.disconnect()
         return None
     def errparser(
@@ -228,10 +867,10 @@ class Py9PClient(): # pylint: disable=too-many-instance-attributes
         '''
         Turns an error reply into an exception.
         '''
-        (errmsg,) = extract_bytefields(errmsgbody, 0, 1)
+        (errmsg,), _ = extract_bytefield_views(errmsgbody, 0, 1)
         return Py9PError(
-            errmsgbody
-            , errmsg=errmsg
+            bytes(errmsgbody)
+            , errmsg=bytes(errmsg)
             , tmsg_type=tmsg_type
             , tmsg_fields=tmsg_fields
             )
@@ -259,41 +898,40 @@ class Py9PClientConnection(Py9PCommon): # pylint: disable=too-many-instance-attr
     '''
     A class for the client connection of the 9P protocol.
     '''
-    _logger = NULL_LOGGER
+    __slots__ = (
+        'maxsize', '_errparser', '_maxsize_preset', '_inflight', '_tags'
+        , '_tagcount', '_poolsize', '_tagwaiters'
+        )
     def __init__( # pylint: disable=too-many-arguments
         self
         , logger
         , errparser
         , maxsize
         , poolsize
+        , memory_budget=None
+        , tracer=None
         ):
         '''
         Replacing the default null logger and setting a tiny default
-        message size.
+        message size. Every request in flight is a future in the in-flight
+        table, keyed by its tag. Tags are allocated as needed, up to
+        `poolsize` of them and at most 0xFFFF, and are reused most recently
+        freed first.
         '''
+        super().__init__(maxsize=maxsize, memory_budget=memory_budget, tracer=tracer)
         self._errparser = errparser
         self.maxsize = None
         self._maxsize_preset = maxsize
-        poolsize = min(poolsize, 0xFFFF-1) #Exclude NOTAG from pool
         if logger is not None:
             self._logger = logger
-        self._transport = None
+        if self._tracer is None:
+            self._tracer = debug_tracer(self._logger)
 
-        self._semaphore = Semaphore(poolsize)
-        self._tags = set(
-            mkfield(i, 2)
-            for i in range(poolsize)
-            )
-        self._event = {
-            tag: Event()
-            for tag in self._tags
-            }
-        self._event[c.NOTAG] = Event()
-        self._result = {
-            tag: None
-            for tag in self._tags
-            }
-        self._result[c.NOTAG] = None
+        self._inflight = {}
+        self._tags = []
+        self._tagcount = 0
+        self._poolsize = min(poolsize, c.NOTAG_INT) #Exclude NOTAG from pool
+        self._tagwaiters = None
         return None
     async def p9connect(self, remote):
         '''
@@ -320,19 +958,26 @@ class Py9PClientConnection(Py9PCommon): # pylint: disable=too-many-instance-attr
         return None
     def connection_made(self, transport):
         '''
-        Storing the transport.
+        Storing the transport and starting over with a full tag pool, as
+        the tags of a previous connection are meaningless.
         '''
         self._logger.info('Connection made')
         self._transport = transport
+        self._tags = []
+        self._tagcount = 0
         return None
     def connection_lost(self, exc):
         '''
-        Notify, nothing else.
+        Fail all requests in flight and those waiting for a tag.
         '''
-        if exc is None:
-            self._logger.info('Connection terminated')
-        else:
-            self._logger.info('Lost connection: %s', exc)
+        super().connection_lost(exc)
+        inflight = self._inflight
+        self._inflight = {}
+        waiters = self._tagwaiters or ()
+        self._tagwaiters = None
+        for future in (*inflight.values(), *waiters):
+            if not future.done():
+                future.set_exception(ConnectionError('Connection lost', exc))
         return None
     def eof_received(self):
         '''
@@ -340,40 +985,115 @@ class Py9PClientConnection(Py9PCommon): # pylint: disable=too-many-instance-attr
         '''
         self._logger.info('End of file received')
         return None
-    def _process_incoming(self, msgtype: int, msgtag: bytes, msgbody: bytes):
+    def _process_incoming(self, msgtype: int, msgtag: bytes, msgbody: memoryview):
         '''
-        Assign incoming messages to the correct event.
+        Resolve the future of the request a reply belongs to and free its
+        tag. Replies to cancelled requests only free the tag.
         '''
-        if msgtag not in self._event and msgtag != c.NOTAG:
-            self._logger.warn(
-                'Unsolicited tag received: %s %s %s'
-                , msgtype, msgtag, msgbody
+        tag = int.from_bytes(msgtag, 'little')
+        future = self._inflight.pop(tag, None)
+        if future is None:
+            self._logger.warning(
+                'Unsolicited tag received: %s %s', msgtype, msgtag
                 )
             return None
-        self._result[msgtag] = (msgtype, msgbody)
-        self._event[msgtag].set()
+        if tag != c.NOTAG_INT:
+            self._release_tag(tag)
+        if not future.done():
+            future.set_result((msgtype, msgbody))
         return None
-    async def message(self, msg: MsgT) -> RspT:
+    def _release_tag(self, tag: int) -> None:
+        '''
+        Hand a tag to the next request waiting for one, or put it on the
+        free list.
+        '''
+        waiters = self._tagwaiters
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(tag)
+                return None
+        self._tags.append(tag)
+        return None
+    async def _wait_tag(self) -> int:
+        '''
+        Wait until a tag is freed.
+        '''
+        if self._tagwaiters is None:
+            self._tagwaiters = deque()
+        waiter = get_running_loop().create_future()
+        self._tagwaiters.append(waiter)
+        try:
+            tag = await waiter
+        except BaseException:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                self._release_tag(waiter.result())
+            raise
+        if self._transport is None:
+            self._release_tag(tag)
+            raise RuntimeError
+        return tag
+    def _take_tag(self) -> Optional[int]:
+        '''
+        A free tag, or None if all are in use.
+        '''
+        if self._tags:
+            return self._tags.pop()
+        tag = self._tagcount
+        if tag < self._poolsize:
+            self._tagcount = tag + 1
+            return tag
+        return None
+    def _check(self, msg: MsgT) -> None:
         '''
-        Send a message and wait for the result.
+        Raise if a message cannot be sent.
         '''
+        msgtype, msglen, _ = msg
+        if msglen + 7 > self._msize:
+            raise ValueError('Message exceeds message size', msgtype, msglen + 7, self._msize)
+        if self._transport is None:
+            raise RuntimeError
+        return None
+    def _send(self, tag: int, msg: MsgT, eager: bool = False) -> Future:
+        '''
+        Queue a message under `tag` and return the future of its reply.
+        With `eager`, the message is written right away if it is the only
+        one in flight. Raises if the connection is gone, giving the tag
+        back.
+        '''
+        if self._transport is None:
+            self._release_tag(tag)
+            raise RuntimeError
         msgtype, msglen, fields = msg
-        async with self._semaphore:
-            tag = self._tags.pop()
-            if self._transport is None:
-                raise RuntimeError
-            self._transport.writelines((
-                mkfield(msglen + 7, 4)
-                , mkfield(msgtype, 1)
-                , tag
-                ) + fields
-                )
-            await self._event[tag].wait()
-            msgtype, msgbody = self._result.pop(tag)
-            self._tags.add(tag)
-            if msgtype == c.RERROR:
-                raise self._errparser(msgtype, fields, msgbody)
-            return msgtype, msgbody
+        future = get_running_loop().create_future()
+        inflight = self._inflight
+        inflight[tag] = future
+        if self._tracer is not None:
+            self._tracer(SEND, msgtype, tag.to_bytes(2, 'little'), fields)
+        self._write((HEADER_INT.pack(msglen + 7, msgtype, tag),) + fields, msglen + 7)
+        if eager and len(inflight) == 1:
+            self._flush_output()
+        return future
+    async def message(self, msg: MsgT) -> RspT:
+        '''
+        Send a message and wait for the result. A message is written
+        immediately if no other is in flight. Otherwise, messages sent
+        during the same event loop iteration are written together. If the
+        caller is cancelled, the tag stays in use until the server replies.
+        '''
+        self._check(msg)
+        tag = self._take_tag()
+        if tag is None:
+            tag = await self._wait_tag()
+        msgtype, msgbody = await self._send(tag, msg, True)
+        if msgtype == c.RERROR:
+            raise self._errparser(msgtype, msg[2], msgbody)
+        return msgtype, msgbody
+    def batch(self, msgs: Iterable[MsgT], return_exceptions: bool = False) -> 'Py9PBatch':
+        '''
+        Send many messages at once, see Py9PBatch.
+        '''
+        return Py9PBatch(self, msgs, return_exceptions)
     async def negotiate(
         self
         , versionstring: bytes
@@ -386,31 +1106,147 @@ class Py9PClientConnection(Py9PCommon): # pylint: disable=too-many-instance-attr
         remainder of the response, which for 9P2000 and the .u and .L dialects
         is empty.
         '''
-        cverlen, cverfields = mkbytefields(versionstring)
-        reqlen = 4 + cverlen + sum(map(len, additional_fields), start=0)
-        reqfields = (mkfield(maxsize, 4),) + cverfields + additional_fields
+        cverlen = len(versionstring)
+        reqlen = 6 + cverlen + sum(map(len, additional_fields), start=0)
+        reqfields = (
+            VERSION.pack(maxsize, cverlen), versionstring
+            ) + additional_fields
         if self._transport is None:
             raise RuntimeError
-        self._transport.writelines((
-            mkfield(reqlen + 7, 4)
-            , mkfield(c.TVERSION, 1)
-            , c.NOTAG
-            ) + reqfields
+        if c.NOTAG_INT in self._inflight:
+            raise RuntimeError('Version negotiation already in progress')
+        future = get_running_loop().create_future()
+        self._inflight[c.NOTAG_INT] = future
+        if self._tracer is not None:
+            self._tracer(SEND, c.TVERSION, c.NOTAG, reqfields)
+        self._transport.writelines(
+            (HEADER.pack(reqlen + 7, c.TVERSION, c.NOTAG),) + reqfields
             )
-        await self._event[c.NOTAG].wait()
-        restype, resbody = self._result[c.NOTAG]
+        restype, resbody = await future
         if restype != c.RVERSION:
             raise RuntimeError( #Should this be a Py9PException?
                 'Version negotiation gone awry'
                 , versionstring, maxsize, restype, resbody
                 )
-        srvverlen = extract(resbody, 4, 2)
-        srvver = resbody[6:6+srvverlen]
+        srvsize, srvverlen = VERSION.unpack_from(resbody)
+        srvver = bytes(resbody[6:6+srvverlen])
         if srvver != versionstring:
             raise Py9PException('Version mismatch!', versionstring, srvver)
-        srvsize = extract(resbody, 0, 4)
         self.maxsize = min(srvsize, maxsize)
-        return self.maxsize, resbody[6+srvverlen:]
+        self._set_maxsize(self.maxsize)
+        return self.maxsize, bytes(resbody[6+srvverlen:])
+
+class Py9PBufferedClientConnection(Py9PBuffered, Py9PClientConnection):
+    '''
+    A Py9PClientConnection that uses the asyncio.BufferedProtocol interface.
+    '''
+    __slots__ = ()
+
+class Py9PBatch():
+    '''
+    A batch of messages sent together and their replies. Awaiting the batch
+    gives the replies in the order of the messages. Iterating over it
+    asynchronously gives (index, reply) pairs in the order the replies
+    arrive. Error replies are raised as exceptions, or with
+    `return_exceptions` passed on in place of the reply.
+
+    The messages are queued for writing in one go, as far as there are
+    free tags, so that they go out in a single write. The rest follow as
+    replies free up tags. Nothing is sent before the batch is awaited or
+    iterated over. If the connection is lost before all messages are sent,
+    awaiting or iterating raises.
+    '''
+    __slots__ = (
+        '_connection', '_msgs', '_return_exceptions', '_futures', '_done'
+        , '_wakeup', '_submitted'
+        )
+    def __init__(
+        self
+        , connection: Py9PClientConnection
+        , msgs: Iterable[MsgT]
+        , return_exceptions: bool = False
+        ):
+        '''
+        Check that all messages can be sent.
+        '''
+        self._msgs = tuple(msgs)
+        for msg in self._msgs:
+            connection._check(msg) # pylint: disable=protected-access
+        self._connection = connection
+        self._return_exceptions = return_exceptions
+        self._futures: List[Future] = []
+        self._done: Deque[int] = deque()
+        self._wakeup: Optional[Future] = None
+        self._submitted = False
+        return None
+    def __len__(self) -> int:
+        return len(self._msgs)
+    async def _submit(self) -> None:
+        '''
+        Send all messages, waiting for tags if need be.
+        '''
+        if self._submitted:
+            return None
+        self._submitted = True
+        connection = self._connection
+        # pylint: disable=protected-access
+        for index, msg in enumerate(self._msgs):
+            tag = connection._take_tag()
+            if tag is None:
+                tag = await connection._wait_tag()
+            future = connection._send(tag, msg)
+            future.add_done_callback(partial(self._complete, index))
+            self._futures.append(future)
+        return None
+    def _complete(self, index: int, _: Future) -> None:
+        '''
+        Note a reply and wake up the iterating task.
+        '''
+        self._done.append(index)
+        wakeup = self._wakeup
+        if wakeup is not None and not wakeup.done():
+            wakeup.set_result(None)
+        return None
+    def _result(self, index: int) -> Any:
+        '''
+        The reply to a message, or the exception it resulted in.
+        '''
+        future = self._futures[index]
+        exception = future.exception()
+        if exception is None:
+            msgtype, msgbody = future.result()
+            if msgtype != c.RERROR:
+                return msgtype, msgbody
+            exception = self._connection._errparser( # pylint: disable=protected-access
+                msgtype, self._msgs[index][2], msgbody
+                )
+        if self._return_exceptions:
+            return exception
+        raise exception
+    async def _gather(self) -> List[Any]:
+        '''
+        Wait for all replies.
+        '''
+        await self._submit()
+        for future in self._futures:
+            if not future.done():
+                await wait((future,))
+        return [self._result(index) for index in range(len(self._futures))]
+    def __await__(self):
+        return self._gather().__await__()
+    async def __aiter__(self) -> AsyncIterator[Tuple[int, Any]]:
+        await self._submit()
+        done = self._done
+        remaining = len(self._futures)
+        while remaining:
+            if not done:
+                self._wakeup = get_running_loop().create_future()
+                await self._wakeup
+                self._wakeup = None
+                continue
+            remaining = remaining - 1
+            index = done.popleft()
+            yield index, self._result(index)
 
 class Py9P():
     '''
@@ -420,7 +1256,7 @@ class Py9P():
     async def process_msg(
         self
         , msgtype: int
-        , msgbody: bytes
+        , msgbody: memoryview
         ) -> MsgT:
         '''
         Exactly what it says on the tin.
@@ -431,3 +1267,10 @@ class Py9P():
         Exactly what it says on the tin.
         '''
         raise NotImplementedError
+    async def clunkall(self) -> None:
+        '''
+        Called once the connection is gone and all of its outstanding
+        messages have been cancelled. Implementations should clunk every
+        fid held by the session.
+        '''
+        return None
@@ -0,0 +1,125 @@
+'''
+Priority scheduling of incoming messages by message type.
+'''
+
+from asyncio import get_running_loop
+from collections import deque
+from typing import Any, Awaitable, Collection, Dict, Optional, Sequence, Tuple
+
+import aio9p.constant as c
+
+ClassT = Tuple[str, Optional[Collection[int]], Optional[int]]
+
+DEFAULT_CLASSES: Sequence[ClassT] = (
+    ('meta', None, None)
+    , ('bulk', (c.TREAD, c.TWRITE), 8)
+    )
+
+class Py9PScheduler():
+    '''
+    Admission control for message handlers. Every message type belongs to
+    a priority class with an optional concurrency limit; handlers that
+    would exceed it wait in a per-class queue. When a slot frees up, the
+    highest priority class with waiting handlers goes first.
+
+    A scheduler may be shared between connections to enforce server-wide
+    limits.
+    '''
+    def __init__(
+        self
+        , classes: Sequence[ClassT] = DEFAULT_CLASSES
+        , limit: Optional[int] = None
+        ):
+        '''
+        `classes` lists (name, message types, concurrency limit) in order of
+        decreasing priority. A class whose message types are None receives
+        all message types not listed elsewhere. `limit` bounds the total
+        number of running handlers across all classes.
+        '''
+        self._names = tuple(name for name, _, _ in classes)
+        self._limits = {name: climit for name, _, climit in classes}
+        self._classes = {}
+        self._default = None
+        for name, msgtypes, _ in classes:
+            if msgtypes is None:
+                self._default = name
+                continue
+            for msgtype in msgtypes:
+                self._classes[msgtype] = name
+        self._limit = limit
+        self._total = 0
+        self._running = {name: 0 for name in self._names}
+        self._queues = {name: deque() for name in self._names}
+        return None
+    def depth(self) -> Dict[str, int]:
+        '''
+        The number of handlers waiting in each class.
+        '''
+        return {name: len(queue) for name, queue in self._queues.items()}
+    def running(self) -> Dict[str, int]:
+        '''
+        The number of handlers running in each class.
+        '''
+        return dict(self._running)
+    async def run(self, msgtype: int, coro: Awaitable[Any]) -> Any:
+        '''
+        Wait for a slot in the class of `msgtype`, then run `coro`.
+        '''
+        name = self._classes.get(msgtype, self._default)
+        if name is None:
+            return await coro
+        if self._queues[name] or not self._available(name):
+            gate = get_running_loop().create_future()
+            self._queues[name].append(gate)
+            try:
+                await gate
+            except BaseException:
+                try:
+                    if gate.cancelled():
+                        # Releasing may have dropped the gate already.
+                        try:
+                            self._queues[name].remove(gate)
+                        except ValueError:
+                            pass
+                    elif gate.done():
+                        self._release(name)
+                finally:
+                    if hasattr(coro, 'close'):
+                        coro.close()
+                raise
+        else:
+            self._take(name)
+        try:
+            return await coro
+        finally:
+            self._release(name)
+    def _available(self, name: str) -> bool:
+        '''
+        Whether a handler of class `name` may start right now.
+        '''
+        if self._limit is not None and self._total >= self._limit:
+            return False
+        climit = self._limits[name]
+        return climit is None or self._running[name] < climit
+    def _take(self, name: str) -> None:
+        '''
+        Occupy a slot.
+        '''
+        self._running[name] = self._running[name] + 1
+        self._total = self._total + 1
+        return None
+    def _release(self, name: str) -> None:
+        '''
+        Free a slot and admit waiting handlers, highest priority first.
+        '''
+        self._running[name] = self._running[name] - 1
+        self._total = self._total - 1
+        for candidate in self._names:
+            queue = self._queues[candidate]
+            while queue and self._available(candidate):
+                gate = queue.popleft()
+                if gate.done():
+                    continue
+                gate.set_result(None)
+                self._take(candidate)
+        return None
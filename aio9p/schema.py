@@ -0,0 +1,287 @@
+'''
+A declarative description of the 9P2000 and 9P2000.u messages, together with
+encoders and decoders generated from it.
+
+Every message is described as a sequence of (name, kind) fields. The kinds
+are:
+    - u8, u16, u32, u64: little-endian integers
+    - fid: a four-byte integer, also encoded from raw bytes
+    - tag: raw bytes of length 2
+    - qid: a `Qid`
+    - s: a string with a two-byte length prefix
+    - ws: a two-byte count followed by that many strings
+    - qids: a two-byte count followed by that many qids
+    - data: a four-byte count followed by that many bytes
+    - stat: a stat struct with a two-byte envelope
+A trailing `?` marks an integer field that may be missing at the end of a
+message. It decodes to all ones in that case.
+
+For every message type, a decoder taking the message body and returning the
+field values and an encoder taking the field values and returning a `MsgT`
+are compiled once at import time. Fixed-size fields between variable-length
+ones are handled by a single `struct.Struct` each. Strings are decoded to
+bytes, data and stat fields to memoryviews of the message body. Decoders
+raise ValueError if the body is too short for its fields.
+'''
+
+from struct import Struct, error as StructError
+from typing import Any, Callable, Dict, List, Tuple
+
+import aio9p.constant as c
+from aio9p.helper import MsgT, Qid, mkbytefields
+
+FieldT = Tuple[str, str]
+DecoderT = Callable[[memoryview], Tuple[Any, ...]]
+EncoderT = Callable[..., MsgT]
+
+FIXED = {
+    'u8': 'B'
+    , 'u16': 'H'
+    , 'u32': 'I'
+    , 'u64': 'Q'
+    , 'fid': 'I'
+    , 'tag': '2s'
+    , 'qid': '13s'
+    }
+PREFIX = {
+    's': 'H'
+    , 'ws': 'H'
+    , 'qids': 'H'
+    , 'data': 'I'
+    , 'stat': 'H'
+    }
+
+MESSAGES_9P2000: Dict[int, Tuple[FieldT, ...]] = {
+    c.TVERSION: (('msize', 'u32'), ('version', 's'))
+    , c.RVERSION: (('msize', 'u32'), ('version', 's'))
+    , c.TAUTH: (('afid', 'fid'), ('uname', 's'), ('aname', 's'))
+    , c.RAUTH: (('aqid', 'qid'),)
+    , c.TATTACH: (('fid', 'fid'), ('afid', 'fid'), ('uname', 's'), ('aname', 's'))
+    , c.RATTACH: (('qid', 'qid'),)
+    , c.RERROR: (('ename', 's'),)
+    , c.TFLUSH: (('oldtag', 'tag'),)
+    , c.RFLUSH: ()
+    , c.TWALK: (('fid', 'fid'), ('newfid', 'fid'), ('wnames', 'ws'))
+    , c.RWALK: (('wqids', 'qids'),)
+    , c.TOPEN: (('fid', 'fid'), ('mode', 'u8'))
+    , c.ROPEN: (('qid', 'qid'), ('iounit', 'u32'))
+    , c.TCREATE: (('fid', 'fid'), ('name', 's'), ('perm', 'u32'), ('mode', 'u8'))
+    , c.RCREATE: (('qid', 'qid'), ('iounit', 'u32'))
+    , c.TREAD: (('fid', 'fid'), ('offset', 'u64'), ('count', 'u32'))
+    , c.RREAD: (('data', 'data'),)
+    , c.TWRITE: (('fid', 'fid'), ('offset', 'u64'), ('data', 'data'))
+    , c.RWRITE: (('count', 'u32'),)
+    , c.TCLUNK: (('fid', 'fid'),)
+    , c.RCLUNK: ()
+    , c.TREMOVE: (('fid', 'fid'),)
+    , c.RREMOVE: ()
+    , c.TSTAT: (('fid', 'fid'),)
+    , c.RSTAT: (('stat', 'stat'),)
+    , c.TWSTAT: (('fid', 'fid'), ('stat', 'stat'))
+    , c.RWSTAT: ()
+    }
+
+MESSAGES_9P2000U: Dict[int, Tuple[FieldT, ...]] = {
+    **MESSAGES_9P2000
+    , c.TAUTH: MESSAGES_9P2000[c.TAUTH] + (('n_uname', 'u32?'),)
+    , c.TATTACH: MESSAGES_9P2000[c.TATTACH] + (('n_uname', 'u32?'),)
+    , c.RERROR: (('ename', 's'), ('errno', 'u32'))
+    , c.TCREATE: MESSAGES_9P2000[c.TCREATE] + (('extension', 's'),)
+    }
+
+class _Source():
+    '''
+    Collects the lines and constants of a generated function.
+    '''
+    def __init__(self):
+        '''
+        Start an empty function body.
+        '''
+        self.lines: List[str] = []
+        self.namespace: Dict[str, Any] = {
+            'mkbytefields': mkbytefields, 'Qid': Qid, 'StructError': StructError
+            }
+        return None
+    def struct(self, fmt: str) -> str:
+        '''
+        Register a struct for the given format and return its name.
+        '''
+        name = f'_S{len(self.namespace)}'
+        self.namespace[name] = Struct('<' + fmt)
+        return name
+    def compile(self, funcname: str) -> Callable:
+        '''
+        Compile the collected lines into a function.
+        '''
+        exec('\n'.join(self.lines), self.namespace) # pylint: disable=exec-used
+        return self.namespace[funcname]
+
+def _split(fields: Tuple[FieldT, ...]) -> Tuple[Tuple[FieldT, ...], Tuple[FieldT, ...]]:
+    '''
+    Separate the optional trailing fields from the mandatory ones.
+    '''
+    mandatory = tuple(field for field in fields if not field[1].endswith('?'))
+    optional = tuple(
+        (name, kind[:-1]) for name, kind in fields if kind.endswith('?')
+        )
+    if fields[:len(mandatory)] != mandatory:
+        raise ValueError('Optional fields must come last', fields)
+    for _, kind in optional:
+        if kind not in FIXED or FIXED[kind].endswith('s'):
+            raise ValueError('Only integer fields may be optional', fields)
+    return mandatory, optional
+
+def compile_decoder(fields: Tuple[FieldT, ...]) -> DecoderT:
+    '''
+    Generate a function that decodes a message body into a tuple of field
+    values.
+    '''
+    mandatory, optional = _split(fields)
+    src = _Source()
+    lines = src.lines
+    lines.append('def decode(body):')
+    lines.append('    _o = 0')
+    fmt = ''
+    targets: List[str] = []
+    qids: List[str] = []
+    def flush():
+        nonlocal fmt, targets, qids
+        if not fmt:
+            return
+        sname = src.struct(fmt)
+        lines.append(f'    ({", ".join(targets)},) = {sname}.unpack_from(body, _o)')
+        lines.append(f'    _o = _o + {src.namespace[sname].size}')
+        for qid in qids:
+            lines.append(f'    {qid} = Qid({qid})')
+        fmt = ''
+        targets = []
+        qids = []
+    for name, kind in mandatory:
+        if kind in FIXED:
+            fmt = fmt + FIXED[kind]
+            targets.append(name)
+            if kind == 'qid':
+                qids.append(name)
+            continue
+        fmt = fmt + PREFIX[kind]
+        targets.append('_n')
+        flush()
+        if kind == 's':
+            lines.append(f'    {name} = bytes(body[_o:_o+_n])')
+            lines.append('    _o = _o + _n')
+        elif kind in ('data', 'stat'):
+            lines.append(f'    {name} = body[_o:_o+_n]')
+            lines.append('    _o = _o + _n')
+        elif kind == 'qids':
+            lines.append(
+                f'    {name} = tuple(Qid(body[_i:_i+13]) for _i in range(_o, _o+13*_n, 13))'
+                )
+            lines.append('    _o = _o + 13*_n')
+        elif kind == 'ws':
+            lines.append('    _ws = []')
+            lines.append('    for _ in range(_n):')
+            lines.append(f'        (_l,) = {src.struct("H")}.unpack_from(body, _o)')
+            lines.append('        _ws.append(bytes(body[_o+2:_o+2+_l]))')
+            lines.append('        _o = _o + 2 + _l')
+            lines.append(f'    {name} = tuple(_ws)')
+        else:
+            raise ValueError('Unknown field kind', name, kind)
+    flush()
+    lines.append('    if _o > len(body):')
+    lines.append('        raise ValueError("Truncated message body", _o, len(body))')
+    for name, kind in optional:
+        sname = src.struct(FIXED[kind])
+        size = src.namespace[sname].size
+        lines.append(f'    if len(body) < _o + {size}:')
+        lines.append(f'        {name} = {(1 << (8*size)) - 1}')
+        lines.append('    else:')
+        lines.append(f'        ({name},) = {sname}.unpack_from(body, _o)')
+        lines.append(f'        _o = _o + {size}')
+    names = [name for name, _ in fields]
+    lines.append(f'    return ({"".join(name + ", " for name in names)})')
+    lines[1:] = ['    try:'] + ['    ' + line for line in lines[1:]] + [
+        '    except StructError as _e:'
+        , '        raise ValueError("Truncated message body", len(body)) from _e'
+        ]
+    return src.compile('decode')
+
+def compile_encoder(msgtype: int, fields: Tuple[FieldT, ...]) -> EncoderT:
+    '''
+    Generate a function that encodes field values into a `MsgT` of type
+    `msgtype`. Optional fields default to all ones.
+    '''
+    mandatory, optional = _split(fields)
+    src = _Source()
+    lines = src.lines
+    params = [name for name, _ in mandatory] + [
+        f'{name}={(1 << (8*Struct("<" + FIXED[kind]).size)) - 1}'
+        for name, kind in optional
+        ]
+    lines.append(f'def encode({", ".join(params)}):')
+    fixedlen = 0
+    varlen: List[str] = []
+    parts: List[str] = []
+    fmt = ''
+    args: List[str] = []
+    def flush():
+        nonlocal fmt, args, fixedlen
+        if not fmt:
+            return
+        sname = src.struct(fmt)
+        fixedlen = fixedlen + src.namespace[sname].size
+        parts.append(f'{sname}.pack({", ".join(args)})')
+        fmt = ''
+        args = []
+    for name, kind in mandatory + optional:
+        if kind == 'fid':
+            fmt = fmt + FIXED[kind]
+            args.append(f'{name} if {name}.__class__ is int else int.from_bytes({name}, "little")')
+            continue
+        if kind in FIXED:
+            fmt = fmt + FIXED[kind]
+            args.append(name)
+            continue
+        fmt = fmt + PREFIX[kind]
+        if kind == 'ws':
+            lines.append(f'    _l_{name}, _f_{name} = mkbytefields(*{name})')
+            args.append(f'len({name})')
+            flush()
+            parts.append(f'*_f_{name}')
+            varlen.append(f'_l_{name}')
+            continue
+        if kind == 'qids':
+            lines.append(f'    _l_{name} = len({name})')
+            args.append(f'_l_{name}')
+            flush()
+            parts.append(f'*{name}')
+            varlen.append(f'13*_l_{name}')
+            continue
+        if kind not in ('s', 'data', 'stat'):
+            raise ValueError('Unknown field kind', name, kind)
+        lines.append(f'    _l_{name} = len({name})')
+        args.append(f'_l_{name}')
+        flush()
+        parts.append(name)
+        varlen.append(f'_l_{name}')
+    flush()
+    length = ' + '.join([str(fixedlen)] + varlen)
+    lines.append(
+        f'    return {msgtype}, {length}, ({"".join(part + ", " for part in parts)})'
+        )
+    return src.compile('encode')
+
+def compile_schema(
+    messages: Dict[int, Tuple[FieldT, ...]]
+    ) -> Tuple[Dict[int, DecoderT], Dict[int, EncoderT]]:
+    '''
+    Compile a decoder and an encoder for every message type in `messages`.
+    '''
+    decoders = {}
+    encoders = {}
+    for msgtype, fields in messages.items():
+        decoders[msgtype] = compile_decoder(fields)
+        encoders[msgtype] = compile_encoder(msgtype, fields)
+    return decoders, encoders
+
+DECODE, ENCODE = compile_schema(MESSAGES_9P2000)
+DECODE_U, ENCODE_U = compile_schema(MESSAGES_9P2000U)
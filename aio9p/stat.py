@@ -3,28 +3,46 @@
 Py9P stat structs.
 '''
 
-from dataclasses import dataclass, asdict, replace
-from typing import Optional
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
-from aio9p.helper import extract, mkfield, extract_bytefields
+from aio9p.codec import U16, U32, U64, STAT, STAT_COLUMNS, STAT_U_TAIL
+from aio9p.helper import Qid, extract_bytefield_views
 
+_set = object.__setattr__
 
-@dataclass
+def _defaults(fieldsizes: Dict[str, Optional[int]]) -> Tuple[Tuple[str, Any], ...]:
+    '''
+    The value of every field that means "not populated".
+    '''
+    return tuple(
+        (fieldname, b'' if fieldsize is None else (256**fieldsize) - 1)
+        for fieldname, fieldsize in fieldsizes.items()
+        )
+
+@dataclass(init=False)
 class Py9P2000Stat: # pylint: disable=too-many-instance-attributes
     '''
-    A class to implement the Py9P2000 stat struct.
+    A class to implement the Py9P2000 stat struct. The wire encoding is
+    cached until a field is modified. The cache has a slot of its own but
+    is not a dataclass field.
     '''
-    p9type: Optional[int] = None # [2:4]
-    p9dev: Optional[int] = None # [4:8]
-    p9qid: Optional[bytes] = None # [8:21]
-    p9mode: Optional[int] = None # [21:25]
-    p9atime: Optional[int] = None # [25:29]
-    p9mtime: Optional[int] = None # [29:33]
-    p9length: Optional[int] = None # [33:41]
-    p9name: Optional[bytes] = None # [s]
-    p9uid: Optional[bytes] = None # [s]
-    p9gid: Optional[bytes] = None # [s]
-    p9muid: Optional[bytes] = None # [s]
+    __slots__ = (
+        'p9type', 'p9dev', 'p9qid', 'p9mode', 'p9atime', 'p9mtime', 'p9length'
+        , 'p9name', 'p9uid', 'p9gid', 'p9muid', '_wire'
+        )
+    p9type: Optional[int] # [2:4]
+    p9dev: Optional[int] # [4:8]
+    p9qid: Optional[bytes] # [8:21]
+    p9mode: Optional[int] # [21:25]
+    p9atime: Optional[int] # [25:29]
+    p9mtime: Optional[int] # [29:33]
+    p9length: Optional[int] # [33:41]
+    p9name: Optional[bytes] # [s]
+    p9uid: Optional[bytes] # [s]
+    p9gid: Optional[bytes] # [s]
+    p9muid: Optional[bytes] # [s]
 
     fieldsizes = {
         'p9type': 2
@@ -39,50 +57,69 @@ class Py9P2000Stat: # pylint: disable=too-many-instance-attributes
         , 'p9gid': None
         , 'p9muid': None
         }
+    fielddefaults = _defaults(fieldsizes)
 
+    def __init__( # pylint: disable=too-many-arguments
+        self
+        , p9type=None
+        , p9dev=None
+        , p9qid=None
+        , p9mode=None
+        , p9atime=None
+        , p9mtime=None
+        , p9length=None
+        , p9name=None
+        , p9uid=None
+        , p9gid=None
+        , p9muid=None
+        ):
+        '''
+        Fields that are not populated should be ignored by the protocol.
+        Sets the slots directly, bypassing the invalidation in __setattr__.
+        '''
+        _set(self, 'p9type', 0xFFFF if p9type is None else p9type)
+        _set(self, 'p9dev', 0xFFFFFFFF if p9dev is None else p9dev)
+        _set(self, 'p9qid', b'' if p9qid is None else p9qid)
+        _set(self, 'p9mode', 0xFFFFFFFF if p9mode is None else p9mode)
+        _set(self, 'p9atime', 0xFFFFFFFF if p9atime is None else p9atime)
+        _set(self, 'p9mtime', 0xFFFFFFFF if p9mtime is None else p9mtime)
+        _set(self, 'p9length', 0xFFFFFFFFFFFFFFFF if p9length is None else p9length)
+        _set(self, 'p9name', b'' if p9name is None else p9name)
+        _set(self, 'p9uid', b'' if p9uid is None else p9uid)
+        _set(self, 'p9gid', b'' if p9gid is None else p9gid)
+        _set(self, 'p9muid', b'' if p9muid is None else p9muid)
+        _set(self, '_wire', None)
+        return None
     def __hash__(self):
         '''
         The identity of a filesystem entity is determined entirely by its qid.
         '''
         return hash(self.p9uid)
-    def __post_init__(self):
+    def __setattr__(self, name, value):
         '''
-        Fields that are not populated should be ignored by the protocol.
+        Any modification invalidates the cached wire encoding.
         '''
-        for fieldname, fieldsize in self.fieldsizes.items():
-            if getattr(self, fieldname) is not None:
-                continue
-            fielddefault = b'' if fieldsize is None else (256**fieldsize) - 1
-            setattr(self, fieldname, fielddefault)
-        return None
+        _set(self, name, value)
+        _set(self, '_wire', None)
     def to_dict(self, filtered=False):
         '''
         Convenience method that returns the instance data in dict form.
         '''
-        res = asdict(self)
         if not filtered:
-            return res
-        for fieldname, fieldsize in self.fieldsizes.items():
-            fieldval = res[fieldname]
-            if fieldsize is None:
-                if not fieldval:
-                    res.pop(fieldname, None)
-            elif fieldval == (256**fieldsize) - 1:
-                res.pop(fieldname, None)
-        return res
+            return {
+                fieldname: getattr(self, fieldname)
+                for fieldname, _ in self.fielddefaults
+                }
+        return {
+            fieldname: fieldval
+            for fieldname, fielddefault in self.fielddefaults
+            if (fieldval := getattr(self, fieldname)) != fielddefault
+            }
     def size(self):
         '''
         Size calculation that respects the various envelopes.
         '''
-        total = 0
-        # The qid field is calculated with a phantom envelope.
-        # This makes up for the struct's envelope not being included.
-        for fieldname, fieldsize in self.fieldsizes.items():
-            if fieldsize is None:
-                total = total + 2 + len(getattr(self, fieldname))
-            else:
-                total = total + fieldsize
-        return total
+        return len(self.to_bytes())
     def wstat(self, other):
         '''
         Return a version of `self` updated with values from `other`.
@@ -92,7 +129,13 @@ class Py9P2000Stat: # pylint: disable=too-many-instance-attributes
             and (self.p9mode & 0o7777000) != (other.p9mode & 0o7777000)
             ):
             raise ValueError('Cannot change mode via wstat', self.p9mode, other.p9mode)
-        return replace(self, **other.to_dict(filtered=True))
+        values = []
+        for fieldname, fielddefault in self.fielddefaults:
+            fieldval = getattr(other, fieldname)
+            if fieldval == fielddefault:
+                fieldval = getattr(self, fieldname)
+            values.append(fieldval)
+        return type(self)(*values)
     @staticmethod
     def from_stat(stat, qid):
         '''
@@ -102,28 +145,45 @@ class Py9P2000Stat: # pylint: disable=too-many-instance-attributes
     @staticmethod
     def from_bytes(inpt, offset):
         '''
-        Parser.
+        Parser. The parsed bytes become the cached wire encoding.
         '''
 
-        name, uid, gid, muid = extract_bytefields(inpt, offset+41, 4)
+        size, p9type, p9dev, p9qid, p9mode, p9atime, p9mtime, p9length = (
+            STAT.unpack_from(inpt, offset)
+            )
+        (name, uid, gid, muid), end = extract_bytefield_views(inpt, offset+41, 4)
 
-        return Py9P2000Stat(
-            p9type=extract(inpt, offset+2, 2)
-            , p9dev=extract(inpt, offset+4, 4)
-            , p9qid=inpt[offset+8:offset+21]
-            , p9mode=extract(inpt, offset+21, 4)
-            , p9atime=extract(inpt, offset+25, 4)
-            , p9mtime=extract(inpt, offset+29, 4)
-            , p9length=extract(inpt, offset+33, 8)
-            , p9name=name
-            , p9uid=uid
-            , p9gid=gid
-            , p9muid=muid
+        res = Py9P2000Stat(
+            p9type=p9type
+            , p9dev=p9dev
+            , p9qid=Qid(p9qid)
+            , p9mode=p9mode
+            , p9atime=p9atime
+            , p9mtime=p9mtime
+            , p9length=p9length
+            , p9name=bytes(name)
+            , p9uid=bytes(uid)
+            , p9gid=bytes(gid)
+            , p9muid=bytes(muid)
             )
+        if end == offset + 2 + size:
+            _set(res, '_wire', bytes(inpt[offset:end]))
+        return res
     def to_bytes(self, with_envelope=False):
         '''
         Formatter.
         '''
+        wire = self._wire
+        if wire is None:
+            wire = self._encode()
+            _set(self, '_wire', wire)
+        if with_envelope:
+            return U16.pack(len(wire)) + wire
+        return wire
+    def _encode(self):
+        '''
+        Encode all fields.
+        '''
         namelen = len(self.p9name)
         uidlen = len(self.p9uid)
         gidlen = len(self.p9gid)
@@ -131,34 +191,36 @@ class Py9P2000Stat: # pylint: disable=too-many-instance-attributes
 
         totallen = 49 + namelen + uidlen + gidlen + muidlen
         return b''.join((
-            mkfield(totallen, 2) if with_envelope else b''
-            , mkfield(totallen-2, 2) #Size field of the stat struct
-            , mkfield(self.p9type, 2)
-            , mkfield(self.p9dev, 4)
-            , self.p9qid
-            , mkfield(self.p9mode, 4)
-            , mkfield(self.p9atime, 4)
-            , mkfield(self.p9mtime, 4)
-            , mkfield(self.p9length, 8)
-            , mkfield(namelen, 2)
+            STAT.pack(
+                totallen-2 #Size field of the stat struct
+                , self.p9type
+                , self.p9dev
+                , self.p9qid
+                , self.p9mode
+                , self.p9atime
+                , self.p9mtime
+                , self.p9length
+                )
+            , U16.pack(namelen)
             , self.p9name
-            , mkfield(uidlen, 2)
+            , U16.pack(uidlen)
             , self.p9uid
-            , mkfield(gidlen, 2)
+            , U16.pack(gidlen)
             , self.p9gid
-            , mkfield(muidlen, 2)
+            , U16.pack(muidlen)
             , self.p9muid
             ))
 
-@dataclass
+@dataclass(init=False)
 class Py9P2000uStat(Py9P2000Stat): # pylint: disable=too-many-instance-attributes
     '''
     A class to implement the Py9P2000.u stat struct.
     '''
-    p9u_extension: Optional[bytes] = None# [s]
-    p9u_n_uid: Optional[int] = None
-    p9u_n_gid: Optional[int] = None
-    p9u_n_muid: Optional[int] = None
+    __slots__ = ('p9u_extension', 'p9u_n_uid', 'p9u_n_gid', 'p9u_n_muid')
+    p9u_extension: Optional[bytes] # [s]
+    p9u_n_uid: Optional[int]
+    p9u_n_gid: Optional[int]
+    p9u_n_muid: Optional[int]
 
     fieldsizes = {
         **Py9P2000Stat.fieldsizes
@@ -167,6 +229,38 @@ class Py9P2000uStat(Py9P2000Stat): # pylint: disable=too-many-instance-attribute
         , 'p9u_n_gid': 4
         , 'p9u_n_muid': 4
         }
+    fielddefaults = _defaults(fieldsizes)
+
+    def __init__( # pylint: disable=too-many-arguments,too-many-locals
+        self
+        , p9type=None
+        , p9dev=None
+        , p9qid=None
+        , p9mode=None
+        , p9atime=None
+        , p9mtime=None
+        , p9length=None
+        , p9name=None
+        , p9uid=None
+        , p9gid=None
+        , p9muid=None
+        , p9u_extension=None
+        , p9u_n_uid=None
+        , p9u_n_gid=None
+        , p9u_n_muid=None
+        ):
+        '''
+        Fields that are not populated should be ignored by the protocol.
+        '''
+        Py9P2000Stat.__init__(
+            self, p9type, p9dev, p9qid, p9mode, p9atime, p9mtime, p9length
+            , p9name, p9uid, p9gid, p9muid
+            )
+        _set(self, 'p9u_extension', b'' if p9u_extension is None else p9u_extension)
+        _set(self, 'p9u_n_uid', 0xFFFFFFFF if p9u_n_uid is None else p9u_n_uid)
+        _set(self, 'p9u_n_gid', 0xFFFFFFFF if p9u_n_gid is None else p9u_n_gid)
+        _set(self, 'p9u_n_muid', 0xFFFFFFFF if p9u_n_muid is None else p9u_n_muid)
+        return None
     @staticmethod
     def from_stat(stat, qid):
         '''
@@ -176,32 +270,38 @@ class Py9P2000uStat(Py9P2000Stat): # pylint: disable=too-many-instance-attribute
     @staticmethod
     def from_bytes(inpt, offset):
         '''
-        Parser.
+        Parser. The parsed bytes become the cached wire encoding.
         '''
-        varfields = extract_bytefields(inpt, offset+41, 5)
+        varfields, n_offset = extract_bytefield_views(inpt, offset+41, 5)
         name, uid, gid, muid, extension = varfields
-        n_offset = offset + 51 + sum((len(field) for field in varfields))
-
-        return Py9P2000uStat(
-            p9type=extract(inpt, offset+2, 2)
-            , p9dev=extract(inpt, offset+4, 4)
-            , p9qid=inpt[offset+8:offset+21]
-            , p9mode=extract(inpt, offset+21, 4)
-            , p9atime=extract(inpt, offset+25, 4)
-            , p9mtime=extract(inpt, offset+29, 4)
-            , p9length=extract(inpt, offset+33, 8)
-            , p9name=name
-            , p9uid=uid
-            , p9gid=gid
-            , p9muid=muid
-            , p9u_extension=extension
-            , p9u_n_uid=extract(inpt, n_offset, 4)
-            , p9u_n_gid=extract(inpt, n_offset+4, 4)
-            , p9u_n_muid=extract(inpt, n_offset+8, 4)
+        size, p9type, p9dev, p9qid, p9mode, p9atime, p9mtime, p9length = (
+            STAT.unpack_from(inpt, offset)
             )
-    def to_bytes(self, with_envelope=False):
+        n_uid, n_gid, n_muid = STAT_U_TAIL.unpack_from(inpt, n_offset)
+
+        res = Py9P2000uStat(
+            p9type=p9type
+            , p9dev=p9dev
+            , p9qid=Qid(p9qid)
+            , p9mode=p9mode
+            , p9atime=p9atime
+            , p9mtime=p9mtime
+            , p9length=p9length
+            , p9name=bytes(name)
+            , p9uid=bytes(uid)
+            , p9gid=bytes(gid)
+            , p9muid=bytes(muid)
+            , p9u_extension=bytes(extension)
+            , p9u_n_uid=n_uid
+            , p9u_n_gid=n_gid
+            , p9u_n_muid=n_muid
+            )
+        if n_offset + 12 == offset + 2 + size:
+            _set(res, '_wire', bytes(inpt[offset:n_offset+12]))
+        return res
+    def _encode(self):
         '''
-        Formatter.
+        Encode all fields.
         '''
         namelen = len(self.p9name)
         uidlen = len(self.p9uid)
@@ -211,26 +311,212 @@ class Py9P2000uStat(Py9P2000Stat): # pylint: disable=too-many-instance-attribute
 
         totallen = 63 + namelen + uidlen + gidlen + muidlen + extensionlen
         return b''.join((
-            mkfield(totallen, 2) if with_envelope else b''
-            , mkfield(totallen-2, 2) #Size field of the stat struct
-            , mkfield(self.p9type, 2)
-            , mkfield(self.p9dev, 4)
-            , self.p9qid
-            , mkfield(self.p9mode, 4)
-            , mkfield(self.p9atime, 4)
-            , mkfield(self.p9mtime, 4)
-            , mkfield(self.p9length, 8)
-            , mkfield(namelen, 2)
+            STAT.pack(
+                totallen-2 #Size field of the stat struct
+                , self.p9type
+                , self.p9dev
+                , self.p9qid
+                , self.p9mode
+                , self.p9atime
+                , self.p9mtime
+                , self.p9length
+                )
+            , U16.pack(namelen)
             , self.p9name
-            , mkfield(uidlen, 2)
+            , U16.pack(uidlen)
             , self.p9uid
-            , mkfield(gidlen, 2)
+            , U16.pack(gidlen)
             , self.p9gid
-            , mkfield(muidlen, 2)
+            , U16.pack(muidlen)
             , self.p9muid
-            , mkfield(extensionlen, 2)
+            , U16.pack(extensionlen)
             , self.p9u_extension
-            , mkfield(self.p9u_n_uid, 4)
-            , mkfield(self.p9u_n_gid, 4)
-            , mkfield(self.p9u_n_muid, 4)
+            , STAT_U_TAIL.pack(self.p9u_n_uid, self.p9u_n_gid, self.p9u_n_muid)
             ))
+
+def _fixed(codec, reloffset: int, doc: str) -> property:
+    '''
+    A property decoding a fixed-size field of a stat view.
+    '''
+    def getter(self):
+        return codec.unpack_from(self._view, self._offset + reloffset)[0]
+    return property(getter, doc=doc)
+
+def _string(index: int, doc: str) -> property:
+    '''
+    A property decoding a string field of a stat view.
+    '''
+    def getter(self):
+        return bytes(self._fields()[0][index])
+    return property(getter, doc=doc)
+
+class StatView():
+    '''
+    A read-only view of a stat struct in a message buffer. Fields are
+    decoded on access, which makes looking at a few fields of many stats
+    cheap. A view keeps the underlying buffer alive: use `to_stat` or
+    `to_bytes` to hold on to the result.
+    '''
+    __slots__ = ('_view', '_offset', '_strings')
+    stat_class = Py9P2000Stat
+    stringcount = 4
+    def __init__(self, buffer, offset: int = 0):
+        '''
+        View the stat struct at `offset` in `buffer`, without copying.
+        '''
+        view = memoryview(buffer)
+        (size,) = U16.unpack_from(view, offset)
+        if len(view) < offset + 2 + size:
+            raise ValueError('Incomplete stat', offset, size, len(view))
+        self._view = view
+        self._offset = offset
+        self._strings = None
+        return None
+    def _fields(self):
+        '''
+        The string fields as memoryviews, and the offset following them.
+        Located on first use.
+        '''
+        if self._strings is None:
+            self._strings = extract_bytefield_views(
+                self._view, self._offset+41, self.stringcount
+                )
+        return self._strings
+    p9type = _fixed(U16, 2, 'The server type.')
+    p9dev = _fixed(U32, 4, 'The server subtype.')
+    @property
+    def p9qid(self) -> Qid:
+        '''
+        The qid of the file.
+        '''
+        return Qid(self._view[self._offset+8:self._offset+21])
+    p9mode = _fixed(U32, 21, 'Permissions and flags.')
+    p9atime = _fixed(U32, 25, 'The last access time.')
+    p9mtime = _fixed(U32, 29, 'The last modification time.')
+    p9length = _fixed(U64, 33, 'The length of the file in bytes.')
+    p9name = _string(0, 'The file name.')
+    p9uid = _string(1, 'The owner name.')
+    p9gid = _string(2, 'The group name.')
+    p9muid = _string(3, 'The name of the last modifying user.')
+    def size(self) -> int:
+        '''
+        The length of the stat struct, including its size field.
+        '''
+        return 2 + U16.unpack_from(self._view, self._offset)[0]
+    def to_bytes(self) -> bytes:
+        '''
+        A copy of the stat struct.
+        '''
+        return bytes(self._view[self._offset:self._offset+self.size()])
+    def to_stat(self) -> Py9P2000Stat:
+        '''
+        Decode all fields.
+        '''
+        return self.stat_class.from_bytes(self._view, self._offset)
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_stat()!r})'
+
+class StatUView(StatView):
+    '''
+    A read-only view of a 9P2000.u stat struct.
+    '''
+    __slots__ = ()
+    stat_class = Py9P2000uStat
+    stringcount = 5
+    p9u_extension = _string(4, 'The special file description.')
+    @property
+    def p9u_n_uid(self) -> int:
+        '''
+        The numeric owner id.
+        '''
+        return STAT_U_TAIL.unpack_from(self._view, self._fields()[1])[0]
+    @property
+    def p9u_n_gid(self) -> int:
+        '''
+        The numeric group id.
+        '''
+        return STAT_U_TAIL.unpack_from(self._view, self._fields()[1])[1]
+    @property
+    def p9u_n_muid(self) -> int:
+        '''
+        The numeric id of the last modifying user.
+        '''
+        return STAT_U_TAIL.unpack_from(self._view, self._fields()[1])[2]
+
+class StatColumns():
+    '''
+    The entries of a directory listing, decoded column by column. Only the
+    mode, length, modification time, qid path and name are extracted, which
+    avoids creating an object per entry. Works for 9P2000 and 9P2000.u
+    listings alike.
+    '''
+    __slots__ = ('modes', 'lengths', 'mtimes', 'paths', 'names')
+    def __init__(self):
+        '''
+        Start with no entries.
+        '''
+        self.modes = array('I')
+        self.lengths = array('Q')
+        self.mtimes = array('I')
+        self.paths = array('Q')
+        self.names: List[bytes] = []
+        return None
+    @classmethod
+    def from_bytes(cls, buffer) -> 'StatColumns':
+        '''
+        Decode a directory RREAD payload.
+        '''
+        res = cls()
+        res.extend(buffer)
+        return res
+    def extend(self, buffer) -> int:
+        '''
+        Append the entries of a further directory RREAD payload. Returns the
+        number of entries appended.
+        '''
+        view = memoryview(buffer).cast('B')
+        end = len(view)
+        unpack = STAT_COLUMNS.unpack_from
+        modes = []
+        lengths = []
+        mtimes = []
+        paths = []
+        names = []
+        offset = 0
+        while offset < end:
+            if offset + STAT_COLUMNS.size > end:
+                raise ValueError('Incomplete stat', offset, end)
+            size, path, mode, mtime, length, namelen = unpack(view, offset)
+            nameoffset = offset + STAT_COLUMNS.size
+            offset = offset + 2 + size
+            if offset > end or nameoffset + namelen > offset:
+                raise ValueError('Incomplete stat', offset, end)
+            modes.append(mode)
+            lengths.append(length)
+            mtimes.append(mtime)
+            paths.append(path)
+            names.append(bytes(view[nameoffset:nameoffset+namelen]))
+        self.modes.extend(modes)
+        self.lengths.extend(lengths)
+        self.mtimes.extend(mtimes)
+        self.paths.extend(paths)
+        self.names.extend(names)
+        return len(names)
+    def __len__(self) -> int:
+        return len(self.names)
+    def to_numpy(self):
+        '''
+        The entries as a NumPy structured array with the fields mode,
+        length, mtime, path and name. Requires NumPy.
+        '''
+        import numpy # pylint: disable=import-outside-toplevel
+        res = numpy.empty(len(self), dtype=[
+            ('mode', '<u4'), ('length', '<u8'), ('mtime', '<u4')
+            , ('path', '<u8'), ('name', object)
+            ])
+        res['mode'] = numpy.frombuffer(self.modes, dtype=numpy.uint32)
+        res['length'] = numpy.frombuffer(self.lengths, dtype=numpy.uint64)
+        res['mtime'] = numpy.frombuffer(self.mtimes, dtype=numpy.uint32)
+        res['path'] = numpy.frombuffer(self.paths, dtype=numpy.uint64)
+        res['name'] = self.names
+        return res
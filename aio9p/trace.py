@@ -0,0 +1,76 @@
+'''
+Protocol tracing. A tracer is a callable taking an event, a message type, a
+tag and a body, which every connection calls for the events below. Without
+a tracer, the only cost is a check for None.
+
+    - RECV: a frame was received, the body is a memoryview.
+    - SEND: a frame was queued for writing, the body is its tuple of fields.
+    - DISPATCH: the server handed a message to the implementation, the body
+        is a memoryview.
+
+Bodies are only valid for the duration of the call: memoryviews may point
+into a receive buffer that is reused later. Tracers copy what they keep.
+'''
+
+from logging import DEBUG
+from typing import Any, Callable, Optional
+
+import aio9p.constant as c
+
+RECV = 'recv'
+SEND = 'send'
+DISPATCH = 'dispatch'
+
+TracerT = Callable[[str, int, bytes, Any], None]
+
+class Frame():
+    '''
+    A traced frame that is formatted only when converted to a string.
+    '''
+    __slots__ = ('msgtype', 'msgtag', 'body', 'limit')
+    def __init__(self, msgtype: int, msgtag: bytes, body: Any, limit: int = 64):
+        '''
+        At most `limit` bytes of the body are shown.
+        '''
+        self.msgtype = msgtype
+        self.msgtag = msgtag
+        self.body = body
+        self.limit = limit
+        return None
+    def __str__(self) -> str:
+        body = self.body
+        if isinstance(body, tuple):
+            body = b''.join(body)
+        body = memoryview(body).cast('B')
+        shown = body[:self.limit].hex()
+        if len(body) > self.limit:
+            shown = shown + '...'
+        name = c.TRNAME.get(self.msgtype, self.msgtype)
+        return f'{name} tag {self.msgtag.hex()} size {len(body)}: {shown}'
+
+class LoggingTracer(): # pylint: disable=too-few-public-methods
+    '''
+    A tracer that logs every event, with formatting deferred to the logger.
+    '''
+    __slots__ = ('logger', 'level', 'limit')
+    def __init__(self, logger, level: int = DEBUG, limit: int = 64):
+        '''
+        Log to `logger` at `level`, showing at most `limit` bytes of a body.
+        '''
+        self.logger = logger
+        self.level = level
+        self.limit = limit
+        return None
+    def __call__(self, event: str, msgtype: int, msgtag: bytes, body: Any) -> None:
+        self.logger.log(
+            self.level, '%s %s', event, Frame(msgtype, msgtag, body, self.limit)
+            )
+        return None
+
+def debug_tracer(logger) -> Optional[TracerT]:
+    '''
+    A LoggingTracer if `logger` is enabled for debug messages, else None.
+    '''
+    if logger.isEnabledFor(DEBUG):
+        return LoggingTracer(logger)
+    return None
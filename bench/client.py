@@ -0,0 +1,57 @@
+'''
+Client request throughput against the example server over a UNIX domain
+socket, one request at a time, gathered, and batched. Both ends use the
+buffered protocols: with plain protocols, the event loop allocates a large
+receive buffer for every read, and the cost of that depends on the state of
+the allocator more than on aio9p. Run with `python -m bench.client`.
+'''
+
+from asyncio import gather, get_running_loop, run
+from os import remove
+from tempfile import mkdtemp
+from time import perf_counter
+
+import aio9p.constant as c
+from aio9p.dialect.client.Py9P2000 import Py9P2000Client
+from aio9p.example.simple import Simple9P2000
+from aio9p.protocol import Py9PBufferedServer
+from aio9p.schema import ENCODE
+
+COUNT = 10000
+
+async def rate(func) -> float:
+    '''
+    Requests per second.
+    '''
+    start = perf_counter()
+    await func()
+    return COUNT / (perf_counter() - start)
+
+async def main():
+    '''
+    Print the results.
+    '''
+    sockpath = mkdtemp() + '/bench.sock'
+    server = await get_running_loop().create_unix_server(
+        lambda: Py9PBufferedServer(Simple9P2000(65535)), path=sockpath
+        )
+    async with Py9P2000Client(remote={'path': sockpath}, buffered=True) as client:
+        await client.negotiate(client.versionstring, 65535)
+        msg = ENCODE[c.TCLUNK](1)
+        async def sequential():
+            for _ in range(COUNT):
+                await client.message(msg)
+        async def gathered():
+            await gather(*(client.message(msg) for _ in range(COUNT)))
+        async def batched():
+            await client.batch([msg] * COUNT)
+        for name, func in (
+            ('sequential', sequential), ('gather', gathered), ('batch', batched)
+            ):
+            print(f'{name:<10} {await rate(func):>12,.0f}')
+    server.close()
+    remove(sockpath)
+    return None
+
+if __name__ == '__main__':
+    run(main())
@@ -0,0 +1,142 @@
+'''
+Parse and format throughput of the server and client parser-formatters,
+per message type. Run with `python -m bench.codec`.
+'''
+
+from importlib import import_module
+from time import perf_counter
+
+from aio9p.helper import mkbytefields, mkfield, mkqid
+from aio9p.stat import Py9P2000Stat, Py9P2000uStat
+
+# aio9p.dialect re-exports the classes under the module names.
+srv = import_module('aio9p.dialect.Py9P2000')
+srvu = import_module('aio9p.dialect.Py9P2000u')
+cli = import_module('aio9p.dialect.client.Py9P2000')
+cliu = import_module('aio9p.dialect.client.Py9P2000u')
+
+FID = b'\x01\x00\x00\x00'
+QID = mkqid(0, 1)
+NAMES = (b'usr', b'local', b'share', b'doc', b'aio9p')
+DATA = bytes(4096)
+STAT = Py9P2000Stat(
+    p9type=0, p9dev=0, p9qid=QID, p9mode=0o644, p9atime=0, p9mtime=0
+    , p9length=4096, p9name=b'file', p9uid=b'root', p9gid=b'root', p9muid=b'root'
+    )
+USTAT = Py9P2000uStat(
+    p9type=0, p9dev=0, p9qid=QID, p9mode=0o644, p9atime=0, p9mtime=0
+    , p9length=4096, p9name=b'file', p9uid=b'root', p9gid=b'root', p9muid=b'root'
+    , p9u_extension=b'', p9u_n_uid=0, p9u_n_gid=0, p9u_n_muid=0
+    )
+
+def fields(*args):
+    '''
+    Join fields into a message body.
+    '''
+    return b''.join(args)
+
+def strings(*args):
+    '''
+    Length-prefixed strings.
+    '''
+    return b''.join(mkbytefields(*args)[1])
+
+def returning(value):
+    '''
+    A handler returning a fixed value.
+    '''
+    async def handler(*_):
+        return value
+    return handler
+
+SERVER = {
+    'version': (srv.p9_version, returning((8192, b'9P2000')), fields(mkfield(8192, 4), strings(b'9P2000')))
+    , 'attach': (srv.p9_attach, returning(QID), fields(FID, FID, strings(b'root', b'')))
+    , 'stat': (srv.p9_stat, returning(STAT), FID)
+    , 'clunk': (srv.p9_clunk, returning(None), FID)
+    , 'walk': (srv.p9_walk, returning((QID,) * 5), fields(FID, FID, mkfield(5, 2), strings(*NAMES)))
+    , 'open': (srv.p9_open, returning((QID, 0)), fields(FID, mkfield(0, 1)))
+    , 'read': (srv.p9_read, returning(DATA), fields(FID, mkfield(0, 8), mkfield(4096, 4)))
+    , 'write': (srv.p9_write, returning(4096), fields(FID, mkfield(0, 8), mkfield(4096, 4), DATA))
+    , 'create': (srv.p9_create, returning((QID, 0)), fields(FID, strings(b'file'), mkfield(0o644, 4), mkfield(0, 1)))
+    , 'wstat': (srv.p9_wstat, returning(None), fields(FID, STAT.to_bytes(with_envelope=True)))
+    , 'remove': (srv.p9_remove, returning(None), FID)
+    , 'u_attach': (srvu.p9u_attach, returning(QID), fields(FID, FID, strings(b'root', b''), mkfield(0, 4)))
+    , 'u_stat': (srvu.p9u_stat, returning(USTAT), FID)
+    , 'u_create': (srvu.p9u_create, returning((QID, 0)), fields(FID, strings(b'file'), mkfield(0o644, 4), mkfield(0, 1), strings(b'')))
+    , 'u_wstat': (srvu.p9u_wstat, returning(None), fields(FID, USTAT.to_bytes(with_envelope=True)))
+    }
+
+class Replying(): # pylint: disable=too-few-public-methods
+    '''
+    A stand-in for a client connection that replies with a fixed body.
+    '''
+    def __init__(self, body):
+        self.body = memoryview(body)
+    async def message(self, msg):
+        '''
+        Ignore the message, return the reply.
+        '''
+        return msg[0] + 1, self.body
+
+CLIENT = {
+    'version': (cli.p9_version, (8192, b'9P2000'), fields(mkfield(8192, 4), strings(b'9P2000')))
+    , 'attach': (cli.p9_attach, (FID, FID, b'root', b''), QID)
+    , 'stat': (cli.p9_stat, (FID,), STAT.to_bytes(with_envelope=True))
+    , 'clunk': (cli.p9_clunk, (FID,), b'')
+    , 'walk': (cli.p9_walk, (FID, FID, NAMES), fields(mkfield(5, 2), QID * 5))
+    , 'open': (cli.p9_open, (FID, 0), fields(QID, mkfield(0, 4)))
+    , 'read': (cli.p9_read, (FID, 0, 4096), fields(mkfield(4096, 4), DATA))
+    , 'write': (cli.p9_write, (FID, 0, DATA), mkfield(4096, 4))
+    , 'create': (cli.p9_create, (FID, b'file', 0o644, 0), fields(QID, mkfield(0, 4)))
+    , 'wstat': (cli.p9_wstat, (FID, STAT), b'')
+    , 'remove': (cli.p9_remove, (FID,), b'')
+    , 'u_attach': (cliu.p9u_attach, (FID, FID, b'root', b'', 0), QID)
+    , 'u_stat': (cliu.p9u_stat, (FID,), USTAT.to_bytes(with_envelope=True))
+    , 'u_create': (cliu.p9u_create, (FID, b'file', 0o644, 0, b''), fields(QID, mkfield(0, 4)))
+    }
+
+def drive(coro):
+    '''
+    Run a coroutine that never suspends.
+    '''
+    try:
+        coro.send(None)
+    except StopIteration as result:
+        return result.value
+    raise RuntimeError('Coroutine suspended')
+
+def rate(func, duration=0.1, repeat=5):
+    '''
+    Calls per second, the best of `repeat` runs.
+    '''
+    best = 0
+    for _ in range(repeat):
+        count = 0
+        start = perf_counter()
+        end = start + duration
+        now = start
+        while now < end:
+            for _ in range(100):
+                func()
+            count = count + 100
+            now = perf_counter()
+        best = max(best, count / (now - start))
+    return best
+
+def main():
+    '''
+    Print calls per second for every message type.
+    '''
+    print(f'{"server":<10} {"ops/s":>12}')
+    for name, (parser, handler, body) in SERVER.items():
+        view = memoryview(body)
+        print(f'{name:<10} {rate(lambda: drive(parser(handler, view))):>12,.0f}')
+    print(f'{"client":<10} {"ops/s":>12}')
+    for name, (func, args, reply) in CLIENT.items():
+        conn = Replying(reply)
+        print(f'{name:<10} {rate(lambda: drive(func(conn, *args))):>12,.0f}')
+    return None
+
+if __name__ == '__main__':
+    main()
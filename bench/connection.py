@@ -0,0 +1,73 @@
+'''
+Memory held by idle connections, client and server side. Run with
+`python -m bench.connection`.
+'''
+
+from asyncio import new_event_loop, set_event_loop
+from tracemalloc import start, stop, take_snapshot
+
+from aio9p.dialect.client.Py9P2000 import Py9P2000Client
+from aio9p.example.simple import Simple9P2000
+from aio9p.protocol import Py9PBufferedServer, Py9PServer
+
+COUNT = 2000
+
+class Transport():
+    '''
+    A transport that does nothing.
+    '''
+    def get_write_buffer_size(self):
+        '''
+        Nothing is ever buffered.
+        '''
+        return 0
+
+TRANSPORT = Transport()
+
+def measure(factory):
+    '''
+    Bytes per connection made with `factory`, after `connection_made`.
+    '''
+    start()
+    before = take_snapshot()
+    connections = [factory() for _ in range(COUNT)]
+    after = take_snapshot()
+    stop()
+    total = sum(diff.size_diff for diff in after.compare_to(before, 'filename'))
+    return (total - 8 * len(connections)) / len(connections)
+
+def server(server_class):
+    '''
+    An idle server connection with its own implementation instance.
+    '''
+    def factory():
+        connection = server_class(Simple9P2000(65535))
+        connection.connection_made(TRANSPORT)
+        return connection
+    return factory
+
+def client(poolsize):
+    '''
+    An idle client, connected.
+    '''
+    def factory():
+        res = Py9P2000Client(remote={}, poolsize=poolsize)
+        res._connection.connection_made(TRANSPORT) # pylint: disable=protected-access
+        return res
+    return factory
+
+def main():
+    '''
+    Print the results.
+    '''
+    loop = new_event_loop()
+    set_event_loop(loop)
+    print(f'{"server":<16} {measure(server(Py9PServer)):>10,.0f}')
+    print(f'{"buffered server":<16} {measure(server(Py9PBufferedServer)):>10,.0f}')
+    print(f'{"client":<16} {measure(client(0xFF)):>10,.0f}')
+    print(f'{"client 0xFFFE":<16} {measure(client(0xFFFE)):>10,.0f}')
+    loop.close()
+    return None
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Short-lived fids against the example server with an artificial delay per
+request, as on a link with high latency: walk, open, read and clunk, with
+the clunk awaited versus deferred through the fid allocator. Run with
+`python -m bench.fid`.
+'''
+
+from asyncio import get_running_loop, run, sleep as asleep
+from os import remove
+from tempfile import mkdtemp
+from time import perf_counter
+
+from aio9p.constant import NOFID
+from aio9p.dialect.client.Py9P2000 import Py9P2000Client
+from aio9p.example.simple import Simple9P2000
+from aio9p.protocol import Py9PBufferedServer
+
+COUNT = 500
+DELAY = 0.001
+
+class Delayed(Simple9P2000):
+    '''
+    The example server, delaying every request used here.
+    '''
+    async def walk(self, fid, newfid, wnames):
+        await asleep(DELAY)
+        return await super().walk(fid, newfid, wnames)
+    async def open(self, fid, mode):
+        await asleep(DELAY)
+        return await super().open(fid, mode)
+    async def read(self, fid, offset, count):
+        await asleep(DELAY)
+        return await super().read(fid, offset, count)
+    async def clunk(self, fid):
+        await asleep(DELAY)
+        return await super().clunk(fid)
+
+async def rate(func) -> float:
+    '''
+    Sequences per second.
+    '''
+    start = perf_counter()
+    await func()
+    return COUNT / (perf_counter() - start)
+
+async def main():
+    '''
+    Print the results.
+    '''
+    sockpath = mkdtemp() + '/bench.sock'
+    server = await get_running_loop().create_unix_server(
+        lambda: Py9PBufferedServer(Delayed(65535)), path=sockpath
+        )
+    async with Py9P2000Client(remote={'path': sockpath}, buffered=True) as client:
+        await client.negotiate(client.versionstring, 65535)
+        await client.attach(0, NOFID, b'root', b'')
+        await client.walk(0, 1, ())
+        await client.create(1, b'file', 0o644, 2)
+        await client.write(1, 0, b'Hello, world!')
+        async def awaited():
+            for _ in range(COUNT):
+                await client.walk(0, 2, (b'file',))
+                await client.open(2, 0)
+                await client.read(2, 0, 13)
+                await client.clunk(2)
+        async def deferred():
+            for _ in range(COUNT):
+                async with client.fids() as fid:
+                    await client.walk(0, fid, (b'file',))
+                    await client.open(fid, 0)
+                    await client.read(fid, 0, 13)
+            await client.fids.flush()
+        for name, func in (('awaited', awaited), ('deferred', deferred)):
+            print(f'{name:<10} {await rate(func):>10,.0f}')
+    server.close()
+    remove(sockpath)
+    return None
+
+if __name__ == '__main__':
+    run(main())
@@ -0,0 +1,79 @@
+'''
+Bulk transfer rates against the example server with an artificial delay
+per request, as on a link with high latency: one request at a time versus
+the pipelined file objects. Run with `python -m bench.file`.
+'''
+
+from asyncio import get_running_loop, run, sleep as asleep
+from os import remove
+from tempfile import mkdtemp
+from time import perf_counter
+
+from aio9p.constant import NOFID
+from aio9p.dialect.client.Py9P2000 import Py9P2000Client
+from aio9p.example.simple import Simple9P2000
+from aio9p.protocol import Py9PBufferedServer
+
+DELAY = 0.002
+MSIZE = 0x10000
+SIZE = 0x800000
+
+CONTENT = memoryview(bytes(SIZE))
+
+class Delayed(Simple9P2000):
+    '''
+    The example server, delaying every read and write. Files read as
+    zeros and discard what is written, to keep the server cheap.
+    '''
+    async def read(self, fid, offset, count):
+        await asleep(DELAY)
+        return CONTENT[offset:offset+count]
+    async def write(self, fid, offset, data):
+        await asleep(DELAY)
+        return len(data)
+
+async def rate(func) -> float:
+    '''
+    MiB per second.
+    '''
+    start = perf_counter()
+    await func()
+    return SIZE / (perf_counter() - start) / 0x100000
+
+async def main():
+    '''
+    Print the results.
+    '''
+    sockpath = mkdtemp() + '/bench.sock'
+    server = await get_running_loop().create_unix_server(
+        lambda: Py9PBufferedServer(Delayed(MSIZE)), path=sockpath
+        )
+    async with Py9P2000Client(remote={'path': sockpath}, buffered=True) as client:
+        await client.negotiate(client.versionstring, MSIZE)
+        await client.attach(0, NOFID, b'root', b'')
+        await client.walk(0, 1, ())
+        _, iounit = await client.create(1, b'file', 0o644, 2)
+        chunk = MSIZE - 24
+        data = bytes(SIZE)
+        async def write():
+            for offset in range(0, SIZE, chunk):
+                await client.write(1, offset, data[offset:offset+chunk])
+        async def writer():
+            async with client.writer(1, iounit) as res:
+                await res.write(data)
+        async def read():
+            for offset in range(0, SIZE, chunk):
+                await client.read(1, offset, chunk)
+        async def reader():
+            async with client.reader(1, iounit) as res:
+                await res.read()
+        for name, func in (
+            ('write', write), ('writer', writer), ('read', read), ('reader', reader)
+            ):
+            print(f'{name:<10} {await rate(func):>10,.1f}')
+    server.close()
+    remove(sockpath)
+    return None
+
+if __name__ == '__main__':
+    run(main())
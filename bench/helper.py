@@ -0,0 +1,44 @@
+'''
+Throughput of the field helpers on walk names and directory reads. Run with
+`python -m bench.helper`.
+'''
+
+from aio9p.helper import extract_bytefields, mkbytefields, mkqid
+from aio9p.stat import Py9P2000Stat
+
+from bench.codec import rate
+
+NAMES = tuple(f'component{i}'.encode() for i in range(16))
+WALK = memoryview(b''.join(mkbytefields(*NAMES)[1]))
+STATS = tuple(
+    Py9P2000Stat(
+        p9type=0, p9dev=0, p9qid=mkqid(0, i), p9mode=0o644, p9atime=0, p9mtime=0
+        , p9length=i, p9name=f'file{i}'.encode(), p9uid=b'root', p9gid=b'root'
+        , p9muid=b'root'
+        )
+    for i in range(64)
+    )
+DIRECTORY = memoryview(b''.join(stat.to_bytes() for stat in STATS))
+
+def parse_directory():
+    '''
+    Parse all stats of a directory read.
+    '''
+    offset = 0
+    res = []
+    while offset < len(DIRECTORY):
+        stat = Py9P2000Stat.from_bytes(DIRECTORY, offset)
+        res.append(stat)
+        offset = offset + 2 + DIRECTORY[offset] + (DIRECTORY[offset+1] << 8)
+    return res
+
+def main():
+    '''
+    Print calls per second.
+    '''
+    print(f'{"walk16":<10} {rate(lambda: extract_bytefields(WALK, 0, 16)):>12,.0f}')
+    print(f'{"dirread64":<10} {rate(parse_directory):>12,.0f}')
+    return None
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+'''
+Memory use and encoding throughput of stat objects. Run with
+`python -m bench.stat`.
+'''
+
+from tracemalloc import start, stop, take_snapshot
+
+from aio9p.helper import mkqid
+from aio9p.stat import Py9P2000Stat, StatColumns
+
+from bench.codec import rate
+
+COUNT = 100000
+
+def mkstat(i):
+    '''
+    A file stat.
+    '''
+    return Py9P2000Stat(
+        p9type=0, p9dev=0, p9qid=mkqid(0, i), p9mode=0o644, p9atime=0, p9mtime=0
+        , p9length=i, p9name=b'file', p9uid=b'root', p9gid=b'root', p9muid=b'root'
+        )
+
+def memory():
+    '''
+    Bytes per stat object, excluding the field values.
+    '''
+    values = [mkqid(0, i) for i in range(COUNT)]
+    start()
+    before = take_snapshot()
+    stats = [
+        Py9P2000Stat(
+            p9type=0, p9dev=0, p9qid=qid, p9mode=0o644, p9atime=0, p9mtime=0
+            , p9length=0, p9name=b'file', p9uid=b'root', p9gid=b'root', p9muid=b'root'
+            )
+        for qid in values
+        ]
+    after = take_snapshot()
+    stop()
+    total = sum(diff.size_diff for diff in after.compare_to(before, 'filename'))
+    return (total - 8 * len(stats)) / len(stats)
+
+STATS = [mkstat(i) for i in range(64)]
+UPDATE = Py9P2000Stat(p9mtime=123)
+
+def listing():
+    '''
+    Size and encode all entries, as a directory read does.
+    '''
+    return b''.join(
+        stat.to_bytes() for stat in STATS if stat.size() > 0
+        )
+
+LISTING = listing()
+
+def parse():
+    '''
+    Decode a directory listing into stat objects.
+    '''
+    offset = 0
+    res = []
+    while offset < len(LISTING):
+        stat = Py9P2000Stat.from_bytes(LISTING, offset)
+        offset = offset + stat.size()
+        res.append(stat)
+    return res
+
+def main():
+    '''
+    Print the results.
+    '''
+    print(f'{"bytes/stat":<10} {memory():>12,.0f}')
+    print(f'{"listing64":<10} {rate(listing):>12,.0f}')
+    print(f'{"wstat":<10} {rate(lambda: STATS[0].wstat(UPDATE)):>12,.0f}')
+    print(f'{"construct":<10} {rate(lambda: mkstat(1)):>12,.0f}')
+    print(f'{"parse64":<10} {rate(parse):>12,.0f}')
+    print(f'{"columns64":<10} {rate(lambda: StatColumns.from_bytes(LISTING)):>12,.0f}')
+    return None
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''
+Helpers shared by the unit tests.
+'''
+
+from asyncio import sleep as asleep
+
+from aio9p.helper import mkfield
+
+class Transport:
+    '''
+    A transport that records what is written and never buffers.
+    '''
+    def __init__(self):
+        self.writes = []
+    def writelines(self, data):
+        self.writes.append(b''.join(data))
+    def get_write_buffer_size(self):
+        return 0
+
+def frame(msgtype, tag, body):
+    '''
+    A raw frame, with the tag given as an int or as bytes.
+    '''
+    if isinstance(tag, int):
+        tag = mkfield(tag, 2)
+    return mkfield(len(body) + 7, 4) + mkfield(msgtype, 1) + tag + body
+
+def connect(protocol, transport=None):
+    '''
+    Connect `protocol` to `transport`, a fresh Transport by default.
+    '''
+    if transport is None:
+        transport = Transport()
+    protocol.connection_made(transport)
+    return protocol, transport
+
+async def settle(iterations=2):
+    '''
+    Let the event loop run `iterations` times, enough for a task to queue
+    a message and for the output queue to write it.
+    '''
+    for _ in range(iterations):
+        await asleep(0)
@@ -0,0 +1,38 @@
+
+from aio9p.buffer import Py9PBuffer
+from aio9p.protocol import Py9PCommon
+
+from tests.common import frame
+
+class Collector(Py9PCommon):
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+    def _process_incoming(self, msgtype, msgtag, msgbody):
+        self.frames.append((msgtype, msgtag, msgbody))
+
+def test_chunked():
+    frames = [
+        frame(118, b'\x01\x00', bytes(range(256)) * 40)
+        , frame(120, b'\x02\x00', b'')
+        , frame(110, b'\x03\x00', b'\x00\x00\x00\x00')
+        ]
+    stream = b''.join(frames)
+    proto = Collector()
+    for start in range(0, len(stream), 1000):
+        proto.data_received(stream[start:start+1000])
+    assert [
+        frame(msgtype, tag, bytes(body))
+        for msgtype, tag, body in proto.frames
+        ] == frames
+    assert proto._buffer.pending() == 0
+    assert len(proto._buffer.data) == 0
+
+def test_no_overwrite():
+    buffer = Py9PBuffer(16)
+    buffer.feed(b'0123456789')
+    held = buffer.view[0:10]
+    buffer.start = 10
+    buffer.feed(b'abcdefghij')
+    assert bytes(held) == b'0123456789'
+    assert bytes(buffer.view[buffer.start:buffer.end]) == b'abcdefghij'
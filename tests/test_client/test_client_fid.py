@@ -0,0 +1,61 @@
+from asyncio import create_task, wait_for
+from pytest import mark, raises
+
+import aio9p.constant as c
+from aio9p.fid import FID_START, Py9PFids
+from aio9p.helper import mkfield
+from aio9p.protocol import Py9PClient
+
+from tests.common import connect, frame, settle
+
+def client(poolsize=0xFFFF):
+    res = Py9PClient(remote={}, poolsize=poolsize)
+    return res, connect(res._connection)[1]
+
+async def use(fids):
+    async with fids() as fid:
+        return fid
+
+@mark.asyncio
+async def test_deferred_clunk():
+    conn, transport = client()
+    fids = conn.fids
+    assert [await use(fids) for _ in range(3)] == [FID_START + n for n in range(3)]
+    assert transport.writes == []
+    await settle(3)
+    assert transport.writes == [b''.join(
+        frame(c.TCLUNK, tag, mkfield(FID_START + tag, 4)) for tag in range(3)
+        )]
+    assert fids.take() == FID_START + 3
+    conn._connection.data_received(
+        frame(c.RCLUNK, 0, b'') + frame(c.RERROR, 1, mkfield(0, 2))
+        )
+    await settle(3)
+    assert fids.take() == FID_START + 4
+    conn._connection.data_received(frame(c.RCLUNK, 2, b''))
+    await wait_for(fids.flush(), 1)
+    assert sorted(fids.take() for _ in range(3)) == [FID_START + n for n in range(3)]
+
+@mark.asyncio
+async def test_connection_lost():
+    conn, transport = client(poolsize=1)
+    fids = conn.fids
+    await use(fids)
+    await use(fids)
+    flush = create_task(fids.flush())
+    await settle(3)
+    assert len(transport.writes) == 1
+    conn._connection.connection_lost(None)
+    await wait_for(flush, 1)
+    await use(fids)
+    await wait_for(fids.flush(), 1)
+    assert sorted(fids.take() for _ in range(3)) == [FID_START + n for n in range(3)]
+
+def test_range():
+    fids = Py9PFids(None, start=5, stop=7)
+    assert fids.take() == 5
+    fids.discard(5)
+    assert fids.take() == 5
+    assert fids.take() == 6
+    with raises(RuntimeError):
+        fids.take()
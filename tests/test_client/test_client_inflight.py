@@ -0,0 +1,143 @@
+from asyncio import CancelledError, create_task, wait_for
+from pytest import mark, raises
+
+import aio9p.constant as c
+from aio9p.helper import mkfield
+from aio9p.protocol import Py9PClientConnection
+
+from tests.common import connect, frame, settle
+
+def connection(poolsize=0xFFFF):
+    return connect(Py9PClientConnection(
+        None, lambda *args: ValueError(*args), 0xFFFF, poolsize
+        ))
+
+def clunk(fid):
+    return c.TCLUNK, 4, (mkfield(fid, 4),)
+
+@mark.asyncio
+async def test_out_of_order():
+    conn, transport = connection()
+    first = create_task(conn.message(clunk(1)))
+    second = create_task(conn.message(clunk(2)))
+    await settle()
+    assert transport.writes == [
+        frame(c.TCLUNK, 0, mkfield(1, 4)), frame(c.TCLUNK, 1, mkfield(2, 4))
+        ]
+    conn.data_received(frame(c.RCLUNK, 1, b'\x02'))
+    conn.data_received(frame(c.RCLUNK, 0, b'\x01'))
+    assert bytes((await first)[1]) == b'\x01'
+    assert bytes((await second)[1]) == b'\x02'
+    third = create_task(conn.message(clunk(3)))
+    await settle()
+    assert transport.writes[-1][5:7] == b'\x00\x00'
+    assert not third.done()
+    conn.data_received(frame(c.RCLUNK, 0, b''))
+    assert (await third)[0] == c.RCLUNK
+
+@mark.asyncio
+async def test_tag_exhaustion():
+    conn, transport = connection(poolsize=1)
+    first = create_task(conn.message(clunk(1)))
+    second = create_task(conn.message(clunk(2)))
+    await settle()
+    assert len(transport.writes) == 1
+    conn.data_received(frame(c.RCLUNK, 0, b''))
+    await first
+    await settle()
+    assert len(transport.writes) == 2
+    conn.data_received(frame(c.RCLUNK, 0, b''))
+    await second
+
+@mark.asyncio
+async def test_cancelled():
+    conn, transport = connection()
+    first = create_task(conn.message(clunk(1)))
+    await settle()
+    first.cancel()
+    with raises(CancelledError):
+        await first
+    second = create_task(conn.message(clunk(2)))
+    await settle()
+    assert transport.writes[-1][5:7] == b'\x01\x00'
+    conn.data_received(frame(c.RCLUNK, 0, b''))
+    assert conn._tags == [0]
+    conn.data_received(frame(c.RCLUNK, 1, b''))
+    await second
+
+@mark.asyncio
+async def test_connection_lost():
+    conn, _ = connection(poolsize=1)
+    first = create_task(conn.message(clunk(1)))
+    second = create_task(conn.message(clunk(2)))
+    await settle()
+    conn.connection_lost(None)
+    with raises(ConnectionError):
+        await first
+    with raises(ConnectionError):
+        await second
+
+async def _gather(batch):
+    return await batch
+
+@mark.asyncio
+async def test_batch():
+    conn, transport = connection(poolsize=2)
+    batch = conn.batch([clunk(fid) for fid in range(3)], return_exceptions=True)
+    task = create_task(_gather(batch))
+    await settle()
+    assert transport.writes == [
+        frame(c.TCLUNK, 0, mkfield(0, 4)) + frame(c.TCLUNK, 1, mkfield(1, 4))
+        ]
+    conn.data_received(frame(c.RERROR, 1, b''))
+    await settle()
+    assert transport.writes[-1] == frame(c.TCLUNK, 1, mkfield(2, 4))
+    conn.data_received(frame(c.RCLUNK, 1, b'\x02') + frame(c.RCLUNK, 0, b'\x00'))
+    first, second, third = await task
+    assert bytes(first[1]) == b'\x00'
+    assert isinstance(second, ValueError)
+    assert bytes(third[1]) == b'\x02'
+
+@mark.asyncio
+async def test_batch_iter():
+    conn, _ = connection()
+    batch = conn.batch([clunk(fid) for fid in range(3)])
+    async def replies():
+        return [index async for index, _ in batch]
+    task = create_task(replies())
+    await settle()
+    conn.data_received(b''.join(frame(c.RCLUNK, tag, b'') for tag in (2, 0, 1)))
+    assert await task == [2, 0, 1]
+    with raises(ValueError):
+        conn.batch([(c.TWRITE, 0x10000, ())])
+
+@mark.asyncio
+async def test_batch_lost():
+    conn, _ = connection()
+    batch = conn.batch([clunk(fid) for fid in range(2)])
+    conn.connection_lost(None)
+    with raises(RuntimeError):
+        await wait_for(_gather(batch), 1)
+    conn, transport = connection(poolsize=1)
+    batch = conn.batch([clunk(fid) for fid in range(2)], return_exceptions=True)
+    task = create_task(_gather(batch))
+    await settle()
+    assert len(transport.writes) == 1
+    conn.connection_lost(None)
+    with raises(ConnectionError):
+        await wait_for(task, 1)
+
+@mark.asyncio
+async def test_reconnect():
+    conn, _ = connection(poolsize=1)
+    first = create_task(conn.message(clunk(1)))
+    await settle()
+    conn.connection_lost(None)
+    with raises(ConnectionError):
+        await first
+    _, transport = connect(conn)
+    second = create_task(conn.message(clunk(2)))
+    await settle()
+    assert transport.writes == [frame(c.TCLUNK, 0, mkfield(2, 4))]
+    conn.data_received(frame(c.RCLUNK, 0, b''))
+    await wait_for(second, 1)
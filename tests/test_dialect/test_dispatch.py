@@ -0,0 +1,49 @@
+
+from pytest import mark, raises
+
+import aio9p.constant as c
+from aio9p.dialect.Py9P2000 import p9_stat, p9_write
+from aio9p.dialect.Py9P2000u import p9u_stat
+from aio9p.example.simple_u import Simple9P2000u
+from aio9p.helper import mkbytefields, mkfield
+
+def version_body(version):
+    return memoryview(mkfield(8192, 4) + b''.join(mkbytefields(version)[1]))
+
+@mark.asyncio
+async def test_fallback():
+    implementation = Simple9P2000u(8192)
+    assert implementation._dispatch[c.TSTAT][0] is p9u_stat
+    restype, _, _ = await implementation.process_msg(c.TVERSION, version_body(b'9P2000'))
+    assert restype == c.RVERSION
+    assert implementation._dispatch[c.TSTAT][0] is p9_stat
+    assert implementation._dispatch[c.TSTAT][1] == implementation.stat
+
+@mark.asyncio
+async def test_register():
+    implementation = Simple9P2000u(8192)
+    with raises(NotImplementedError):
+        await implementation.process_msg(c.TREADDIR, memoryview(b''))
+    async def p9_echo(func, msgbody):
+        return c.RREADDIR, len(msgbody), (await func(bytes(msgbody)),)
+    async def echo(data):
+        return data
+    implementation.register(c.TREADDIR, p9_echo, echo)
+    assert await implementation.process_msg(c.TREADDIR, memoryview(b'abc')) == (
+        c.RREADDIR, 3, (b'abc',)
+        )
+
+@mark.asyncio
+async def test_write_view():
+    implementation = Simple9P2000u(8192)
+    received = []
+    async def write(fid, offset, data):
+        received.append(data)
+        return len(data)
+    implementation.register(c.TWRITE, p9_write, write)
+    body = memoryview(mkfield(1, 4) + mkfield(0, 8) + mkfield(3, 4) + b'abc')
+    await implementation.process_msg(c.TWRITE, body)
+    (data,) = received
+    assert isinstance(data, memoryview)
+    assert data.obj is body.obj
+    assert data == b'abc'
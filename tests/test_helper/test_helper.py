@@ -0,0 +1,45 @@
+from pytest import raises
+
+from aio9p.constant import DMDIR, QTDIR
+from aio9p.helper import (
+    Qid
+    , extract
+    , extract_bytefield_views
+    , extract_bytefields
+    , mkbytefields
+    , mkqid
+    )
+
+def test_views():
+    data = bytearray(b'\x02\x00ab\x00\x00\x03\x00xyz!')
+    views, offset = extract_bytefield_views(data, 0, 3)
+    assert offset == 11
+    assert [bytes(view) for view in views] == [b'ab', b'', b'xyz']
+    data[2:4] = b'AB'
+    assert bytes(views[0]) == b'AB'
+    assert extract_bytefields(memoryview(data), 0, 3) == (b'AB', b'', b'xyz')
+    with raises(ValueError):
+        extract_bytefield_views(data, 6, 2)
+
+def test_extract():
+    data = memoryview(b'\x01\x02\x03\x04\x05\x06\x07\x08')
+    assert extract(data, 1, 1) == 2
+    assert extract(data, 0, 2) == 0x0201
+    assert extract(data, 0, 3) == 0x030201
+    assert extract(data, 0, 8) == 0x0807060504030201
+
+def test_mkbytefields():
+    view = memoryview(b'local')
+    total, fields = mkbytefields(b'usr', view, b'')
+    assert total == 14
+    assert fields[3] is view
+    assert b''.join(fields) == b'\x03\x00usr\x05\x00local\x00\x00'
+
+def test_qid():
+    qid = mkqid(DMDIR | 0o755, 42, 3)
+    assert isinstance(qid, Qid)
+    assert len(qid) == 13
+    assert (qid.qtype, qid.version, qid.path) == (QTDIR, 3, 42)
+    assert qid == bytes(qid)
+    assert {bytes(qid): True}[qid]
+    assert mkqid(0, (42).to_bytes(8, 'little'), 3).path == 42
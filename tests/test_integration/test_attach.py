@@ -1,14 +1,18 @@
 
 from asyncio import create_task, sleep as asleep
 from inspect import currentframe, getframeinfo
-from pytest import mark
+from pytest import mark, raises
 import pytest_asyncio
 
+from aio9p.constant import NOFID, QTDIR, RCLUNK, TCLUNK, TSTAT
 from aio9p.dialect.client.Py9P2000 import Py9P2000Client
 from aio9p.dialect.client.Py9P2000u import Py9P2000uClient
 from aio9p.example import example_client, example_server, example_logger
 from aio9p.example.simple import Simple9P2000
 from aio9p.example.simple_u import Simple9P2000u
+from aio9p.fid import FID_START
+from aio9p.protocol import Py9PError, Py9PException
+from aio9p.schema import ENCODE
 
 # pytest_plugins = ('pytest_asyncio',)
 
@@ -16,6 +20,7 @@ SERVERS = [
     (Simple9P2000, Py9P2000Client, 'plain')
     , (Simple9P2000u, Py9P2000uClient, 'dot-u')
     ]
+BUFFERED = [False, True]
 
 LOGGER = example_logger()
 
@@ -28,21 +33,27 @@ def sockname(uniq):
     path = path.replace('/', '.')
     return f'pytest.{path}.{fi.function}.{fi.lineno}.{uniq}.sock'
 
+@mark.parametrize('buffered', BUFFERED)
 @mark.parametrize('Server,Client,uniq', SERVERS)
 @mark.asyncio
-async def test_attach(Server, Client, uniq):
-    sockpath = sockname(uniq)
+async def test_attach(Server, Client, uniq, buffered):
+    sockpath = sockname(f'{uniq}.{buffered}')
     print(sockpath)
     logger = LOGGER.getChild(uniq)
     task = create_task(example_server(
         logger.getChild('server')
         , Server
         , sockpath=sockpath
+        , buffered=buffered
         ))
     logger = logger.getChild('client')
     await asleep(1)
     try:
-        async with Client(logger=logger, remote={'path': sockpath}) as client:
+        async with Client(
+            logger=logger
+            , remote={'path': sockpath}
+            , buffered=buffered
+            ) as client:
             logger.info('Negotiating for version %s', client.versionstring)
             await client.negotiate(client.versionstring, 65535)
             logger.info('Negotiation successful.')
@@ -56,3 +67,196 @@ async def test_attach(Server, Client, uniq):
         logger.info('Success!')
     finally:
         task.cancel()
+
+@mark.parametrize('buffered', BUFFERED)
+@mark.asyncio
+async def test_file(buffered):
+    sockpath = sockname(f'plain.{buffered}')
+    logger = LOGGER.getChild('file')
+    task = create_task(example_server(
+        logger.getChild('server')
+        , Simple9P2000
+        , sockpath=sockpath
+        , buffered=buffered
+        ))
+    await asleep(1)
+    try:
+        async with Py9P2000Client(
+            logger=logger.getChild('client')
+            , remote={'path': sockpath}
+            , buffered=buffered
+            ) as client:
+            await client.negotiate(client.versionstring, 65535)
+            root = 0
+            fid = b'\x01\x00\x00\x00'
+            rootqid = await client.attach(root, NOFID, b'root', b'')
+            assert rootqid.qtype == QTDIR
+            await client.walk(root, fid, ())
+            qid, _ = await client.create(fid, b'hello', 0o644, 2)
+            assert await client.write(fid, 0, b'Hello, world!') == 13
+            assert await client.read(fid, 7, 5) == b'world'
+            stat = await client.stat(fid)
+            assert stat.p9name == b'hello'
+            assert stat.p9length == 13
+            await client.clunk(fid)
+            assert await client.walk(root, fid, (b'hello',)) == (qid,)
+            assert (await client.open(fid, 0))[0] == qid
+    finally:
+        task.cancel()
+
+@mark.asyncio
+async def test_readdir():
+    sockpath = sockname('readdir')
+    logger = LOGGER.getChild('readdir')
+    task = create_task(example_server(
+        logger.getChild('server')
+        , Simple9P2000
+        , sockpath=sockpath
+        ))
+    await asleep(1)
+    try:
+        async with Py9P2000Client(
+            logger=logger.getChild('client')
+            , remote={'path': sockpath}
+            ) as client:
+            await client.negotiate(client.versionstring, 65535)
+            await client.attach(0, NOFID, b'root', b'')
+            await client.walk(0, 1, ())
+            qid, _ = await client.create(1, b'hello', 0o644, 2)
+            await client.write(1, 0, b'Hello, world!')
+            await client.walk(0, 2, ())
+            await client.open(2, 0)
+            listing = await client.readdir(2, 0, 4096)
+            assert listing.names == [b'hello']
+            assert list(listing.lengths) == [13]
+            assert list(listing.paths) == [qid.path]
+    finally:
+        task.cancel()
+
+@mark.asyncio
+async def test_batch():
+    sockpath = sockname('batch')
+    logger = LOGGER.getChild('batch')
+    task = create_task(example_server(
+        logger.getChild('server')
+        , Simple9P2000
+        , sockpath=sockpath
+        ))
+    await asleep(1)
+    try:
+        async with Py9P2000Client(
+            logger=logger.getChild('client')
+            , remote={'path': sockpath}
+            ) as client:
+            await client.negotiate(client.versionstring, 65535)
+            await client.attach(0, NOFID, b'root', b'')
+            await client.walk(0, 1, ())
+            replies = await client.batch(
+                [ENCODE[TCLUNK](1), ENCODE[TSTAT](1)]
+                , return_exceptions=True
+                )
+            assert replies[0][0] == RCLUNK
+            assert isinstance(replies[1], Py9PError)
+    finally:
+        task.cancel()
+
+@mark.asyncio
+async def test_reader():
+    sockpath = sockname('reader')
+    logger = LOGGER.getChild('reader')
+    task = create_task(example_server(
+        logger.getChild('server')
+        , Simple9P2000
+        , sockpath=sockpath
+        ))
+    await asleep(1)
+    content = bytes(range(256)) * 40
+    try:
+        async with Py9P2000Client(
+            logger=logger.getChild('client')
+            , remote={'path': sockpath}
+            ) as client:
+            await client.negotiate(client.versionstring, 1024)
+            await client.attach(0, NOFID, b'root', b'')
+            await client.walk(0, 1, ())
+            _, iounit = await client.create(1, b'big', 0o644, 2)
+            for offset in range(0, len(content), 1000):
+                await client.write(1, offset, content[offset:offset+1000])
+            async with client.reader(1, iounit) as reader:
+                assert await reader.read(1500) == content[:1500]
+                assert await reader.read(3000) == content[1500:4500]
+                reader.seek(100)
+                assert await reader.read(50) == content[100:150]
+                assert await reader.read() == content[150:]
+                assert await reader.read(10) == b''
+                assert reader.tell() == len(content)
+    finally:
+        task.cancel()
+
+@mark.asyncio
+async def test_writer():
+    sockpath = sockname('writer')
+    logger = LOGGER.getChild('writer')
+    task = create_task(example_server(
+        logger.getChild('server')
+        , Simple9P2000
+        , sockpath=sockpath
+        ))
+    await asleep(1)
+    content = bytes(range(256)) * 40
+    async def chunks():
+        yield content[5000:7000]
+        yield bytearray(content[7000:])
+    try:
+        async with Py9P2000Client(
+            logger=logger.getChild('client')
+            , remote={'path': sockpath}
+            ) as client:
+            await client.negotiate(client.versionstring, 1024)
+            await client.attach(0, NOFID, b'root', b'')
+            await client.walk(0, 1, ())
+            _, iounit = await client.create(1, b'big', 0o644, 2)
+            async with client.writer(1, iounit, max_inflight=3000) as writer:
+                for offset in range(0, 1000, 10):
+                    await writer.write(content[offset:offset+10])
+                await writer.write(content[1000:5000])
+                assert await writer.write_from(chunks()) == len(content) - 5000
+                assert writer.tell() == len(content)
+            async with client.reader(1, iounit) as reader:
+                assert await reader.read() == content
+            writer = client.writer(1, iounit, offset=len(content) + 1)
+            await writer.write(b'gap')
+            with raises(Py9PException):
+                await writer.flush()
+    finally:
+        task.cancel()
+
+@mark.asyncio
+async def test_fids():
+    sockpath = sockname('fids')
+    logger = LOGGER.getChild('fids')
+    task = create_task(example_server(
+        logger.getChild('server')
+        , Simple9P2000
+        , sockpath=sockpath
+        ))
+    await asleep(1)
+    try:
+        async with Py9P2000Client(
+            logger=logger.getChild('client')
+            , remote={'path': sockpath}
+            ) as client:
+            await client.negotiate(client.versionstring, 65535)
+            await client.attach(0, NOFID, b'root', b'')
+            await client.walk(0, 1, ())
+            await client.create(1, b'hello', 0o644, 2)
+            await client.write(1, 0, b'Hello, world!')
+            for _ in range(2):
+                async with client.fids() as fid:
+                    assert fid == FID_START
+                    await client.walk(0, fid, (b'hello',))
+                    await client.open(fid, 0)
+                    assert await client.read(fid, 0, 5) == b'Hello'
+                await client.fids.flush()
+    finally:
+        task.cancel()
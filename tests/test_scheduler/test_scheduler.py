@@ -0,0 +1,89 @@
+
+from asyncio import CancelledError, create_task, Event, sleep as asleep
+from pytest import mark, raises
+
+import aio9p.constant as c
+from aio9p.scheduler import Py9PScheduler
+
+@mark.asyncio
+async def test_meta_overtakes_bulk():
+    scheduler = Py9PScheduler((
+        ('meta', None, None)
+        , ('bulk', (c.TREAD, c.TWRITE), 1)
+        ))
+    release = Event()
+    log = []
+    async def handler(name):
+        log.append(name)
+        await release.wait()
+    tasks = [
+        create_task(scheduler.run(c.TREAD, handler('read0')))
+        , create_task(scheduler.run(c.TREAD, handler('read1')))
+        , create_task(scheduler.run(c.TWRITE, handler('write')))
+        , create_task(scheduler.run(c.TSTAT, handler('stat')))
+        ]
+    await asleep(0)
+    assert log == ['read0', 'stat']
+    assert scheduler.depth() == {'meta': 0, 'bulk': 2}
+    assert scheduler.running() == {'meta': 1, 'bulk': 1}
+    tasks[1].cancel()
+    await asleep(0)
+    assert scheduler.depth() == {'meta': 0, 'bulk': 1}
+    release.set()
+    await asleep(0.01)
+    assert log == ['read0', 'stat', 'write']
+    assert scheduler.running() == {'meta': 0, 'bulk': 0}
+
+@mark.asyncio
+async def test_priority_under_total_limit():
+    scheduler = Py9PScheduler((
+        ('meta', None, None)
+        , ('bulk', (c.TREAD,), None)
+        ), limit=1)
+    release = Event()
+    log = []
+    async def handler(name):
+        log.append(name)
+        await release.wait()
+        release.clear()
+    tasks = [
+        create_task(scheduler.run(c.TREAD, handler('read0')))
+        , create_task(scheduler.run(c.TREAD, handler('read1')))
+        , create_task(scheduler.run(c.TCLUNK, handler('clunk')))
+        ]
+    await asleep(0)
+    assert log == ['read0']
+    release.set()
+    await asleep(0)
+    await asleep(0)
+    assert log == ['read0', 'clunk']
+    for task in tasks:
+        task.cancel()
+    await asleep(0)
+    assert scheduler.running() == {'meta': 0, 'bulk': 0}
+    assert scheduler.depth() == {'meta': 0, 'bulk': 0}
+
+@mark.asyncio
+async def test_release_and_cancel():
+    scheduler = Py9PScheduler((
+        ('meta', None, None)
+        , ('bulk', (c.TREAD,), 1)
+        ))
+    release = Event()
+    started = []
+    async def handler(name):
+        started.append(name)
+        await release.wait()
+    first = create_task(scheduler.run(c.TREAD, handler('read0')))
+    second = create_task(scheduler.run(c.TREAD, handler('read1')))
+    await asleep(0)
+    assert scheduler.depth() == {'meta': 0, 'bulk': 1}
+    release.set()
+    second.cancel()
+    await first
+    with raises(CancelledError):
+        await second
+    assert second.cancelled()
+    assert started == ['read0']
+    assert scheduler.running() == {'meta': 0, 'bulk': 0}
+    assert scheduler.depth() == {'meta': 0, 'bulk': 0}
@@ -0,0 +1,66 @@
+from pytest import mark, raises
+
+import aio9p.constant as c
+from aio9p.helper import Qid, mkqid
+from aio9p.schema import (
+    DECODE, ENCODE, DECODE_U, ENCODE_U, MESSAGES_9P2000, MESSAGES_9P2000U
+    )
+
+FID = b'\x01\x00\x00\x00'
+QID = mkqid(0, 7)
+
+VALUES = {
+    'u8': 3
+    , 'u16': 0x1234
+    , 'u32': 0x12345678
+    , 'u64': 0x123456789A
+    , 'fid': 1
+    , 'tag': b'\x05\x00'
+    , 'qid': QID
+    , 's': b'name'
+    , 'ws': (b'usr', b'', b'lib')
+    , 'qids': (QID, QID)
+    , 'data': b'content'
+    , 'stat': b'\x00' * 41
+    }
+
+def roundtrip(messages, decode, encode):
+    for msgtype, fields in messages.items():
+        values = tuple(VALUES[kind.rstrip('?')] for _, kind in fields)
+        restype, reslen, resfields = encode[msgtype](*values)
+        body = b''.join(resfields)
+        assert restype == msgtype
+        assert reslen == len(body)
+        assert decode[msgtype](memoryview(body)) == values
+
+def test_roundtrip():
+    roundtrip(MESSAGES_9P2000, DECODE, ENCODE)
+    roundtrip(MESSAGES_9P2000U, DECODE_U, ENCODE_U)
+
+def test_wire():
+    _, reslen, resfields = ENCODE[c.TWALK](FID, 1, (b'a', b'bc'))
+    assert reslen == 17
+    assert b''.join(resfields) == FID + FID + b'\x02\x00\x01\x00a\x02\x00bc'
+
+def test_qid():
+    (qids,) = DECODE[c.RWALK](memoryview(b''.join(ENCODE[c.RWALK]((QID,))[2])))
+    assert isinstance(qids[0], Qid)
+    assert qids[0].path == 7
+    qid, _ = DECODE[c.ROPEN](memoryview(b''.join(ENCODE[c.ROPEN](QID, 0)[2])))
+    assert isinstance(qid, Qid)
+
+def test_optional():
+    _, _, resfields = ENCODE[c.TATTACH](FID, FID, b'root', b'')
+    body = memoryview(b''.join(resfields))
+    assert DECODE_U[c.TATTACH](body) == (1, 1, b'root', b'', c.NONUNAME)
+
+@mark.parametrize('msgtype', [
+    msgtype for msgtype, fields in sorted(MESSAGES_9P2000.items()) if fields
+    ])
+def test_truncated(msgtype):
+    fields = MESSAGES_9P2000[msgtype]
+    values = tuple(VALUES[kind] for _, kind in fields)
+    body = b''.join(ENCODE[msgtype](*values)[2])
+    for end in (0, 1, len(body) - 1):
+        with raises(ValueError, match='Truncated message body'):
+            DECODE[msgtype](memoryview(body[:end]))
@@ -0,0 +1,345 @@
+
+from asyncio import CancelledError, Event, current_task, get_running_loop, sleep as asleep
+from contextvars import ContextVar, copy_context
+from pytest import mark
+
+import aio9p.constant as c
+from aio9p.helper import Releasable, mkfield
+from aio9p.protocol import EAGER_START, Py9P, Py9PServer
+from aio9p.scheduler import Py9PScheduler
+from aio9p.trace import DISPATCH, Frame, RECV, SEND
+
+from tests.common import Transport, connect, frame
+
+class Clunker(Py9P):
+    async def process_msg(self, msgtype, msgbody):
+        return c.RCLUNK, 0, ()
+
+@mark.asyncio
+async def test_coalesced():
+    server, transport = connect(Py9PServer(Clunker()))
+    server.data_received(b''.join(
+        frame(c.TCLUNK, tag, b'\x00\x00\x00\x00')
+        for tag in range(100)
+        ))
+    await asleep(0.01)
+    assert len(transport.writes) == 1
+    assert transport.writes[0] == b''.join(
+        frame(c.RCLUNK, tag, b'')
+        for tag in range(100)
+        )
+
+@mark.asyncio
+async def test_cork_bytes():
+    server, transport = connect(Py9PServer(Clunker(), cork_bytes=70))
+    server.data_received(b''.join(
+        frame(c.TCLUNK, tag, b'\x00\x00\x00\x00')
+        for tag in range(25)
+        ))
+    await asleep(0.01)
+    assert len(transport.writes) == 3
+
+class PausingTransport(Transport):
+    def __init__(self):
+        super().__init__()
+        self.reading = True
+    def pause_reading(self):
+        self.reading = False
+    def resume_reading(self):
+        self.reading = True
+
+class Waiter(Py9P):
+    def __init__(self):
+        self.event = Event()
+    async def process_msg(self, msgtype, msgbody):
+        await self.event.wait()
+        return c.RCLUNK, 0, ()
+
+@mark.asyncio
+async def test_task_watermarks():
+    implementation = Waiter()
+    server, transport = connect(
+        Py9PServer(implementation, tasks_high=4, tasks_low=2), PausingTransport()
+        )
+    server.data_received(b''.join(
+        frame(c.TCLUNK, tag, b'\x00\x00\x00\x00')
+        for tag in range(3)
+        ))
+    assert transport.reading
+    server.data_received(frame(c.TCLUNK, 3, b'\x00\x00\x00\x00'))
+    assert not transport.reading
+    implementation.event.set()
+    await asleep(0.01)
+    assert transport.reading
+    assert len(transport.writes) == 1
+
+@mark.asyncio
+async def test_pause_writing():
+    server, transport = connect(Py9PServer(Clunker()), PausingTransport())
+    server.pause_writing()
+    assert not transport.reading
+    server.data_received(frame(c.TCLUNK, 0, b'\x00\x00\x00\x00'))
+    await asleep(0.01)
+    assert not transport.writes
+    server.resume_writing()
+    assert transport.reading
+    assert transport.writes == [frame(c.RCLUNK, 0, b'')]
+
+@mark.asyncio
+async def test_eager():
+    server, transport = connect(Py9PServer(Clunker(), eager=True))
+    server.data_received(frame(c.TCLUNK, 0, b'\x00\x00\x00\x00'))
+    assert not server._tasks
+    assert server._output
+    await asleep(0.01)
+    assert transport.writes == [frame(c.RCLUNK, 0, b'')]
+
+@mark.asyncio
+async def test_eager_flush():
+    implementation = Waiter()
+    server, transport = connect(Py9PServer(implementation, eager=True))
+    server.data_received(frame(c.TCLUNK, 0, b'\x00\x00\x00\x00'))
+    server.data_received(frame(c.TCLUNK, 1, b'\x00\x00\x00\x00'))
+    assert len(server._tasks) == 2
+    server.data_received(frame(c.TFLUSH, 2, b'\x00\x00'))
+    implementation.event.set()
+    await asleep(0.01)
+    assert b''.join(transport.writes) == frame(c.RFLUSH, 2, b'') + frame(c.RCLUNK, 1, b'')
+
+class Raiser(Py9P):
+    async def process_msg(self, msgtype, msgbody):
+        if msgbody[0]:
+            raise CancelledError
+        raise ValueError('Nope')
+    def errhandler(self, exception):
+        return c.RERROR, 1, (bytes(str(exception), 'ascii')[:1],)
+
+@mark.asyncio
+async def test_eager_exception():
+    server, transport = connect(Py9PServer(Raiser(), eager=True))
+    server.data_received(frame(c.TCLUNK, 0, b'\x00\x00\x00\x00'))
+    server.data_received(frame(c.TCLUNK, 1, b'\x01\x00\x00\x00'))
+    server.data_received(frame(c.TCLUNK, 2, b'\x00\x00\x00\x00'))
+    assert not server._tasks
+    await asleep(0)
+    assert transport.writes == [frame(c.RERROR, 0, b'N') + frame(c.RERROR, 2, b'N')]
+
+VAR = ContextVar('VAR', default=None)
+
+class Suspender(Py9P):
+    def __init__(self):
+        self.seen = []
+    async def process_msg(self, msgtype, msgbody):
+        VAR.set(msgbody[0])
+        self.seen.append((VAR.get(), current_task() is not None))
+        await asleep(0)
+        self.seen.append((VAR.get(), current_task() is not None))
+        return c.RCLUNK, 0, ()
+
+@mark.asyncio
+async def test_eager_resume():
+    implementation = Suspender()
+    server, transport = connect(Py9PServer(implementation, eager=True))
+    context = copy_context()
+    get_running_loop().call_soon(server.data_received, b''.join(
+        frame(c.TCLUNK, tag, mkfield(tag + 5, 4)) for tag in range(2)
+        ), context=context)
+    await asleep(0)
+    assert context.run(VAR.get) is None
+    assert len(server._tasks) == 2
+    await asleep(0.01)
+    assert implementation.seen == [
+        (5, EAGER_START), (6, EAGER_START), (5, True), (6, True)
+        ]
+    assert transport.writes == [frame(c.RCLUNK, 0, b'') + frame(c.RCLUNK, 1, b'')]
+
+class Recorder(Py9P):
+    def __init__(self):
+        self.log = []
+    async def process_msg(self, msgtype, msgbody):
+        fid = bytes(msgbody[0:4])
+        delay = msgbody[4]
+        self.log.append(('start', fid, delay))
+        await asleep(delay / 100)
+        self.log.append(('end', fid, delay))
+        return c.RCLUNK, 0, ()
+
+@mark.asyncio
+async def test_fid_ordering():
+    implementation = Recorder()
+    server, transport = connect(Py9PServer(implementation, fid_ordering=True))
+    server.data_received(b''.join((
+        frame(c.TWRITE, 0, b'\x00\x00\x00\x00\x03')
+        , frame(c.TWRITE, 1, b'\x00\x00\x00\x00\x01')
+        , frame(c.TWRITE, 2, b'\x01\x00\x00\x00\x01')
+        )))
+    await asleep(0.1)
+    assert implementation.log == [
+        ('start', b'\x00\x00\x00\x00', 3)
+        , ('start', b'\x01\x00\x00\x00', 1)
+        , ('end', b'\x01\x00\x00\x00', 1)
+        , ('end', b'\x00\x00\x00\x00', 3)
+        , ('start', b'\x00\x00\x00\x00', 1)
+        , ('end', b'\x00\x00\x00\x00', 1)
+        ]
+    assert not server._fidtails
+
+@mark.asyncio
+async def test_scheduler():
+    implementation = Waiter()
+    scheduler = Py9PScheduler((('meta', None, None), ('bulk', (c.TREAD,), 1)))
+    server, transport = connect(Py9PServer(implementation, scheduler=scheduler))
+    server.data_received(b''.join(
+        frame(c.TREAD, tag, b'\x00\x00\x00\x00')
+        for tag in range(3)
+        ))
+    await asleep(0)
+    assert scheduler.depth() == {'meta': 0, 'bulk': 2}
+    implementation.event.set()
+    await asleep(0.01)
+    assert b''.join(transport.writes) == b''.join(
+        frame(c.RCLUNK, tag, b'')
+        for tag in range(3)
+        )
+
+class AbortingTransport(Transport):
+    def __init__(self):
+        super().__init__()
+        self.aborted = False
+    def abort(self):
+        self.aborted = True
+
+class Errors(Clunker):
+    def errhandler(self, exception):
+        return c.RERROR, 0, ()
+
+@mark.asyncio
+async def test_msize():
+    implementation = Errors()
+    implementation.maxsize = 64
+    server, transport = connect(Py9PServer(implementation), AbortingTransport())
+    server.data_received(frame(c.TWRITE, 0, bytes(57)))
+    assert not transport.aborted
+    server.data_received(frame(c.TWRITE, 1, bytes(58))[:20])
+    assert transport.aborted
+    assert server.violations['msize'] == 1
+
+@mark.asyncio
+async def test_memory_budget():
+    implementation = Waiter()
+    implementation.errhandler = lambda exception: (c.RERROR, 0, ())
+    server, transport = connect(
+        Py9PServer(implementation, memory_budget=100), AbortingTransport()
+        )
+    server.data_received(frame(c.TWRITE, 0, bytes(60)))
+    server.data_received(frame(c.TWRITE, 1, bytes(60)))
+    assert server.violations['budget'] == 1
+    assert not transport.aborted
+    server.data_received(frame(c.TWRITE, 2, bytes(100))[:10])
+    assert transport.aborted
+    assert server.violations['budget'] == 2
+    implementation.event.set()
+    await asleep(0.01)
+    assert b''.join(transport.writes) == frame(c.RERROR, 1, b'') + frame(c.RCLUNK, 0, b'')
+
+@mark.asyncio
+async def test_connection_lost():
+    implementation = Waiter()
+    clunked = []
+    async def clunkall():
+        clunked.append(True)
+    implementation.clunkall = clunkall
+    server, transport = connect(Py9PServer(implementation))
+    server.data_received(frame(c.TCLUNK, 0, b'\x00\x00\x00\x00'))
+    (task,) = server._tasks.values()
+    server.connection_lost(None)
+    await asleep(0.01)
+    assert task.cancelled()
+    assert clunked
+    assert not transport.writes
+
+class BufferingTransport(Transport):
+    def __init__(self):
+        super().__init__()
+        self.pending = 0
+    def writelines(self, data):
+        data = list(data)
+        self.writes.append(data)
+        self.pending = self.pending + sum(len(field) for field in data)
+    def get_write_buffer_size(self):
+        return self.pending
+
+class Reader(Py9P):
+    def __init__(self, content):
+        self.content = content
+        self.released = []
+    async def process_msg(self, msgtype, msgbody):
+        data = Releasable(self.content, lambda: self.released.append(True))
+        return c.RREAD, 4 + len(data), (mkfield(len(data), 4), data)
+
+@mark.asyncio
+async def test_releasable():
+    content = bytearray(b'0123456789')
+    implementation = Reader(content)
+    server, transport = connect(Py9PServer(implementation), BufferingTransport())
+    server.data_received(frame(c.TREAD, 0, bytes(16)))
+    await asleep(0.01)
+    (written,) = transport.writes
+    assert written[-1].obj is content
+    assert not implementation.released
+    transport.pending = 0
+    server.data_received(frame(c.TREAD, 1, bytes(16)))
+    assert implementation.released == [True]
+
+class Polling(Py9PServer):
+    __slots__ = ()
+    release_interval = 0.001
+    release_interval_max = 0.004
+
+@mark.asyncio
+async def test_releasable_timer():
+    implementation = Reader(b'0123456789')
+    server, transport = connect(Polling(implementation), BufferingTransport())
+    server.data_received(frame(c.TREAD, 0, bytes(16)))
+    await asleep(0.05)
+    assert not implementation.released
+    assert server._release_delay == 0.004
+    transport.pending = 0
+    await asleep(0.05)
+    assert implementation.released == [True]
+    assert server._release_handle is None
+    assert server._release_delay == 0.001
+
+@mark.asyncio
+async def test_releasable_lost():
+    implementation = Reader(b'0123456789')
+    server, transport = connect(
+        Py9PServer(implementation, eager=True), BufferingTransport()
+        )
+    server.data_received(frame(c.TREAD, 0, bytes(16)))
+    server.connection_lost(None)
+    assert implementation.released == [True]
+
+@mark.asyncio
+async def test_trace():
+    events = []
+    def tracer(event, msgtype, msgtag, body):
+        if isinstance(body, tuple):
+            body = b''.join(body)
+        events.append((event, msgtype, msgtag, bytes(body)))
+    server, transport = connect(Py9PServer(Clunker(), tracer=tracer, eager=True))
+    server.data_received(frame(c.TCLUNK, 1, b'\x00\x00\x00\x00'))
+    assert events == [
+        (RECV, c.TCLUNK, b'\x01\x00', b'\x00\x00\x00\x00')
+        , (DISPATCH, c.TCLUNK, b'\x01\x00', b'\x00\x00\x00\x00')
+        , (SEND, c.RCLUNK, b'\x01\x00', b'')
+        ]
+    assert str(Frame(c.TCLUNK, b'\x01\x00', memoryview(b'\x00\x01'), limit=1)) \
+        == 'TCLUNK tag 0100 size 2: 00...'
+
+def test_idle():
+    server = Py9PServer(Clunker())
+    server.connection_made(Transport())
+    assert not hasattr(server, '__dict__')
+    assert len(server._buffer.data) == 0
+    assert server._releases is None
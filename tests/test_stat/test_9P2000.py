@@ -1,9 +1,11 @@
 
-from dataclasses import asdict
+from dataclasses import asdict, fields
+
+import pytest
 
 from aio9p.constant import DMDIR
 from aio9p.helper import mkqid
-from aio9p.stat import Py9P2000Stat
+from aio9p.stat import Py9P2000Stat, Py9P2000uStat, StatColumns, StatView, StatUView
 
 
 # QID = QTByteDIR + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00\x00\x00\x00\x00'
@@ -61,3 +63,85 @@ def test_identity():
 
 def test_wstat():
     assert STAT.wstat(STAT2) == STAT3
+
+def test_cached_wire():
+    stat = Py9P2000Stat.from_bytes(STAT.to_bytes(), 0)
+    assert not hasattr(stat, '__dict__')
+    wire = stat.to_bytes()
+    assert stat.to_bytes() is wire
+    stat.p9length = 5
+    assert stat.to_bytes() != wire
+    assert stat.size() == len(stat.to_bytes())
+    assert Py9P2000Stat.from_bytes(stat.to_bytes(), 0).p9length == 5
+
+def test_fields():
+    names = [
+        'p9type', 'p9dev', 'p9qid', 'p9mode', 'p9atime', 'p9mtime', 'p9length'
+        , 'p9name', 'p9uid', 'p9gid', 'p9muid'
+        ]
+    assert [field.name for field in fields(Py9P2000Stat)] == names
+    assert list(asdict(STAT)) == names
+    assert [field.name for field in fields(Py9P2000uStat)] == names + [
+        'p9u_extension', 'p9u_n_uid', 'p9u_n_gid', 'p9u_n_muid'
+        ]
+    assert not hasattr(Py9P2000uStat(), '__dict__')
+
+def test_wstat_u():
+    stat = Py9P2000uStat(p9mode=MODE, p9name=b'foo', p9u_n_uid=0)
+    update = Py9P2000uStat(p9name=b'bar', p9u_n_gid=1)
+    res = stat.wstat(update)
+    assert isinstance(res, Py9P2000uStat)
+    assert res.to_dict(filtered=True) == {
+        'p9mode': MODE, 'p9name': b'bar', 'p9u_n_uid': 0, 'p9u_n_gid': 1
+        }
+
+def test_view():
+    wire = b'\xff' + STAT.to_bytes() + b'\xff'
+    view = StatView(wire, 1)
+    assert view.p9name == STAT.p9name
+    assert view.p9muid == STAT.p9muid
+    assert view.p9mode == STAT.p9mode
+    assert view.p9qid == STAT.p9qid
+    assert view.size() == STAT.size()
+    assert view.to_bytes() == STAT.to_bytes()
+    assert view.to_stat() == STAT
+    try:
+        StatView(wire[:-10], 1)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+def test_view_u():
+    stat = Py9P2000uStat(p9mode=MODE, p9name=b'foo', p9u_extension=b'bar', p9u_n_gid=1)
+    view = StatUView(stat.to_bytes())
+    assert view.p9u_extension == b'bar'
+    assert view.p9u_n_gid == 1
+    assert view.p9u_n_muid == 0xFFFFFFFF
+    assert view.to_stat().to_bytes() == stat.to_bytes()
+
+def test_columns():
+    stats = [
+        Py9P2000uStat(
+            p9qid=mkqid(0, i), p9mode=0o644, p9mtime=2*i, p9length=3*i
+            , p9name=b'file%i' % i, p9uid=b'', p9gid=b'', p9muid=b''
+            )
+        for i in range(3)
+        ]
+    wire = b''.join(stat.to_bytes() for stat in stats)
+    columns = StatColumns.from_bytes(STAT.to_bytes())
+    assert columns.extend(wire) == 3
+    assert len(columns) == 4
+    assert columns.names == [b'foodir', b'file0', b'file1', b'file2']
+    assert list(columns.modes) == [MODE, 0o644, 0o644, 0o644]
+    assert list(columns.mtimes) == [0, 0, 2, 4]
+    assert list(columns.lengths) == [0, 0, 3, 6]
+    assert list(columns.paths) == [0, 0, 1, 2]
+    with pytest.raises(ValueError):
+        StatColumns.from_bytes(wire[:-1])
+
+def test_columns_numpy():
+    pytest.importorskip('numpy')
+    res = StatColumns.from_bytes(STAT.to_bytes() * 2).to_numpy()
+    assert list(res['mode']) == [MODE, MODE]
+    assert list(res['name']) == [b'foodir', b'foodir']